@@ -0,0 +1,4 @@
+from telebot.async_telebot import AsyncTeleBot
+from app.config import Config
+
+bot = AsyncTeleBot(Config.TELEGRAM_BOT_TOKEN)
@@ -0,0 +1,523 @@
+import asyncio
+import datetime
+import html
+import tempfile
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from telebot import types
+from app.config import Config
+from app.bot.async_bot_instance import bot
+from app.db.async_mongo import async_db
+from app import metrics as metrics_module
+from app.metrics import metrics, timed
+from app.services.google_service import calendar_pool, build_event_body, color_palette
+from app.services.schemas import CATEGORIES
+from app.services.event_mirror import event_mirror
+from app.services.busy_index import busy_cache
+from app.services.calendar_files import iter_download, parse_events, chunked, iter_ics
+from app.services.ai_service import AIService
+from app.bot import conversation
+from app.bot.outbox import AsyncOutbox, EditThrottle
+from app.bot.views import (get_main_menu, get_confirmation_keyboard, get_tasks_keyboard,
+                           get_event_action_keyboard, format_proposals, format_batch_result,
+                           format_auth_message, format_event_details, get_select_tasks_keyboard,
+                           format_import_progress, format_import_result,
+                           format_settings, get_settings_keyboard, get_color_keyboard, next_lead_minutes,
+                           format_partial_proposals)
+
+# asyncio counterpart of app.bot.handlers. Telegram, Mongo and Gemini calls
+# are awaited natively, Telegram's through the AsyncOutbox below; the
+# Calendar client and the event mirror are blocking and run in the default
+# executor.
+
+# Conversation state lives in the state store (see app/bot/conversation.py);
+# its calls are blocking with the Mongo backend, so they run in the executor.
+# The pending step is the next text message expected from a chat:
+# "auth_code" or "edit".
+NOTHING_CHANGED = "That didn't change anything. Tap Edit again and say which field to change."
+# Import errors quoted back to the user
+MAX_IMPORT_ERRORS_SHOWN = 5
+IMPORT_DOWNLOAD_FAILED = "Import stopped: couldn't download the file. Please send it again."
+ai_service = AIService()
+outbox = AsyncOutbox(
+    bot,
+    global_rate=Config.OUTBOX_GLOBAL_RATE,
+    chat_rate=Config.OUTBOX_CHAT_RATE,
+    chat_burst=Config.OUTBOX_CHAT_BURST,
+    max_retries=Config.OUTBOX_MAX_RETRIES,
+)
+# Replaces the sync outbox's collector; a process runs one mode
+metrics.register_collector("outbox", outbox.stats)
+
+async def get_service(chat_id):
+    return await calendar_pool.aget(chat_id, async_db)
+
+async def is_authorized(chat_id):
+    service = await get_service(chat_id)
+    return service.is_authenticated()
+
+async def check_conflicts(service, events):
+    # busy_cache.check may query freebusy or wait for a load in progress
+    return await asyncio.to_thread(lambda: [busy_cache.check(service, event) for event in events])
+
+async def send_auth_required(chat_id, text):
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("Authorize Google Calendar", callback_data="menu_auth"))
+    await outbox.send_message(chat_id, text, reply_markup=markup)
+
+# --- Handlers ---
+
+@bot.message_handler(commands=['start', 'help'])
+@timed("handler")
+async def send_welcome(message):
+    chat_id = message.chat.id
+    await async_db.create_user(chat_id, {"username": message.from_user.username})
+    await outbox.reply_to(message, "Welcome to Planify! \nUse /auth to connect Google Calendar.\nSend me any text to schedule an event.", reply_markup=get_main_menu())
+
+@bot.message_handler(commands=['auth'])
+@bot.message_handler(func=lambda m: m.text == "Auth")
+@timed("handler")
+async def authenticate(message):
+    chat_id = message.chat.id
+    service = await get_service(chat_id)
+    auth_url, flow = await asyncio.to_thread(service.get_auth_url)
+
+    if auth_url:
+        await asyncio.to_thread(conversation.save_auth_flow, chat_id, flow)
+        await outbox.send_message(chat_id, format_auth_message(auth_url), parse_mode="Markdown")
+        await asyncio.to_thread(conversation.save_pending_step, chat_id, "auth_code")
+    else:
+        await outbox.send_message(chat_id, "Could not generate auth URL.")
+
+@timed("handler")
+async def process_auth_code(message):
+    chat_id = message.chat.id
+    code = message.text.strip()
+    flow = await asyncio.to_thread(conversation.pop_auth_flow, chat_id)
+
+    if flow:
+        service = await get_service(chat_id)
+        success, msg = await asyncio.to_thread(service.finish_auth, flow, code)
+        # Drop any stale pooled client and mirror so the fresh credentials are used
+        calendar_pool.invalidate(chat_id)
+        if success:
+            await asyncio.to_thread(event_mirror.clear, chat_id)
+            busy_cache.invalidate(chat_id)
+        await outbox.send_message(chat_id, msg)
+        # Clean up code message
+        outbox.delete_message_later(chat_id, message.message_id)
+    else:
+        await outbox.send_message(chat_id, "Auth session expired. Please run /auth again.")
+
+@bot.message_handler(func=lambda m: m.text == "Create Task")
+@timed("handler")
+async def manual_create_start(message):
+    if not await is_authorized(message.chat.id):
+        await send_auth_required(message.chat.id, "⚠️ You are not authorized. Please connect your Google Calendar first.")
+        return
+    await outbox.send_message(message.chat.id, "Please describe the task/event in natural language (e.g., 'Meeting with John tomorrow at 3pm').")
+
+@bot.message_handler(func=lambda m: m.text == "My Tasks")
+@timed("handler")
+async def list_tasks(message):
+    if not await is_authorized(message.chat.id):
+        await send_auth_required(message.chat.id, "⚠️ You are not authorized. Please connect your Google Calendar first.")
+        return
+    await list_upcoming_events(message.chat.id)
+
+def _sync_and_list(service, page, force_sync):
+    event_mirror.sync(service, force=force_sync)
+    return event_mirror.list_upcoming(service.chat_id, page, Config.TASKS_PAGE_SIZE)
+
+async def list_upcoming_events(chat_id, page=0, message_id=None, force_sync=False):
+    service = await get_service(chat_id)
+    if not service.is_authenticated():
+        await outbox.send_message(chat_id, "Please authenticate first using /auth.")
+        return
+
+    events, has_more = await asyncio.to_thread(_sync_and_list, service, page, force_sync)
+
+    if not events and page == 0:
+        text, markup = "No upcoming events found.", None
+    else:
+        text, markup = "Here are your upcoming events:", get_tasks_keyboard(events, page, has_more)
+
+    if message_id:
+        try:
+            await outbox.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+        except Exception:
+            pass
+    else:
+        await outbox.send_message(chat_id, text, reply_markup=markup)
+
+@bot.message_handler(content_types=['document'])
+@timed("handler")
+async def import_calendar_file(message):
+    chat_id = message.chat.id
+    if not await is_authorized(chat_id):
+        await send_auth_required(chat_id, "⚠️ You are not authorized. Please connect your Google Calendar first.")
+        return
+    document = message.document
+    file_name = document.file_name or "file"
+    if not file_name.lower().endswith((".ics", ".csv")):
+        await outbox.reply_to(message, "Send an .ics or .csv file to import events.")
+        return
+    if document.file_size and document.file_size > Config.IMPORT_MAX_BYTES:
+        await outbox.reply_to(message, "That file is too large to import.")
+        return
+
+    service = await get_service(chat_id)
+    colors = (await async_db.get_user_settings(chat_id)).get('colors', {})
+    progress = await outbox.send_message(chat_id, format_import_progress(file_name, 0, 0))
+    created, failed, samples = 0, 0, []
+
+    def record_error(error):
+        nonlocal failed
+        failed += 1
+        if len(samples) < MAX_IMPORT_ERRORS_SHOWN:
+            samples.append(error)
+
+    try:
+        # Download and parsing are blocking, so each chunk is pulled in the
+        # executor; progress edits stay on the loop
+        url = await bot.get_file_url(document.file_id)
+        chunks = chunked(parse_events(file_name, iter_download(url)), Config.IMPORT_CHUNK_SIZE)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            events = [event for event, _ in chunk if event]
+            for _, error in chunk:
+                if error:
+                    record_error(error)
+            if events:
+                results = await asyncio.to_thread(service.create_events, [build_event_body(e, colors.get(e.category)) for e in events])
+                await asyncio.to_thread(event_mirror.upsert_events, chat_id, [event for event, _ in results if event])
+                for event, (created_event, error) in zip(events, results):
+                    if created_event:
+                        created += 1
+                    else:
+                        record_error(f"{event.summary}: {error}")
+            outbox.edit_message_text_later(format_import_progress(file_name, created, failed), chat_id, progress.message_id)
+    except requests.RequestException as e:
+        # The file URL carries the bot token, so the error text stays in the logs
+        print(f"Import download error: {str(e).replace(Config.TELEGRAM_BOT_TOKEN, '<token>')}")
+        record_error(IMPORT_DOWNLOAD_FAILED)
+    except Exception as e:
+        record_error(f"Import stopped: {e}")
+    busy_cache.invalidate(chat_id)
+    await outbox.edit_message_text(format_import_result(file_name, created, failed, samples), chat_id, progress.message_id)
+
+def _write_ics(chat_id, ics):
+    for line in iter_ics(event_mirror.iter_upcoming(chat_id)):
+        ics.write(line.encode("utf-8") + b"\r\n")
+    ics.seek(0)
+
+@bot.message_handler(commands=['export'])
+@timed("handler")
+async def export_calendar(message):
+    chat_id = message.chat.id
+    service = await get_service(chat_id)
+    if not service.is_authenticated():
+        await send_auth_required(chat_id, "⚠️ You are not authorized. Please connect your Google Calendar first.")
+        return
+    await asyncio.to_thread(event_mirror.sync, service)
+    # Written line by line from the mirror cursor to a temp file
+    with tempfile.TemporaryFile() as ics:
+        await asyncio.to_thread(_write_ics, chat_id, ics)
+        await outbox.send_document(chat_id, ics, visible_file_name="planify.ics", caption="Your upcoming events 📤")
+
+@bot.message_handler(commands=['stats'])
+async def show_stats(message):
+    # Admins only; everyone else gets the same silence as an unknown command
+    if message.chat.id not in Config.ADMIN_CHAT_IDS:
+        return
+    report = metrics.summary()
+    profiler = metrics_module.profiler
+    if profiler and profiler.total:
+        report += "\n\nHottest frames:\n" + "\n".join(f"{share:>5.1%} {stack}" for stack, share in profiler.top())
+    # Telegram caps messages at 4096 characters
+    await outbox.send_message(message.chat.id, f"<pre>{html.escape(report[:4000])}</pre>", parse_mode="HTML")
+
+@bot.callback_query_handler(func=lambda call: True)
+@timed("handler")
+async def callback_query(call):
+    chat_id = call.message.chat.id
+
+    if call.data.startswith("menu_"):
+        action = call.data.split("_")[1]
+
+        if action == "auth":
+            await authenticate(call.message)
+            await outbox.answer_callback_query(call.id)
+            return
+
+        if not await is_authorized(chat_id):
+            await send_auth_required(chat_id, "⚠️ You need to authorize first.")
+            await outbox.answer_callback_query(call.id, "Auth required")
+            return
+
+        if action == "create":
+            await outbox.send_message(chat_id, "Please describe the task/event in natural language (e.g., 'Meeting with John tomorrow at 3pm').")
+        elif action == "tasks":
+            await list_upcoming_events(chat_id)
+        elif action == "settings":
+            await show_settings(chat_id)
+
+        await outbox.answer_callback_query(call.id)
+        return
+
+    if call.data.startswith("settings_"):
+        await handle_settings_callback(chat_id, call)
+        await outbox.answer_callback_query(call.id)
+        return
+
+    if call.data == "confirm_event":
+        pending = await asyncio.to_thread(conversation.load_proposals, chat_id)
+        if pending:
+            events = pending["events"]
+            settings = await async_db.get_user_settings(chat_id)
+            service = await get_service(chat_id)
+            colors = settings.get('colors', {})
+            bodies = [build_event_body(event, colors.get(event.category)) for event in events]
+
+            try:
+                # One batch request for all proposals, failures reported per event
+                results = await asyncio.to_thread(service.create_events, bodies)
+            except Exception as e:
+                await outbox.send_message(chat_id, f"Error creating event: {e}")
+                return
+            for created, _ in results:
+                if created:
+                    await asyncio.to_thread(event_mirror.upsert_event, chat_id, created)
+                    busy_cache.add(chat_id, created)
+            await asyncio.to_thread(conversation.clear_proposals, chat_id)
+            created_count = sum(1 for created, _ in results if created)
+            await outbox.answer_callback_query(call.id, "Event created!" if created_count == 1 else f"{created_count} events created!")
+            await outbox.edit_message_text(format_batch_result(events, results), chat_id, call.message.message_id)
+        else:
+            await outbox.answer_callback_query(call.id, "Session expired.")
+
+    elif call.data == "cancel_event":
+        await asyncio.to_thread(conversation.clear_proposals, chat_id)
+        await outbox.answer_callback_query(call.id, "Cancelled.")
+        outbox.delete_message_later(chat_id, call.message.message_id)
+
+    elif call.data == "edit_event":
+        await outbox.send_message(chat_id, "Please enter the correction (e.g., 'Change time to 5pm'):")
+        await asyncio.to_thread(conversation.save_pending_step, chat_id, "edit")
+
+    elif call.data == "refresh_tasks":
+        await list_upcoming_events(chat_id, message_id=call.message.message_id, force_sync=True)
+        await outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("tasks_page_"):
+        page = int(call.data.rsplit("_", 1)[1])
+        await list_upcoming_events(chat_id, page=page, message_id=call.message.message_id)
+        await outbox.answer_callback_query(call.id)
+
+    elif call.data == "select_tasks":
+        selection = {"page": 0, "ids": set()}
+        await asyncio.to_thread(conversation.save_selection, chat_id, selection)
+        await show_task_selection(chat_id, call.message.message_id, selection)
+        await outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("select_page_"):
+        selection = await asyncio.to_thread(conversation.load_selection, chat_id)
+        selection["page"] = int(call.data.rsplit("_", 1)[1])
+        await asyncio.to_thread(conversation.save_selection, chat_id, selection)
+        await show_task_selection(chat_id, call.message.message_id, selection)
+        await outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("toggle_"):
+        event_id = call.data.split("_", 1)[1]
+        selection = await asyncio.to_thread(conversation.load_selection, chat_id)
+        selection["ids"] ^= {event_id}
+        await asyncio.to_thread(conversation.save_selection, chat_id, selection)
+        await show_task_selection(chat_id, call.message.message_id, selection)
+        await outbox.answer_callback_query(call.id)
+
+    elif call.data == "bulk_delete":
+        await delete_selected_events(chat_id, call)
+
+    elif call.data == "select_cancel":
+        await asyncio.to_thread(conversation.clear_selection, chat_id)
+        await list_upcoming_events(chat_id, message_id=call.message.message_id)
+        await outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("view_"):
+        event_id = call.data.split("_", 1)[1]
+        event = await asyncio.to_thread(event_mirror.get_event, chat_id, event_id)
+        text = format_event_details(event) if event else f"Event ID: {event_id}"
+        await outbox.edit_message_text(f"{text}\n\nSelect action:", chat_id, call.message.message_id, parse_mode="Markdown", reply_markup=get_event_action_keyboard(event_id))
+
+    elif call.data.startswith("delete_"):
+        event_id = call.data.split("_", 1)[1]
+        service = await get_service(chat_id)
+        if await asyncio.to_thread(service.delete_event, event_id):
+            await asyncio.to_thread(event_mirror.remove_event, chat_id, event_id)
+            busy_cache.invalidate(chat_id)
+            await outbox.answer_callback_query(call.id, "Event deleted.")
+            await list_upcoming_events(chat_id, message_id=call.message.message_id)
+        else:
+            await outbox.answer_callback_query(call.id, "Failed to delete.")
+
+async def show_task_selection(chat_id, message_id, selection):
+    # The list screen already synced the mirror, so just page through it
+    events, has_more = await asyncio.to_thread(event_mirror.list_upcoming, chat_id, selection["page"], Config.TASKS_PAGE_SIZE)
+    markup = get_select_tasks_keyboard(events, selection["ids"], selection["page"], has_more)
+    try:
+        await outbox.edit_message_text("Select the events to delete:", chat_id, message_id, reply_markup=markup)
+    except Exception:
+        pass
+
+async def delete_selected_events(chat_id, call):
+    selection = await asyncio.to_thread(conversation.load_selection, chat_id)
+    if not selection["ids"]:
+        await outbox.answer_callback_query(call.id, "Nothing selected.")
+        return
+
+    event_ids = list(selection["ids"])
+    service = await get_service(chat_id)
+    try:
+        results = await asyncio.to_thread(service.delete_events, event_ids)
+    except Exception as e:
+        await outbox.answer_callback_query(call.id, f"Failed to delete: {e}")
+        return
+
+    for event_id, (ok, _) in zip(event_ids, results):
+        if ok:
+            await asyncio.to_thread(event_mirror.remove_event, chat_id, event_id)
+    busy_cache.invalidate(chat_id)
+    deleted = sum(1 for ok, _ in results if ok)
+    failed = len(results) - deleted
+    await asyncio.to_thread(conversation.clear_selection, chat_id)
+    await outbox.answer_callback_query(call.id, f"Deleted {deleted} events." + (f" {failed} failed." if failed else ""))
+    await list_upcoming_events(chat_id, message_id=call.message.message_id)
+
+async def show_settings(chat_id, message_id=None):
+    settings = await async_db.get_user_settings(chat_id)
+    text, markup = format_settings(settings), get_settings_keyboard(settings)
+    if message_id:
+        await outbox.edit_message_text(text, chat_id, message_id, parse_mode="Markdown", reply_markup=markup)
+    else:
+        await outbox.send_message(chat_id, text, parse_mode="Markdown", reply_markup=markup)
+
+async def handle_settings_callback(chat_id, call):
+    message_id = call.message.message_id
+    action = call.data[len("settings_"):]
+    settings = await async_db.get_user_settings(chat_id)
+
+    if action == "notify":
+        await async_db.update_user_setting(chat_id, "notifications", not settings.get("notifications"))
+    elif action == "lead":
+        await async_db.update_user_setting(chat_id, "reminder_minutes", next_lead_minutes(settings["reminder_minutes"]))
+        await asyncio.to_thread(event_mirror.replan_reminders, chat_id)
+    elif action.startswith("cat_"):
+        category = action[len("cat_"):]
+        if category not in CATEGORIES:
+            return
+        service = await get_service(chat_id)
+        palette = await asyncio.to_thread(color_palette.get, service)
+        current = settings.get("colors", {}).get(category)
+        await outbox.edit_message_text(f"🎨 Pick a colour for **{category}** events:", chat_id, message_id,
+                                    parse_mode="Markdown", reply_markup=get_color_keyboard(category, palette, current))
+        return
+    elif action.startswith("color_"):
+        category, _, color_id = action[len("color_"):].rpartition("_")
+        if category not in CATEGORIES:
+            return
+        await async_db.update_user_setting(chat_id, f"colors.{category}", None if color_id == "0" else color_id)
+    elif action == "close":
+        await outbox.edit_message_text("Settings saved ✅", chat_id, message_id)
+        return
+    await show_settings(chat_id, message_id)
+
+@timed("handler")
+async def process_edit_request(message):
+    chat_id = message.chat.id
+    pending = await asyncio.to_thread(conversation.load_proposals, chat_id)
+    if not pending:
+        await outbox.send_message(chat_id, "No event to edit.")
+        return
+    outbox.delete_message_later(chat_id, message.message_id)
+
+    # Patch the latest proposal; fields the correction doesn't mention are kept
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    edited, settings = await asyncio.gather(
+        ai_service.aapply_correction(pending["events"][-1], message.text, current_time, pending["sources"][-1]),
+        async_db.get_user_settings(chat_id),
+    )
+    if edited is None:
+        await outbox.send_message(chat_id, "Sorry, I couldn't apply that correction. Try rephrasing it.")
+        return
+    if edited == pending["events"][-1]:
+        await outbox.send_message(chat_id, NOTHING_CHANGED)
+        return
+
+    events = pending["events"][:-1] + [edited]
+    service = await get_service(chat_id)
+    conflicts = await check_conflicts(service, events)
+    if pending["message_id"]:
+        outbox.delete_message_later(chat_id, pending["message_id"])
+    sent = await outbox.send_message(chat_id, format_proposals(events, settings.get('colors', {}), conflicts), parse_mode="Markdown", reply_markup=get_confirmation_keyboard(len(events)))
+    await asyncio.to_thread(conversation.save_proposals, chat_id, events, sent.message_id, pending["sources"])
+
+@bot.message_handler(func=lambda m: True)
+@timed("handler")
+async def process_natural_language(message):
+    if message.text is None or message.text.startswith('/'): return
+
+    chat_id = message.chat.id
+    step = await asyncio.to_thread(conversation.pop_pending_step, chat_id)
+    if step == "auth_code":
+        await process_auth_code(message)
+        return
+    if step == "edit":
+        await process_edit_request(message)
+        return
+
+    if not await is_authorized(chat_id):
+        await send_auth_required(chat_id, "⚠️ Please identify yourself to Google Calendar before creating tasks.")
+        return
+
+    text = message.text
+
+    placeholder = await outbox.send_message(chat_id, "Thinking... 🧠")
+
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    service = await get_service(chat_id)
+    # While Gemini streams, the placeholder fills in field by field
+    throttle = EditThrottle(Config.STREAM_EDIT_INTERVAL)
+    def show_partial(partials):
+        preview = format_partial_proposals(partials)
+        if throttle.ready(preview):
+            outbox.edit_message_text_later(preview, chat_id, placeholder.message_id, parse_mode="Markdown")
+    # Gemini call, settings lookup and busy times are independent, so run them together
+    new_events, settings, _ = await asyncio.gather(
+        ai_service.aextract_events(text, current_time, on_partial=show_partial),
+        async_db.get_user_settings(chat_id),
+        asyncio.to_thread(busy_cache.get, service),
+    )
+
+    # Delete user message to keep chat clean as requested
+    outbox.delete_message_later(chat_id, message.message_id)
+
+    if new_events:
+        pending = await asyncio.to_thread(conversation.load_proposals, chat_id)
+        events, sources = conversation.add_proposals(pending, new_events, text)
+        if pending and pending["message_id"]:
+            outbox.delete_message_later(chat_id, pending["message_id"])
+
+        colors = settings.get('colors', {})
+        conflicts = await check_conflicts(service, events)
+        # The placeholder becomes the proposal card, as in the sync handler
+        await outbox.edit_message_text(format_proposals(events, colors, conflicts), chat_id, placeholder.message_id, parse_mode="Markdown", reply_markup=get_confirmation_keyboard(len(events)))
+        await asyncio.to_thread(conversation.save_proposals, chat_id, events, placeholder.message_id, sources)
+    else:
+        await outbox.edit_message_text("Sorry, I couldn't understand that. Try being more specific.", chat_id, placeholder.message_id)
+
+async def run_async():
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=Config.ASYNC_EXECUTOR_THREADS))
+    try:
+        await bot.infinity_polling()
+    finally:
+        await bot.close_session()
@@ -1,4 +1,6 @@
 import telebot
 from app.config import Config
 
-bot = telebot.TeleBot(Config.TELEGRAM_BOT_TOKEN)
+# In webhook mode updates are already run on our own worker pool, so
+# handlers execute inline instead of on telebot's thread pool.
+bot = telebot.TeleBot(Config.TELEGRAM_BOT_TOKEN, threaded=Config.BOT_MODE != "webhook")
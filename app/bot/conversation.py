@@ -0,0 +1,65 @@
+from app.config import Config
+from app.db.state_store import state_store
+from app.services.schemas import CalendarEventSchema
+
+# Typed accessors over the state store for the conversation state the
+# handlers keep between updates. Everything is stored as plain JSON.
+
+# --- Pending event proposals ---
+# Proposals a chat can collect before confirming them together
+MAX_PENDING_PROPOSALS = 10
+
+# sources holds, per event, the message it was extracted from, so edits can
+# give the model the original wording
+def load_proposals(chat_id):
+    data = state_store.get("proposal", chat_id)
+    if data is None:
+        return None
+    return {
+        "events": [CalendarEventSchema(**event) for event in data["events"]],
+        "sources": data.get("sources") or [None] * len(data["events"]),
+        "message_id": data.get("message_id"),
+    }
+
+def save_proposals(chat_id, events, message_id, sources=None):
+    state_store.set("proposal", chat_id, {
+        "events": [event.model_dump() for event in events],
+        "sources": sources or [None] * len(events),
+        "message_id": message_id,
+    }, Config.PROPOSAL_TTL)
+
+def clear_proposals(chat_id):
+    state_store.delete("proposal", chat_id)
+
+def add_proposals(pending, new_events, source):
+    # New proposals join the ones still waiting for confirmation
+    pending = pending or {"events": [], "sources": []}
+    events = (pending["events"] + new_events)[-MAX_PENDING_PROPOSALS:]
+    sources = (pending["sources"] + [source] * len(new_events))[-MAX_PENDING_PROPOSALS:]
+    return events, sources
+
+# --- OAuth flows waiting for the user's code ---
+def save_auth_flow(chat_id, flow_state):
+    state_store.set("auth_flow", chat_id, flow_state, Config.AUTH_FLOW_TTL)
+
+def pop_auth_flow(chat_id):
+    return state_store.pop("auth_flow", chat_id)
+
+# --- Multi-select in the task list ---
+def load_selection(chat_id):
+    data = state_store.get("selection", chat_id) or {"page": 0, "ids": []}
+    return {"page": data["page"], "ids": set(data["ids"])}
+
+def save_selection(chat_id, selection):
+    state_store.set("selection", chat_id, {"page": selection["page"], "ids": sorted(selection["ids"])},
+                    Config.SELECTION_TTL)
+
+def clear_selection(chat_id):
+    state_store.delete("selection", chat_id)
+
+# --- Next text message expected from a chat (auth code, edit correction) ---
+def save_pending_step(chat_id, step):
+    state_store.set("step", chat_id, step, Config.AUTH_FLOW_TTL)
+
+def pop_pending_step(chat_id):
+    return state_store.pop("step", chat_id)
@@ -0,0 +1,95 @@
+import queue
+import threading
+from collections import deque
+
+_STOP = object()
+
+def get_update_chat_id(update):
+    # Pick the chat an update belongs to so its handlers run in order
+    for attr in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = getattr(update, attr, None)
+        if message is not None:
+            return message.chat.id
+    call = getattr(update, "callback_query", None)
+    if call is not None:
+        if call.message is not None:
+            return call.message.chat.id
+        return call.from_user.id
+    # Updates without a chat get their own partition
+    return ("update", update.update_id)
+
+class ChatPartitionedDispatcher:
+    """Runs updates on a bounded worker pool, one update per chat at a time.
+
+    Each chat has its own FIFO, so a user's messages are handled in order,
+    while workers round-robin between chats so one busy user cannot starve
+    the others.
+    """
+
+    def __init__(self, handle, workers=8, max_pending=1000, max_per_chat=20, put_timeout=1.0):
+        self.handle = handle
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_chat = max_per_chat
+        self.put_timeout = put_timeout
+        self._pending = {}  # chat_id -> deque of updates, present while the chat is scheduled
+        self._ready = queue.Queue()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"planify-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._ready.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, update):
+        """Queue an update. Returns False when the queue is full (backpressure)."""
+        key = get_update_chat_id(update)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size < self.max_pending, self.put_timeout):
+                return False
+            chat_queue = self._pending.get(key)
+            if chat_queue is not None and len(chat_queue) >= self.max_per_chat:
+                return False
+            schedule = chat_queue is None
+            if schedule:
+                chat_queue = self._pending[key] = deque()
+            chat_queue.append(update)
+            self._size += 1
+        if schedule:
+            self._ready.put(key)
+        return True
+
+    def queue_depth(self):
+        with self._cond:
+            return self._size
+
+    def _worker(self):
+        while True:
+            key = self._ready.get()
+            if key is _STOP:
+                break
+            with self._cond:
+                update = self._pending[key].popleft()
+            try:
+                self.handle(update)
+            except Exception as e:
+                print(f"Update handling error: {e}")
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+                requeue = bool(self._pending[key])
+                if not requeue:
+                    del self._pending[key]
+            if requeue:
+                # Back of the line, so other chats get a turn
+                self._ready.put(key)
@@ -1,149 +1,214 @@
 import datetime
+import functools
+import html
+import tempfile
+import requests
 from telebot import types
+from app.config import Config
 from app.bot.bot_instance import bot
+from app.bot.outbox import outbox, EditThrottle
+from app import metrics as metrics_module
+from app.metrics import metrics, timed
 from app.db.mongo import db
-from app.services.google_service import GoogleCalendarService
-from app.services.ai_service import AIService, CalendarEventSchema
+from app.services.google_service import calendar_pool, build_event_body, color_palette
+from app.services.schemas import CATEGORIES
+from app.services.event_mirror import event_mirror
+from app.services.busy_index import busy_cache
+from app.services.calendar_files import iter_download, parse_events, chunked, iter_ics
+from app.services.ai_service import AIService
+from app.bot import conversation
+from app.bot.views import (get_main_menu, get_confirmation_keyboard, get_tasks_keyboard,
+                           get_event_action_keyboard, format_proposals, format_batch_result,
+                           format_auth_message, format_event_details, get_select_tasks_keyboard,
+                           format_import_progress, format_import_result,
+                           format_settings, get_settings_keyboard, get_color_keyboard, next_lead_minutes,
+                           format_partial_proposals)
 
-# In-memory storage for temporary states
-temp_events = {}
-user_auth_flows = {}
+# Conversation state (pending proposals, OAuth flows, task selections)
+# lives in the state store, see app/bot/conversation.py
+NOTHING_CHANGED = "That didn't change anything. Tap Edit again and say which field to change."
+# Import errors quoted back to the user
+MAX_IMPORT_ERRORS_SHOWN = 5
+IMPORT_DOWNLOAD_FAILED = "Import stopped: couldn't download the file. Please send it again."
 ai_service = AIService()
 
-# --- Keyboards ---
-def get_main_menu():
-    markup = types.InlineKeyboardMarkup(row_width=2)
-    markup.add(
-        types.InlineKeyboardButton("Create Task", callback_data="menu_create"),
-        types.InlineKeyboardButton("My Tasks", callback_data="menu_tasks"),
-        types.InlineKeyboardButton("Settings", callback_data="menu_settings"),
-        types.InlineKeyboardButton("Auth", callback_data="menu_auth")
-    )
-    return markup
-
-def get_confirmation_keyboard():
-    markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton("Confirm", callback_data="confirm_event"),
-               types.InlineKeyboardButton("Edit", callback_data="edit_event"),
-               types.InlineKeyboardButton("Cancel", callback_data="cancel_event"))
-    return markup
-
-def get_tasks_keyboard(events):
-    markup = types.InlineKeyboardMarkup()
-    for event in events:
-        summary = event.get('summary', 'No Title')
-        start = event.get('start', {}).get('dateTime', '') or event.get('start', {}).get('date', '')
-        # Format start time slightly
-        try:
-            dt = datetime.datetime.fromisoformat(start.replace('Z', '+00:00'))
-            start_str = dt.strftime("%b %d %H:%M")
-        except:
-            start_str = start
-            
-        markup.add(types.InlineKeyboardButton(f"{summary} ({start_str})", callback_data=f"view_{event['id']}"))
-    markup.add(types.InlineKeyboardButton("Refresh", callback_data="refresh_tasks"))
-    return markup
-
-def get_event_action_keyboard(event_id):
-    markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton("Delete", callback_data=f"delete_{event_id}"),
-               types.InlineKeyboardButton("Back", callback_data="refresh_tasks"))
-    return markup
-
 # --- Handlers ---
 
 @bot.message_handler(commands=['start', 'help'])
+@timed("handler")
 def send_welcome(message):
     chat_id = message.chat.id
     db.create_user(chat_id, {"username": message.from_user.username})
-    bot.reply_to(message, "Welcome to Planify! \nUse /auth to connect Google Calendar.\nSend me any text to schedule an event.", reply_markup=get_main_menu())
+    outbox.reply_to(message, "Welcome to Planify! \nUse /auth to connect Google Calendar.\nSend me any text to schedule an event.", reply_markup=get_main_menu())
 
 @bot.message_handler(commands=['auth'])
 @bot.message_handler(func=lambda m: m.text == "Auth")
+@timed("handler")
 def authenticate(message):
     chat_id = message.chat.id
-    service = GoogleCalendarService(chat_id)
+    service = calendar_pool.get(chat_id)
     auth_url, flow = service.get_auth_url()
     
     if auth_url:
-        user_auth_flows[chat_id] = flow
-        # Instruction message
-        msg_text = (
-            "🔐 **Authorization Required**\n\n"
-            "To connect your Google Calendar:\n"
-            "1. Tap the link below (or hold to copy).\n"
-            "2. Select 'Open in...' to open in your browser or Telegram's browser.\n"
-            "3. Sign in to your Google Account.\n"
-            "4. Copy the authorization code provided.\n"
-            "5. Paste the code here."
-        )
-        
-        # We can't use url argument for auth url easily if it's too long... 
-        # But we can try putting it in text.
-        formatted_msg = f"{msg_text}\n\n👇 **Auth Link** 👇\n`{auth_url}`"
+        conversation.save_auth_flow(chat_id, flow)
+        formatted_msg = format_auth_message(auth_url)
         
-        msg = bot.send_message(chat_id, formatted_msg, parse_mode="Markdown")
-        bot.register_next_step_handler(msg, process_auth_code)
+        outbox.send_message(chat_id, formatted_msg, parse_mode="Markdown")
+        conversation.save_pending_step(chat_id, "auth_code")
     else:
-        bot.send_message(chat_id, "Could not generate auth URL.")
+        outbox.send_message(chat_id, "Could not generate auth URL.")
 
+@timed("handler")
 def process_auth_code(message):
     chat_id = message.chat.id
     code = message.text.strip()
-    flow = user_auth_flows.get(chat_id)
+    flow = conversation.pop_auth_flow(chat_id)
     
     if flow:
-        service = GoogleCalendarService(chat_id)
+        service = calendar_pool.get(chat_id)
         success, msg = service.finish_auth(flow, code)
-        bot.send_message(chat_id, msg)
-        del user_auth_flows[chat_id]
+        # Drop any stale pooled client and mirror so the fresh credentials are used
+        calendar_pool.invalidate(chat_id)
+        if success:
+            event_mirror.clear(chat_id)
+            busy_cache.invalidate(chat_id)
+        outbox.send_message(chat_id, msg)
         # Clean up code message
-        try:
-            bot.delete_message(chat_id, message.message_id)
-        except:
-            pass
+        outbox.delete_message_later(chat_id, message.message_id)
     else:
-        bot.send_message(chat_id, "Auth session expired. Please run /auth again.")
+        outbox.send_message(chat_id, "Auth session expired. Please run /auth again.")
 
 def is_authorized(chat_id):
-    service = GoogleCalendarService(chat_id)
+    service = calendar_pool.get(chat_id)
     return service.is_authenticated()
 
 def require_auth(func):
+    @functools.wraps(func)
     def wrapper(message, *args, **kwargs):
         if is_authorized(message.chat.id):
             return func(message, *args, **kwargs)
         else:
             markup = types.InlineKeyboardMarkup()
             markup.add(types.InlineKeyboardButton("Authorize Google Calendar", callback_data="menu_auth"))
-            bot.send_message(message.chat.id, "⚠️ You are not authorized. Please connect your Google Calendar first.", reply_markup=markup)
+            outbox.send_message(message.chat.id, "⚠️ You are not authorized. Please connect your Google Calendar first.", reply_markup=markup)
     return wrapper
 
 @bot.message_handler(func=lambda m: m.text == "Create Task")
+@timed("handler")
 @require_auth
 def manual_create_start(message):
-    bot.send_message(message.chat.id, "Please describe the task/event in natural language (e.g., 'Meeting with John tomorrow at 3pm').")
+    outbox.send_message(message.chat.id, "Please describe the task/event in natural language (e.g., 'Meeting with John tomorrow at 3pm').")
 
 @bot.message_handler(func=lambda m: m.text == "My Tasks")
+@timed("handler")
 @require_auth
 def list_tasks(message):
     list_upcoming_events(message.chat.id)
 
-def list_upcoming_events(chat_id):
-    service = GoogleCalendarService(chat_id)
-    events = service.list_upcoming_events()
-    
-    if events is None:
-        bot.send_message(chat_id, "Please authenticate first using /auth.")
+def list_upcoming_events(chat_id, page=0, message_id=None, force_sync=False):
+    service = calendar_pool.get(chat_id)
+    if not service.is_authenticated():
+        outbox.send_message(chat_id, "Please authenticate first using /auth.")
         return
 
-    if not events:
-        bot.send_message(chat_id, "No upcoming events found.")
+    # Pull only what changed since the last sync, then page through the mirror
+    event_mirror.sync(service, force=force_sync)
+    events, has_more = event_mirror.list_upcoming(chat_id, page, Config.TASKS_PAGE_SIZE)
+
+    if not events and page == 0:
+        text, markup = "No upcoming events found.", None
+    else:
+        text, markup = "Here are your upcoming events:", get_tasks_keyboard(events, page, has_more)
+
+    if message_id:
+        try:
+            outbox.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+        except Exception:
+            # Telegram rejects edits that change nothing (e.g. Refresh with no news)
+            pass
+    else:
+        outbox.send_message(chat_id, text, reply_markup=markup)
+
+@bot.message_handler(content_types=['document'])
+@timed("handler")
+@require_auth
+def import_calendar_file(message):
+    chat_id = message.chat.id
+    document = message.document
+    file_name = document.file_name or "file"
+    if not file_name.lower().endswith((".ics", ".csv")):
+        outbox.reply_to(message, "Send an .ics or .csv file to import events.")
+        return
+    if document.file_size and document.file_size > Config.IMPORT_MAX_BYTES:
+        outbox.reply_to(message, "That file is too large to import.")
         return
 
-    bot.send_message(chat_id, "Here are your upcoming events:", reply_markup=get_tasks_keyboard(events))
+    service = calendar_pool.get(chat_id)
+    colors = db.get_user_settings(chat_id).get('colors', {})
+    progress = outbox.send_message(chat_id, format_import_progress(file_name, 0, 0))
+    created, failed, samples = 0, 0, []
+
+    def record_error(error):
+        nonlocal failed
+        failed += 1
+        if len(samples) < MAX_IMPORT_ERRORS_SHOWN:
+            samples.append(error)
+
+    try:
+        # The file is parsed while it downloads and inserted one batch
+        # request per chunk, so memory stays flat however long it is.
+        parsed = parse_events(file_name, iter_download(bot.get_file_url(document.file_id)))
+        for chunk in chunked(parsed, Config.IMPORT_CHUNK_SIZE):
+            events = [event for event, _ in chunk if event]
+            for _, error in chunk:
+                if error:
+                    record_error(error)
+            if events:
+                results = service.create_events([build_event_body(e, colors.get(e.category)) for e in events])
+                event_mirror.upsert_events(chat_id, [event for event, _ in results if event])
+                for event, (created_event, error) in zip(events, results):
+                    if created_event:
+                        created += 1
+                    else:
+                        record_error(f"{event.summary}: {error}")
+            outbox.edit_message_text_later(format_import_progress(file_name, created, failed), chat_id, progress.message_id)
+    except requests.RequestException as e:
+        # The file URL carries the bot token, so the error text stays in the logs
+        print(f"Import download error: {str(e).replace(Config.TELEGRAM_BOT_TOKEN, '<token>')}")
+        record_error(IMPORT_DOWNLOAD_FAILED)
+    except Exception as e:
+        record_error(f"Import stopped: {e}")
+    busy_cache.invalidate(chat_id)
+    outbox.edit_message_text(format_import_result(file_name, created, failed, samples), chat_id, progress.message_id)
+
+@bot.message_handler(commands=['export'])
+@timed("handler")
+@require_auth
+def export_calendar(message):
+    chat_id = message.chat.id
+    service = calendar_pool.get(chat_id)
+    event_mirror.sync(service)
+    # Written line by line from the mirror cursor to a temp file
+    with tempfile.TemporaryFile() as ics:
+        for line in iter_ics(event_mirror.iter_upcoming(chat_id)):
+            ics.write(line.encode("utf-8") + b"\r\n")
+        ics.seek(0)
+        outbox.send_document(chat_id, ics, visible_file_name="planify.ics", caption="Your upcoming events 📤")
+
+@bot.message_handler(commands=['stats'])
+def show_stats(message):
+    # Admins only; everyone else gets the same silence as an unknown command
+    if message.chat.id not in Config.ADMIN_CHAT_IDS:
+        return
+    report = metrics.summary()
+    profiler = metrics_module.profiler
+    if profiler and profiler.total:
+        report += "\n\nHottest frames:\n" + "\n".join(f"{share:>5.1%} {stack}" for stack, share in profiler.top())
+    # Telegram caps messages at 4096 characters
+    outbox.send_message(message.chat.id, f"<pre>{html.escape(report[:4000])}</pre>", parse_mode="HTML")
 
 @bot.callback_query_handler(func=lambda call: True)
+@timed("handler")
 def callback_query(call):
     chat_id = call.message.chat.id
 
@@ -153,151 +218,286 @@ def callback_query(call):
         if action == "auth":
              # Auth is the only one always allowed
              authenticate(call.message)
-             bot.answer_callback_query(call.id)
+             outbox.answer_callback_query(call.id)
              return
 
         # Check auth for others
-        service = GoogleCalendarService(chat_id)
+        service = calendar_pool.get(chat_id)
         if not service.is_authenticated():
             markup = types.InlineKeyboardMarkup()
             markup.add(types.InlineKeyboardButton("Authorize Google Calendar", callback_data="menu_auth"))
-            bot.send_message(chat_id, "⚠️ You need to authorize first.", reply_markup=markup)
-            bot.answer_callback_query(call.id, "Auth required")
+            outbox.send_message(chat_id, "⚠️ You need to authorize first.", reply_markup=markup)
+            outbox.answer_callback_query(call.id, "Auth required")
             return
 
         if action == "create":
-             bot.send_message(chat_id, "Please describe the task/event in natural language (e.g., 'Meeting with John tomorrow at 3pm').")
+             outbox.send_message(chat_id, "Please describe the task/event in natural language (e.g., 'Meeting with John tomorrow at 3pm').")
         elif action == "tasks":
              list_upcoming_events(chat_id)
         elif action == "settings":
-             bot.send_message(chat_id, "Settings feature coming soon!")
+             show_settings(chat_id)
         
-        bot.answer_callback_query(call.id)
+        outbox.answer_callback_query(call.id)
         return
     
+    if call.data.startswith("settings_"):
+        handle_settings_callback(chat_id, call)
+        outbox.answer_callback_query(call.id)
+        return
+
     if call.data == "confirm_event":
-        event = temp_events.get(chat_id)
-        if event:
-            service = GoogleCalendarService(chat_id)
-            # Use settings for colors if available
-            settings = db.get_user_settings(chat_id)
-            color_id = settings.get('colors', {}).get(event.category)
-            
-            try:
-                service.create_event(
-                    summary=event.summary,
-                    start_time=event.start_time,
-                    end_time=event.end_time,
-                    description=event.description,
-                    location=event.location,
-                    attendees=event.attendees,
-                    color_id=color_id
-                )
-                bot.answer_callback_query(call.id, "Event created!")
-                bot.edit_message_text("Event added to your calendar successfully! ✅", chat_id, call.message.message_id)
-                del temp_events[chat_id]
-            except Exception as e:
-                bot.send_message(chat_id, f"Error creating event: {e}")
+        pending = conversation.load_proposals(chat_id)
+        if pending:
+            confirm_pending_events(chat_id, call, pending["events"])
         else:
-            bot.answer_callback_query(call.id, "Session expired.")
+            outbox.answer_callback_query(call.id, "Session expired.")
             
     elif call.data == "cancel_event":
-        if chat_id in temp_events:
-            del temp_events[chat_id]
-        bot.answer_callback_query(call.id, "Cancelled.")
-        bot.delete_message(chat_id, call.message.message_id)
+        conversation.clear_proposals(chat_id)
+        outbox.answer_callback_query(call.id, "Cancelled.")
+        outbox.delete_message_later(chat_id, call.message.message_id)
 
     elif call.data == "edit_event":
-        msg = bot.send_message(chat_id, "Please enter the correction (e.g., 'Change time to 5pm'):")
-        bot.register_next_step_handler(msg, process_edit_request)
+        outbox.send_message(chat_id, "Please enter the correction (e.g., 'Change time to 5pm'):")
+        conversation.save_pending_step(chat_id, "edit")
 
     elif call.data == "refresh_tasks":
-        bot.delete_message(chat_id, call.message.message_id)
-        list_tasks(call.message) # Hacky call passing message object
+        list_upcoming_events(chat_id, message_id=call.message.message_id, force_sync=True)
+        outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("tasks_page_"):
+        page = int(call.data.rsplit("_", 1)[1])
+        list_upcoming_events(chat_id, page=page, message_id=call.message.message_id)
+        outbox.answer_callback_query(call.id)
+
+    elif call.data == "select_tasks":
+        selection = {"page": 0, "ids": set()}
+        conversation.save_selection(chat_id, selection)
+        show_task_selection(chat_id, call.message.message_id, selection)
+        outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("select_page_"):
+        selection = conversation.load_selection(chat_id)
+        selection["page"] = int(call.data.rsplit("_", 1)[1])
+        conversation.save_selection(chat_id, selection)
+        show_task_selection(chat_id, call.message.message_id, selection)
+        outbox.answer_callback_query(call.id)
+
+    elif call.data.startswith("toggle_"):
+        event_id = call.data.split("_", 1)[1]
+        selection = conversation.load_selection(chat_id)
+        selection["ids"] ^= {event_id}
+        conversation.save_selection(chat_id, selection)
+        show_task_selection(chat_id, call.message.message_id, selection)
+        outbox.answer_callback_query(call.id)
+
+    elif call.data == "bulk_delete":
+        delete_selected_events(chat_id, call)
+
+    elif call.data == "select_cancel":
+        conversation.clear_selection(chat_id)
+        list_upcoming_events(chat_id, message_id=call.message.message_id)
+        outbox.answer_callback_query(call.id)
 
     elif call.data.startswith("view_"):
-        event_id = call.data.split("_")[1]
-        # Fetch details? We have them in list mostly, but let's show actions
-        bot.edit_message_text(f"Event ID: {event_id}\nSelect action:", chat_id, call.message.message_id, reply_markup=get_event_action_keyboard(event_id))
+        # Event ids of recurring instances contain underscores
+        event_id = call.data.split("_", 1)[1]
+        event = event_mirror.get_event(chat_id, event_id)
+        text = format_event_details(event) if event else f"Event ID: {event_id}"
+        outbox.edit_message_text(f"{text}\n\nSelect action:", chat_id, call.message.message_id, parse_mode="Markdown", reply_markup=get_event_action_keyboard(event_id))
 
     elif call.data.startswith("delete_"):
-        event_id = call.data.split("_")[1]
-        service = GoogleCalendarService(chat_id)
+        event_id = call.data.split("_", 1)[1]
+        service = calendar_pool.get(chat_id)
         if service.delete_event(event_id):
-            bot.answer_callback_query(call.id, "Event deleted.")
-            bot.delete_message(chat_id, call.message.message_id)
-            list_tasks(call.message)
+            event_mirror.remove_event(chat_id, event_id)
+            busy_cache.invalidate(chat_id)
+            outbox.answer_callback_query(call.id, "Event deleted.")
+            list_upcoming_events(chat_id, message_id=call.message.message_id)
         else:
-            bot.answer_callback_query(call.id, "Failed to delete.")
+            outbox.answer_callback_query(call.id, "Failed to delete.")
 
+def show_settings(chat_id, message_id=None):
+    settings = db.get_user_settings(chat_id)
+    text, markup = format_settings(settings), get_settings_keyboard(settings)
+    if message_id:
+        outbox.edit_message_text(text, chat_id, message_id, parse_mode="Markdown", reply_markup=markup)
+    else:
+        outbox.send_message(chat_id, text, parse_mode="Markdown", reply_markup=markup)
+
+def handle_settings_callback(chat_id, call):
+    message_id = call.message.message_id
+    action = call.data[len("settings_"):]
+    settings = db.get_user_settings(chat_id)
+
+    if action == "notify":
+        db.update_user_setting(chat_id, "notifications", not settings.get("notifications"))
+    elif action == "lead":
+        db.update_user_setting(chat_id, "reminder_minutes", next_lead_minutes(settings["reminder_minutes"]))
+        event_mirror.replan_reminders(chat_id)
+    elif action.startswith("cat_"):
+        category = action[len("cat_"):]
+        if category not in CATEGORIES:
+            return
+        # The palette is fetched once per process, not per screen
+        palette = color_palette.get(calendar_pool.get(chat_id))
+        current = settings.get("colors", {}).get(category)
+        outbox.edit_message_text(f"🎨 Pick a colour for **{category}** events:", chat_id, message_id,
+                                 parse_mode="Markdown", reply_markup=get_color_keyboard(category, palette, current))
+        return
+    elif action.startswith("color_"):
+        category, _, color_id = action[len("color_"):].rpartition("_")
+        if category not in CATEGORIES:
+            return
+        db.update_user_setting(chat_id, f"colors.{category}", None if color_id == "0" else color_id)
+    elif action == "close":
+        outbox.edit_message_text("Settings saved ✅", chat_id, message_id)
+        return
+    # "back" and every change re-render the settings screen
+    show_settings(chat_id, message_id)
+
+def confirm_pending_events(chat_id, call, events):
+    # Pooled client and cached settings: no Mongo round-trip when both are warm
+    service = calendar_pool.get(chat_id)
+    # Use settings for colors if available
+    colors = db.get_user_settings(chat_id).get('colors', {})
+    bodies = [build_event_body(event, colors.get(event.category)) for event in events]
+
+    try:
+        if len(bodies) == 1:
+            results = [(service.create_event(bodies[0]), None)]
+        else:
+            # One batch request for all proposals, failures reported per event
+            results = service.create_events(bodies)
+    except Exception as e:
+        outbox.send_message(chat_id, f"Error creating event: {e}")
+        return
+
+    for created, error in results:
+        if created:
+            event_mirror.upsert_event(chat_id, created)
+            busy_cache.add(chat_id, created)
+    conversation.clear_proposals(chat_id)
+    created_count = sum(1 for created, _ in results if created)
+    outbox.answer_callback_query(call.id, "Event created!" if created_count == 1 else f"{created_count} events created!")
+    outbox.edit_message_text(format_batch_result(events, results), chat_id, call.message.message_id)
+
+def show_task_selection(chat_id, message_id, selection):
+    # The list screen already synced the mirror, so just page through it
+    events, has_more = event_mirror.list_upcoming(chat_id, selection["page"], Config.TASKS_PAGE_SIZE)
+    markup = get_select_tasks_keyboard(events, selection["ids"], selection["page"], has_more)
+    try:
+        outbox.edit_message_text("Select the events to delete:", chat_id, message_id, reply_markup=markup)
+    except Exception:
+        pass
+
+def delete_selected_events(chat_id, call):
+    selection = conversation.load_selection(chat_id)
+    if not selection["ids"]:
+        outbox.answer_callback_query(call.id, "Nothing selected.")
+        return
+
+    event_ids = list(selection["ids"])
+    service = calendar_pool.get(chat_id)
+    try:
+        results = service.delete_events(event_ids)
+    except Exception as e:
+        outbox.answer_callback_query(call.id, f"Failed to delete: {e}")
+        return
+
+    for event_id, (ok, _) in zip(event_ids, results):
+        if ok:
+            event_mirror.remove_event(chat_id, event_id)
+    busy_cache.invalidate(chat_id)
+    deleted = sum(1 for ok, _ in results if ok)
+    failed = len(results) - deleted
+    conversation.clear_selection(chat_id)
+    outbox.answer_callback_query(call.id, f"Deleted {deleted} events." + (f" {failed} failed." if failed else ""))
+    list_upcoming_events(chat_id, message_id=call.message.message_id)
+
+@timed("handler")
 def process_edit_request(message):
     chat_id = message.chat.id
-    correction = message.text
-    original_event = temp_events.get(chat_id)
-    
-    if original_event:
-        # Re-parse context
-        # Ideally we'd keep original text, but let's just make a composite text
-        composite_text = f"Summary: {original_event.summary}, Time: {original_event.start_time}. Correction: {correction}"
-        
-        # Or simpler: Just re-run AI with correction as prompt?
-        # Let's clean up user message
-        try:
-             bot.delete_message(chat_id, message.message_id)
-        except:
-             pass
+    pending = conversation.load_proposals(chat_id)
+    if not pending:
+        outbox.send_message(chat_id, "No event to edit.")
+        return
+    outbox.delete_message_later(chat_id, message.message_id)
 
-        process_natural_language(message, text_override=composite_text)
-    else:
-        bot.send_message(chat_id, "No event to edit.")
+    # Corrections apply to the most recent proposal, as a patch on the
+    # structured event: fields the correction doesn't mention are kept
+    current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    edited = ai_service.apply_correction(pending["events"][-1], message.text, current_time, pending["sources"][-1])
+    if edited is None:
+        outbox.send_message(chat_id, "Sorry, I couldn't apply that correction. Try rephrasing it.")
+        return
+    if edited == pending["events"][-1]:
+        outbox.send_message(chat_id, NOTHING_CHANGED)
+        return
+
+    events = pending["events"][:-1] + [edited]
+    service = calendar_pool.get(chat_id)
+    colors = db.get_user_settings(chat_id).get('colors', {})
+    conflicts = [busy_cache.check(service, event) for event in events]
+    if pending["message_id"]:
+        outbox.delete_message_later(chat_id, pending["message_id"])
+    card = outbox.send_message(chat_id, format_proposals(events, colors, conflicts), parse_mode="Markdown", reply_markup=get_confirmation_keyboard(len(events)))
+    conversation.save_proposals(chat_id, events, card.message_id, pending["sources"])
 
 @bot.message_handler(func=lambda m: True)
-def process_natural_language(message, text_override=None):
+@timed("handler")
+def process_natural_language(message):
     if message.text.startswith('/'): return
     
     chat_id = message.chat.id
-    if not is_authorized(chat_id):
+    step = conversation.pop_pending_step(chat_id)
+    if step == "auth_code":
+        process_auth_code(message)
+        return
+    if step == "edit":
+        process_edit_request(message)
+        return
+
+    service = calendar_pool.get(chat_id)
+    if not service.is_authenticated():
         markup = types.InlineKeyboardMarkup()
         markup.add(types.InlineKeyboardButton("Authorize Google Calendar", callback_data="menu_auth"))
-        bot.send_message(chat_id, "⚠️ Please identify yourself to Google Calendar before creating tasks.", reply_markup=markup)
+        outbox.send_message(chat_id, "⚠️ Please identify yourself to Google Calendar before creating tasks.", reply_markup=markup)
         return
 
-    text = text_override or message.text
+    text = message.text
 
-    
-    msg = bot.send_message(chat_id, "Thinking... 🧠")
+    placeholder = outbox.send_message(chat_id, "Thinking... 🧠")
+    # Busy times load while the model works
+    busy_cache.prefetch(service)
     
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    event_schema = ai_service.extract_event_details(text, current_time)
+    # A message can describe several events; all of them are proposed together.
+    # While Gemini streams, the placeholder fills in field by field.
+    throttle = EditThrottle(Config.STREAM_EDIT_INTERVAL)
+    def show_partial(partials):
+        preview = format_partial_proposals(partials)
+        if throttle.ready(preview):
+            outbox.edit_message_text_later(preview, chat_id, placeholder.message_id, parse_mode="Markdown")
+    new_events = ai_service.extract_events(text, current_time, on_partial=show_partial)
     
-    bot.delete_message(chat_id, msg.message_id)
-    if not text_override:
-        # Delete user message to keep chat clean as requested
-        try:
-           bot.delete_message(chat_id, message.message_id)
-        except:
-           pass
+    # Delete user message to keep chat clean as requested
+    outbox.delete_message_later(chat_id, message.message_id)
+
+    if new_events:
+        pending = conversation.load_proposals(chat_id)
+        events, sources = conversation.add_proposals(pending, new_events, text)
+        if pending and pending["message_id"]:
+            outbox.delete_message_later(chat_id, pending["message_id"])
 
-    if event_schema:
-        temp_events[chat_id] = event_schema
-        
         # Get color based on category
-        settings = db.get_user_settings(chat_id)
-        category_color = "Default"
-        if event_schema.category in settings.get('colors', {}):
-             category_color = settings['colors'][event_schema.category] # Maps to color ID
-
-        response_text = (
-            f"📅 **New Event Proposal**\n\n"
-            f"📌 **Summary:** {event_schema.summary}\n"
-            f"🕒 **Start:** {event_schema.start_time}\n"
-            f"🕓 **End:** {event_schema.end_time}\n"
-            f"📍 **Location:** {event_schema.location or 'N/A'}\n"
-            f"📝 **Description:** {event_schema.description or 'N/A'}\n"
-            f"🎨 **Category:** {event_schema.category} (Color: {category_color})\n\n"
-            f"Does this look correct?"
-        )
+        colors = db.get_user_settings(chat_id).get('colors', {}) # Maps to color ID
+        conflicts = [busy_cache.check(service, event) for event in events]
+        response_text = format_proposals(events, colors, conflicts)
         
-        bot.send_message(chat_id, response_text, parse_mode="Markdown", reply_markup=get_confirmation_keyboard())
+        # The placeholder becomes the proposal card: one edit instead of a
+        # delete plus a new message
+        outbox.edit_message_text(response_text, chat_id, placeholder.message_id, parse_mode="Markdown", reply_markup=get_confirmation_keyboard(len(events)))
+        conversation.save_proposals(chat_id, events, placeholder.message_id, sources)
     else:
-        bot.send_message(chat_id, "Sorry, I couldn't understand that. Try being more specific.")
+        outbox.edit_message_text("Sorry, I couldn't understand that. Try being more specific.", chat_id, placeholder.message_id)
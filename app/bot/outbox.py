@@ -0,0 +1,432 @@
+from collections import OrderedDict, deque
+from telebot.apihelper import ApiTelegramException
+from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+from app.config import Config
+from app.bot.bot_instance import bot
+from app.metrics import metrics
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        # Takes a token and returns how long the caller must wait before using it
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def try_take(self):
+        # Takes a token only if one is available now; otherwise returns how
+        # long until there will be one, leaving the bucket untouched
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def give_back(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+class EditThrottle:
+    """Progressive edits of one message: at most one per interval, repeats skipped.
+
+    Whatever is skipped is superseded by the final edit anyway.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.text = None
+        self.sent_at = 0.0
+
+    def ready(self, text):
+        now = time.monotonic()
+        if text == self.text or now - self.sent_at < self.interval:
+            return False
+        self.text, self.sent_at = text, now
+        return True
+
+class Outbox:
+    """Single exit point for Telegram calls made by the handlers.
+
+    Every call passes a global and a per-chat token bucket so bursts stay
+    under Telegram's flood limits, and 429 replies are retried after the
+    retry_after the API asks for. Calls whose result nobody waits for
+    (deleting messages, intermediate edits) are queued per chat, and a
+    heap orders the chats by when their bucket next has a token. Workers
+    never sleep on one chat's limit, so a throttled chat does not hold up
+    the others. Repeated edits of the same message coalesce into the latest.
+    """
+
+    def __init__(self, bot, global_rate=30, chat_rate=1.0, chat_burst=3, max_retries=3, max_chats=10000, workers=2):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chat_buckets = OrderedDict()
+        self._buckets_lock = threading.Lock()
+        self._ready = []  # heap of (ready_at, seq, chat_id), one entry per chat with queued calls
+        self._chat_items = {}  # chat_id -> deque of [action, message_id, attempts]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pending_edits = {}  # (chat_id, message_id) -> latest edit kwargs
+        self._inflight_edits = {}  # (chat_id, message_id) -> Event set once the worker's edit is done
+        self._edits_lock = threading.Lock()
+        self.workers = workers
+        self._threads = []
+        self.sent = 0
+        self.retried = 0
+        self.coalesced = 0
+
+    def _chat_bucket(self, chat_id):
+        with self._buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+                # An evicted bucket was idle long enough to be full again anyway
+                while len(self._chat_buckets) > self.max_chats:
+                    self._chat_buckets.popitem(last=False)
+            else:
+                self._chat_buckets.move_to_end(chat_id)
+            return bucket
+
+    def _send(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except ApiTelegramException:
+            metrics.observe("telegram", method.__name__, time.perf_counter() - start, error=True)
+            raise
+        self.sent += 1
+        metrics.observe("telegram", method.__name__, time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    def _retry_after(error):
+        return (error.result_json or {}).get("parameters", {}).get("retry_after", 1)
+
+    def _call(self, chat_id, method, *args, per_chat=True, **kwargs):
+        # The handler is waiting for this one, so it sleeps out the limits itself
+        for attempt in range(self.max_retries + 1):
+            wait = self.global_bucket.reserve()
+            if per_chat:
+                wait = max(wait, self._chat_bucket(chat_id).reserve())
+            if wait:
+                time.sleep(wait)
+            try:
+                return self._send(method, *args, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 429 or attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                time.sleep(self._retry_after(e))
+
+    # --- Calls the handler waits for ---
+    def send_message(self, chat_id, text, **kwargs):
+        return self._call(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    def reply_to(self, message, text, **kwargs):
+        return self._call(message.chat.id, self.bot.reply_to, message, text, **kwargs)
+
+    def send_document(self, chat_id, document, **kwargs):
+        return self._call(chat_id, self.bot.send_document, chat_id, document, **kwargs)
+
+    def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        # A newer edit supersedes any queued one for the same message, and
+        # must not be overtaken by one the worker is sending right now. That
+        # is a single request in flight (workers never sleep on limits), so
+        # the wait is at most one round-trip.
+        with self._edits_lock:
+            if self._pending_edits.pop((chat_id, message_id), None) is not None:
+                self.coalesced += 1
+            inflight = self._inflight_edits.get((chat_id, message_id))
+        if inflight is not None:
+            inflight.wait(timeout=10)
+        try:
+            return self._call(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+        except ApiTelegramException as e:
+            # Re-sending identical content is not worth failing a handler over
+            if "message is not modified" in str(e):
+                return None
+            raise
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        # Callback answers don't post to the chat, so only the global limit applies
+        try:
+            return self._call(None, self.bot.answer_callback_query, callback_query_id, text, per_chat=False, **kwargs)
+        except ApiTelegramException as e:
+            # Stale callbacks (older than ~15 minutes) can no longer be answered
+            print(f"Callback answer failed: {e}")
+
+    # --- Fire-and-forget calls, run by the background workers ---
+    def delete_message_later(self, chat_id, message_id):
+        self._enqueue(chat_id, "delete", message_id)
+
+    def edit_message_text_later(self, text, chat_id, message_id, **kwargs):
+        key = (chat_id, message_id)
+        with self._edits_lock:
+            already_queued = key in self._pending_edits
+            self._pending_edits[key] = dict(kwargs, text=text)
+        if already_queued:
+            self.coalesced += 1
+        else:
+            self._enqueue(chat_id, "edit", message_id)
+
+    def _enqueue(self, chat_id, action, message_id):
+        if not self._threads:
+            with self._buckets_lock:
+                if not self._threads:
+                    for i in range(self.workers):
+                        thread = threading.Thread(target=self._run, name=f"telegram-outbox-{i}", daemon=True)
+                        thread.start()
+                        self._threads.append(thread)
+        with self._cond:
+            items = self._chat_items.get(chat_id)
+            if items is None:
+                # A chat being worked on keeps its deque and is rescheduled afterwards
+                items = self._chat_items[chat_id] = deque()
+                heapq.heappush(self._ready, (time.monotonic(), next(self._seq), chat_id))
+                self._cond.notify()
+            items.append([action, message_id, 0])
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._ready or self._ready[0][0] > time.monotonic():
+                    self._cond.wait(self._ready[0][0] - time.monotonic() if self._ready else None)
+                _, _, chat_id = heapq.heappop(self._ready)
+                item = self._chat_items[chat_id][0]
+            try:
+                done, delay = self._process(chat_id, item)
+            except Exception as e:
+                print(f"Outbox {item[0]} failed: {e}")
+                done, delay = True, 0.0
+            with self._cond:
+                items = self._chat_items[chat_id]
+                if done:
+                    items.popleft()
+                if items:
+                    heapq.heappush(self._ready, (time.monotonic() + delay, next(self._seq), chat_id))
+                    self._cond.notify()
+                else:
+                    del self._chat_items[chat_id]
+
+    def _process(self, chat_id, item):
+        """Runs the chat's next call if its limits allow; returns (done, delay before the chat's next call)."""
+        action, message_id, attempts = item
+        key = (chat_id, message_id)
+        if action == "edit":
+            with self._edits_lock:
+                if key not in self._pending_edits:
+                    # Superseded by a direct edit
+                    return True, 0.0
+        chat_bucket = self._chat_bucket(chat_id)
+        wait = chat_bucket.try_take()
+        if wait:
+            return False, wait
+        wait = self.global_bucket.try_take()
+        if wait:
+            chat_bucket.give_back()
+            return False, wait
+        try:
+            if action == "delete":
+                self._send(self.bot.delete_message, chat_id, message_id)
+                return True, 0.0
+            with self._edits_lock:
+                kwargs = self._pending_edits.pop(key, None)
+                if kwargs is None:
+                    chat_bucket.give_back()
+                    self.global_bucket.give_back()
+                    return True, 0.0
+                self._inflight_edits[key] = threading.Event()
+            try:
+                text = kwargs.pop("text")
+                self._send(self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+            finally:
+                with self._edits_lock:
+                    self._inflight_edits.pop(key).set()
+            return True, 0.0
+        except ApiTelegramException as e:
+            if e.error_code != 429:
+                raise
+            # Either way the chat's next call waits out retry_after; the worker does not
+            if action == "delete" and attempts < self.max_retries:
+                self.retried += 1
+                item[2] += 1
+                return False, self._retry_after(e)
+            # An intermediate edit is dropped, a newer one or the final edit follows
+            print(f"Outbox {action} failed: {e}")
+            return True, self._retry_after(e)
+
+    def stats(self):
+        with self._cond:
+            queued = sum(len(items) for items in self._chat_items.values())
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+            "queued": queued,
+        }
+
+class AsyncOutbox(Outbox):
+    """Outbox for AsyncTeleBot: the same limits, retries and coalescing.
+
+    Waiting on a bucket or a retry_after is an asyncio.sleep, so only the
+    waiting handler is held up. Fire-and-forget calls are queued per chat
+    as in Outbox, and each chat with queued calls has one task draining
+    them, so a throttled chat does not hold up the others.
+    """
+
+    def __init__(self, bot, *args, **kwargs):
+        super().__init__(bot, *args, **kwargs)
+        self._drains = {}  # chat_id -> task running the chat's queued calls
+
+    async def _send(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except AsyncApiTelegramException:
+            metrics.observe("telegram", method.__name__, time.perf_counter() - start, error=True)
+            raise
+        self.sent += 1
+        metrics.observe("telegram", method.__name__, time.perf_counter() - start)
+        return result
+
+    async def _call(self, chat_id, method, *args, per_chat=True, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            wait = self.global_bucket.reserve()
+            if per_chat:
+                wait = max(wait, self._chat_bucket(chat_id).reserve())
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                return await self._send(method, *args, **kwargs)
+            except AsyncApiTelegramException as e:
+                if e.error_code != 429 or attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                await asyncio.sleep(self._retry_after(e))
+
+    # --- Calls the handler waits for ---
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._call(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    async def reply_to(self, message, text, **kwargs):
+        return await self._call(message.chat.id, self.bot.reply_to, message, text, **kwargs)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._call(chat_id, self.bot.send_document, chat_id, document, **kwargs)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        # As in Outbox: drop the queued edit, wait for one being sent
+        if self._pending_edits.pop((chat_id, message_id), None) is not None:
+            self.coalesced += 1
+        inflight = self._inflight_edits.get((chat_id, message_id))
+        if inflight is not None:
+            try:
+                await asyncio.wait_for(inflight.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
+        try:
+            return await self._call(chat_id, self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+        except AsyncApiTelegramException as e:
+            if "message is not modified" in str(e):
+                return None
+            raise
+
+    async def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        try:
+            return await self._call(None, self.bot.answer_callback_query, callback_query_id, text, per_chat=False, **kwargs)
+        except AsyncApiTelegramException as e:
+            print(f"Callback answer failed: {e}")
+
+    # --- Fire-and-forget calls, run by one task per chat ---
+    def _enqueue(self, chat_id, action, message_id):
+        # Everything here runs on the event loop, so the queues need no lock
+        self._chat_items.setdefault(chat_id, deque()).append([action, message_id, 0])
+        if chat_id not in self._drains:
+            self._drains[chat_id] = asyncio.create_task(self._drain(chat_id))
+
+    async def _drain(self, chat_id):
+        items = self._chat_items[chat_id]
+        try:
+            while items:
+                item = items[0]
+                try:
+                    done, delay = await self._process(chat_id, item)
+                except Exception as e:
+                    # e.g. a 400 for a message the user already deleted
+                    print(f"Outbox {item[0]} failed: {e}")
+                    done, delay = True, 0.0
+                if done:
+                    items.popleft()
+                if delay:
+                    await asyncio.sleep(delay)
+        finally:
+            del self._chat_items[chat_id]
+            del self._drains[chat_id]
+
+    async def _process(self, chat_id, item):
+        """Runs the chat's next call; returns (done, delay before the chat's next call)."""
+        action, message_id, attempts = item
+        key = (chat_id, message_id)
+        if action == "edit" and key not in self._pending_edits:
+            # Superseded by a direct edit
+            return True, 0.0
+        # The task belongs to this chat, so it can sleep out the limits itself
+        wait = max(self.global_bucket.reserve(), self._chat_bucket(chat_id).reserve())
+        if wait:
+            await asyncio.sleep(wait)
+        try:
+            if action == "delete":
+                await self._send(self.bot.delete_message, chat_id, message_id)
+                return True, 0.0
+            kwargs = self._pending_edits.pop(key, None)
+            if kwargs is None:
+                return True, 0.0
+            self._inflight_edits[key] = asyncio.Event()
+            try:
+                text = kwargs.pop("text")
+                await self._send(self.bot.edit_message_text, text, chat_id, message_id, **kwargs)
+            finally:
+                self._inflight_edits.pop(key).set()
+            return True, 0.0
+        except AsyncApiTelegramException as e:
+            if e.error_code != 429:
+                raise
+            if action == "delete" and attempts < self.max_retries:
+                self.retried += 1
+                item[2] += 1
+                return False, self._retry_after(e)
+            print(f"Outbox {action} failed: {e}")
+            return True, self._retry_after(e)
+
+outbox = Outbox(
+    bot,
+    global_rate=Config.OUTBOX_GLOBAL_RATE,
+    chat_rate=Config.OUTBOX_CHAT_RATE,
+    chat_burst=Config.OUTBOX_CHAT_BURST,
+    max_retries=Config.OUTBOX_MAX_RETRIES,
+    workers=Config.OUTBOX_WORKERS,
+)
+metrics.register_collector("outbox", outbox.stats)
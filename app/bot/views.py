@@ -0,0 +1,235 @@
+import datetime
+import re
+from telebot import types
+from app.services.google_service import EVENT_COLORS
+from app.services.schemas import CATEGORIES
+
+# Closest emoji to each Calendar event colour
+COLOR_EMOJI = {"1": "🟪", "2": "🟩", "3": "🟣", "4": "🩷", "5": "🟨", "6": "🟧",
+               "7": "🩵", "8": "⬜", "9": "🟦", "10": "🟢", "11": "🟥"}
+
+def escape_md(text):
+    # Legacy Markdown only has these four; a stray one in Calendar text is a 400
+    return re.sub(r"([_*`\[])", r"\\\1", str(text))
+
+def color_label(color_id):
+    if not color_id:
+        return "Default"
+    name = EVENT_COLORS.get(color_id, {}).get("name", f"Colour {color_id}")
+    return f"{COLOR_EMOJI.get(color_id, '🎨')} {name}"
+
+# --- Keyboards ---
+def get_main_menu():
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    markup.add(
+        types.InlineKeyboardButton("Create Task", callback_data="menu_create"),
+        types.InlineKeyboardButton("My Tasks", callback_data="menu_tasks"),
+        types.InlineKeyboardButton("Settings", callback_data="menu_settings"),
+        types.InlineKeyboardButton("Auth", callback_data="menu_auth")
+    )
+    return markup
+
+def get_confirmation_keyboard(count=1):
+    markup = types.InlineKeyboardMarkup()
+    confirm_label = "Confirm" if count == 1 else f"Confirm all ({count})"
+    markup.add(types.InlineKeyboardButton(confirm_label, callback_data="confirm_event"),
+               types.InlineKeyboardButton("Edit", callback_data="edit_event"),
+               types.InlineKeyboardButton("Cancel", callback_data="cancel_event"))
+    return markup
+
+def format_start(event):
+    start = event.get('start', {}).get('dateTime', '') or event.get('start', {}).get('date', '')
+    # Format start time slightly
+    try:
+        dt = datetime.datetime.fromisoformat(start.replace('Z', '+00:00'))
+        return dt.strftime("%b %d %H:%M")
+    except:
+        return start
+
+def get_tasks_keyboard(events, page=0, has_more=False):
+    markup = types.InlineKeyboardMarkup()
+    for event in events:
+        summary = event.get('summary', 'No Title')
+        markup.add(types.InlineKeyboardButton(f"{summary} ({format_start(event)})", callback_data=f"view_{event['id']}"))
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton("« Prev", callback_data=f"tasks_page_{page - 1}"))
+    if has_more:
+        nav.append(types.InlineKeyboardButton("Next »", callback_data=f"tasks_page_{page + 1}"))
+    if nav:
+        markup.row(*nav)
+    markup.row(types.InlineKeyboardButton("Select", callback_data="select_tasks"),
+               types.InlineKeyboardButton("Refresh", callback_data="refresh_tasks"))
+    return markup
+
+def get_select_tasks_keyboard(events, selected, page=0, has_more=False):
+    markup = types.InlineKeyboardMarkup()
+    for event in events:
+        mark = "☑️" if event['id'] in selected else "⬜"
+        summary = event.get('summary', 'No Title')
+        markup.add(types.InlineKeyboardButton(f"{mark} {summary} ({format_start(event)})", callback_data=f"toggle_{event['id']}"))
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton("« Prev", callback_data=f"select_page_{page - 1}"))
+    if has_more:
+        nav.append(types.InlineKeyboardButton("Next »", callback_data=f"select_page_{page + 1}"))
+    if nav:
+        markup.row(*nav)
+    markup.row(types.InlineKeyboardButton(f"Delete selected ({len(selected)})", callback_data="bulk_delete"),
+               types.InlineKeyboardButton("Cancel", callback_data="select_cancel"))
+    return markup
+
+def get_event_action_keyboard(event_id):
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton("Delete", callback_data=f"delete_{event_id}"),
+               types.InlineKeyboardButton("Back", callback_data="tasks_page_0"))
+    return markup
+
+# --- Messages ---
+def format_auth_message(auth_url):
+    msg_text = (
+        "🔐 **Authorization Required**\n\n"
+        "To connect your Google Calendar:\n"
+        "1. Tap the link below (or hold to copy).\n"
+        "2. Select 'Open in...' to open in your browser or Telegram's browser.\n"
+        "3. Sign in to your Google Account.\n"
+        "4. Copy the authorization code provided.\n"
+        "5. Paste the code here."
+    )
+    
+    # We can't use url argument for auth url easily if it's too long... 
+    # But we can try putting it in text.
+    return f"{msg_text}\n\n👇 **Auth Link** 👇\n`{auth_url}`"
+
+def format_event_proposal(event_schema, category_color="Default", conflict=None):
+    warning = "\n".join(format_conflict(conflict))
+    return (
+        f"📅 **New Event Proposal**\n\n"
+        f"📌 **Summary:** {escape_md(event_schema.summary)}\n"
+        f"🕒 **Start:** {event_schema.start_time}\n"
+        f"🕓 **End:** {event_schema.end_time}\n"
+        f"📍 **Location:** {escape_md(event_schema.location or 'N/A')}\n"
+        f"📝 **Description:** {escape_md(event_schema.description or 'N/A')}\n"
+        f"🎨 **Category:** {event_schema.category} (Color: {category_color})\n\n"
+        + (f"{warning}\n\n" if warning else "")
+        + "Does this look correct?"
+    )
+
+def format_interval(interval):
+    start, end = interval
+    return f"{start.strftime('%a %d %b %H:%M')}–{end.strftime('%H:%M')}"
+
+def format_conflict(conflict, indent=""):
+    # conflict comes from busy_cache.check: busy and free intervals in local time
+    if not conflict:
+        return []
+    lines = [f"{indent}⚠️ Overlaps with: " + ", ".join(format_interval(i) for i in conflict["busy"])]
+    if conflict["free"]:
+        lines.append(f"{indent}💡 Free instead: " + ", ".join(format_interval(i) for i in conflict["free"]))
+    return lines
+
+def format_proposals(events, colors, conflicts=None):
+    # One card for every pending proposal of a chat
+    conflicts = conflicts or [None] * len(events)
+    if len(events) == 1:
+        return format_event_proposal(events[0], color_label(colors.get(events[0].category)), conflicts[0])
+    lines = [f"📅 **{len(events)} New Event Proposals**\n"]
+    for i, (event, conflict) in enumerate(zip(events, conflicts), start=1):
+        lines.append(f"{i}. 📌 **{escape_md(event.summary)}**")
+        lines.append(f"    🕒 {event.start_time} → {event.end_time}")
+        if event.location:
+            lines.append(f"    📍 {escape_md(event.location)}")
+        lines.append(f"    🎨 {event.category} (Color: {color_label(colors.get(event.category))})")
+        lines += format_conflict(conflict, "    ")
+    lines.append("\nConfirm all of them?")
+    return "\n".join(lines)
+
+def format_partial_proposals(partials):
+    # partials are the raw event dicts streamed so far; fields show up as they complete
+    lines = ["Thinking... 🧠\n"]
+    for item in partials:
+        lines.append(f"📌 **{escape_md(item['summary'])}**" if item.get("summary") else "📌 …")
+        if item.get("start_time"):
+            lines.append(f"    🕒 {escape_md(item['start_time'])}" + (f" → {escape_md(item['end_time'])}" if item.get("end_time") else ""))
+        if item.get("location"):
+            lines.append(f"    📍 {escape_md(item['location'])}")
+    return "\n".join(lines)
+
+def format_batch_result(events, results):
+    # results holds one (created_event, error) pair per proposed event
+    failed = [(event, error) for event, (_, error) in zip(events, results) if error]
+    if not failed:
+        if len(events) == 1:
+            return "Event added to your calendar successfully! ✅"
+        return f"{len(events)} events added to your calendar successfully! ✅"
+    lines = [f"✅ {len(events) - len(failed)} added, ❌ {len(failed)} failed:"]
+    lines += [f"• {event.summary}: {error}" for event, error in failed]
+    return "\n".join(lines)
+
+def format_import_progress(file_name, created, failed):
+    return f"📥 Importing {file_name}... {created} added" + (f", {failed} skipped" if failed else "")
+
+def format_import_result(file_name, created, failed, samples):
+    # samples holds the first few error messages, not all of them
+    lines = [f"📥 {file_name}: {created} events imported ✅"]
+    if failed:
+        lines.append(f"❌ {failed} skipped:")
+        lines += [f"• {sample}" for sample in samples]
+        if failed > len(samples):
+            lines.append(f"…and {failed - len(samples)} more")
+    return "\n".join(lines)
+
+def format_event_details(event):
+    end = event.get('end', {}).get('dateTime', '') or event.get('end', {}).get('date', '')
+    attendees = ", ".join(a.get('email', '') for a in event.get('attendees', [])) or 'N/A'
+    return (
+        f"📌 **{escape_md(event.get('summary', 'No Title'))}**\n\n"
+        f"🕒 **Start:** {escape_md(format_start(event))}\n"
+        f"🕓 **End:** {escape_md(end)}\n"
+        f"📍 **Location:** {escape_md(event.get('location') or 'N/A')}\n"
+        f"👥 **Attendees:** {escape_md(attendees)}\n"
+        f"📝 **Description:** {escape_md(event.get('description') or 'N/A')}"
+    )
+
+# --- Settings ---
+# Reminder lead times offered in Settings, in minutes
+REMINDER_LEAD_OPTIONS = [5, 10, 15, 30, 60]
+
+def next_lead_minutes(current):
+    # The lead-time button cycles through the options
+    later = [m for m in REMINDER_LEAD_OPTIONS if m > current]
+    return later[0] if later else REMINDER_LEAD_OPTIONS[0]
+
+def format_settings(settings):
+    reminders = f"On, {settings['reminder_minutes']} min before" if settings.get("notifications") else "Off"
+    lines = ["⚙️ **Settings**\n", f"🔔 Reminders: {reminders}\n", "🎨 Category colours:"]
+    colors = settings.get("colors", {})
+    lines += [f"• {category}: {color_label(colors.get(category))}" for category in CATEGORIES]
+    return "\n".join(lines)
+
+def get_settings_keyboard(settings):
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    notifications = settings.get("notifications")
+    markup.row(
+        types.InlineKeyboardButton(f"🔔 Reminders: {'On' if notifications else 'Off'}", callback_data="settings_notify"),
+        types.InlineKeyboardButton(f"⏱ {settings['reminder_minutes']} min before", callback_data="settings_lead"),
+    )
+    markup.add(*[types.InlineKeyboardButton(f"🎨 {category}", callback_data=f"settings_cat_{category}")
+                 for category in CATEGORIES])
+    markup.row(types.InlineKeyboardButton("Done", callback_data="settings_close"))
+    return markup
+
+def get_color_keyboard(category, palette, current=None):
+    markup = types.InlineKeyboardMarkup(row_width=3)
+    buttons = []
+    for color_id in palette:
+        label = color_label(color_id)
+        if color_id == current:
+            label = f"✓ {label}"
+        buttons.append(types.InlineKeyboardButton(label, callback_data=f"settings_color_{category}_{color_id}"))
+    markup.add(*buttons)
+    markup.row(
+        types.InlineKeyboardButton(("✓ " if not current else "") + "Default", callback_data=f"settings_color_{category}_0"),
+        types.InlineKeyboardButton("« Back", callback_data="settings_back"),
+    )
+    return markup
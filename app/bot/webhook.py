@@ -0,0 +1,76 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+from app.config import Config
+from app.bot.bot_instance import bot
+from app.bot.dispatcher import ChatPartitionedDispatcher
+from app.metrics import metrics, write_metrics
+
+dispatcher = ChatPartitionedDispatcher(
+    lambda update: bot.process_new_updates([update]),
+    workers=Config.WORKER_COUNT,
+    max_pending=Config.MAX_PENDING_UPDATES,
+    max_per_chat=Config.MAX_PENDING_PER_CHAT,
+    put_timeout=Config.ENQUEUE_TIMEOUT,
+)
+metrics.register_collector("dispatcher", lambda: {"queue_depth": dispatcher.queue_depth()})
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Prometheus scrapes the same server Telegram posts to
+        if self.path != Config.METRICS_PATH:
+            self.send_response(404)
+            self.end_headers()
+            return
+        write_metrics(self)
+
+    def do_POST(self):
+        if Config.CALENDAR_PUSH_URL and self.path == Config.CALENDAR_PUSH_PATH:
+            from app.services.calendar_push import calendar_push
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(calendar_push.handle(self.headers))
+            self.end_headers()
+            return
+        if self.path != Config.WEBHOOK_PATH:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if Config.WEBHOOK_SECRET and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != Config.WEBHOOK_SECRET:
+            self.send_response(403)
+            self.end_headers()
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            update = types.Update.de_json(self.rfile.read(length).decode("utf-8"))
+        except Exception as e:
+            print(f"Bad webhook payload: {e}")
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        if dispatcher.submit(update):
+            self.send_response(200)
+        else:
+            # Queue is full: a non-2xx reply makes Telegram redeliver later
+            self.send_response(503)
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def run_webhook():
+    dispatcher.start()
+    bot.remove_webhook()
+    bot.set_webhook(
+        url=Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH,
+        secret_token=Config.WEBHOOK_SECRET or None,
+        max_connections=Config.WEBHOOK_MAX_CONNECTIONS,
+    )
+    server = ThreadingHTTPServer((Config.WEBHOOK_HOST, Config.WEBHOOK_PORT), WebhookHandler)
+    print(f"🌐 Webhook listening on {Config.WEBHOOK_HOST}:{Config.WEBHOOK_PORT}{Config.WEBHOOK_PATH}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        dispatcher.stop()
@@ -7,7 +7,51 @@ class Config:
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-    DB_NAME = "planify_bot"
+    DB_NAME = os.getenv("DB_NAME", "planify_bot")
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+
+    # Update ingestion: "polling", "webhook" or "async"
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+    # Worker pool for webhook updates
+    WORKER_COUNT = int(os.getenv("WORKER_COUNT", "8"))
+    MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "1000"))
+    MAX_PENDING_PER_CHAT = int(os.getenv("MAX_PENDING_PER_CHAT", "20"))
+    ENQUEUE_TIMEOUT = float(os.getenv("ENQUEUE_TIMEOUT", "1.0"))
+
+    # Extraction cache in front of Gemini
+    AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "5000"))
+    AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "86400"))
+    AI_CACHE_MONGO = os.getenv("AI_CACHE_MONGO", "false").lower() == "true"
+
+    # Stream Gemini's answer and fill the "Thinking..." message in as fields arrive
+    AI_STREAMING = os.getenv("AI_STREAMING", "true").lower() == "true"
+    # Minimum seconds between two progressive edits of the same message
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+    # Local rule-based parser: results at or above this confidence skip Gemini
+    LOCAL_PARSER_MIN_CONFIDENCE = float(os.getenv("LOCAL_PARSER_MIN_CONFIDENCE", "0.8"))
+
+    # Outbound Telegram rate limits (messages per second)
+    OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+    OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+    OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+    OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+    # Threads sending queued deletes and edits
+    OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+
+    # Threads used by the async mode for blocking Calendar calls
+    ASYNC_EXECUTOR_THREADS = int(os.getenv("ASYNC_EXECUTOR_THREADS", "32"))
     
     # Paths
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,3 +60,79 @@ class Config:
     
     # Calendar Settings
     SCOPES = ['https://www.googleapis.com/auth/calendar']
+    TIMEZONE = os.getenv("TIMEZONE", "UTC")
+
+    # Conversation state: "memory" (single process) or "mongo" (shared by replicas)
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+    STATE_MAX_ENTRIES = int(os.getenv("STATE_MAX_ENTRIES", "10000"))
+    PROPOSAL_TTL = int(os.getenv("PROPOSAL_TTL", "86400"))
+    AUTH_FLOW_TTL = int(os.getenv("AUTH_FLOW_TTL", "900"))
+    SELECTION_TTL = int(os.getenv("SELECTION_TTL", "3600"))
+
+    # Background token refresh
+    CREDENTIAL_REFRESH_ENABLED = os.getenv("CREDENTIAL_REFRESH_ENABLED", "true").lower() == "true"
+    CREDENTIAL_REFRESH_INTERVAL = int(os.getenv("CREDENTIAL_REFRESH_INTERVAL", "60"))
+    CREDENTIAL_REFRESH_WINDOW = int(os.getenv("CREDENTIAL_REFRESH_WINDOW", "600"))
+    CREDENTIAL_REFRESH_BATCH = int(os.getenv("CREDENTIAL_REFRESH_BATCH", "100"))
+    CREDENTIAL_REFRESH_WORKERS = int(os.getenv("CREDENTIAL_REFRESH_WORKERS", "4"))
+
+    # Local event mirror
+    MIRROR_SYNC_INTERVAL = int(os.getenv("MIRROR_SYNC_INTERVAL", "60"))
+    TASKS_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", "10"))
+    # Calendar push channels, so events added in Google Calendar get reminders too.
+    # CALENDAR_PUSH_URL is the public HTTPS base Google posts to; empty disables push.
+    CALENDAR_PUSH_URL = os.getenv("CALENDAR_PUSH_URL", "")
+    CALENDAR_PUSH_PATH = os.getenv("CALENDAR_PUSH_PATH", "/calendar/notify")
+    # Listener for polling/async mode; webhook mode serves CALENDAR_PUSH_PATH itself
+    CALENDAR_PUSH_HOST = os.getenv("CALENDAR_PUSH_HOST", "0.0.0.0")
+    CALENDAR_PUSH_PORT = int(os.getenv("CALENDAR_PUSH_PORT", "8444"))
+    CALENDAR_PUSH_TTL = int(os.getenv("CALENDAR_PUSH_TTL", "604800"))
+    CALENDAR_PUSH_RENEW_BEFORE = int(os.getenv("CALENDAR_PUSH_RENEW_BEFORE", "86400"))
+    CALENDAR_PUSH_RETRY = int(os.getenv("CALENDAR_PUSH_RETRY", "3600"))
+    CALENDAR_PUSH_INTERVAL = int(os.getenv("CALENDAR_PUSH_INTERVAL", "300"))
+    CALENDAR_PUSH_BATCH = int(os.getenv("CALENDAR_PUSH_BATCH", "100"))
+    CALENDAR_PUSH_WORKERS = int(os.getenv("CALENDAR_PUSH_WORKERS", "4"))
+
+    # Event reminders
+    REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "true").lower() == "true"
+    REMINDER_LEAD_MINUTES = int(os.getenv("REMINDER_LEAD_MINUTES", "15"))
+    REMINDER_SHARD_COUNT = int(os.getenv("REMINDER_SHARD_COUNT", "1"))
+    # Comma-separated shards this process serves; empty means all of them
+    REMINDER_SHARDS = os.getenv("REMINDER_SHARDS", "")
+    REMINDER_LOAD_INTERVAL = int(os.getenv("REMINDER_LOAD_INTERVAL", "30"))
+    REMINDER_LOOKAHEAD = int(os.getenv("REMINDER_LOOKAHEAD", "300"))
+    REMINDER_GRACE = int(os.getenv("REMINDER_GRACE", "900"))
+    REMINDER_WORKERS = int(os.getenv("REMINDER_WORKERS", "4"))
+
+    # Authenticated Calendar client pool
+    CALENDAR_POOL_SIZE = int(os.getenv("CALENDAR_POOL_SIZE", "1000"))
+    CALENDAR_POOL_TTL = int(os.getenv("CALENDAR_POOL_TTL", "1800"))
+
+    # Conflict detection on proposals
+    BUSY_CACHE_TTL = int(os.getenv("BUSY_CACHE_TTL", "300"))
+    BUSY_WINDOW_DAYS = int(os.getenv("BUSY_WINDOW_DAYS", "30"))
+    # Local hours (0-23) between which free slots are suggested
+    FREE_SLOT_DAY_START = int(os.getenv("FREE_SLOT_DAY_START", "7"))
+    FREE_SLOT_DAY_END = int(os.getenv("FREE_SLOT_DAY_END", "22"))
+
+    # .ics / .csv import
+    IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "50"))
+    IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(20 * 1024 * 1024)))
+
+    # Metrics and /stats
+    METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+    # Standalone metrics port for polling/async mode; 0 disables it (webhook mode serves METRICS_PATH itself)
+    METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    ADMIN_CHAT_IDS = {int(i) for i in os.getenv("ADMIN_CHAT_IDS", "").split(",") if i.strip()}
+    # Seconds between profiler samples; 0 disables the sampling profiler
+    PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0"))
+
+    # Startup: prebuild the Gemini client, Google modules and Mongo connection in the background
+    WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+    STARTUP_REPORT = os.getenv("STARTUP_REPORT", "true").lower() == "true"
+
+    # Settings and colour palette caches
+    SETTINGS_CACHE_TTL = int(os.getenv("SETTINGS_CACHE_TTL", "300"))
+    SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "10000"))
+    COLOR_PALETTE_TTL = int(os.getenv("COLOR_PALETTE_TTL", "86400"))
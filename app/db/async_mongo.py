@@ -0,0 +1,72 @@
+from pymongo import AsyncMongoClient
+from app.config import Config
+from app.metrics import instrumented
+from app.db.mongo import (CREDENTIAL_FIELDS, SETTINGS_FIELDS, settings_cache, settings_from_user,
+                          mongo_client_options, credentials_from_user, credentials_update)
+
+@instrumented("mongo")
+class AsyncDatabase:
+    # asyncio counterpart of app.db.mongo.Database, used by the async bot mode
+    def __init__(self):
+        # Created on first use, inside the running event loop
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = AsyncMongoClient(Config.MONGO_URI, **mongo_client_options())
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[Config.DB_NAME]
+
+    @property
+    def users(self):
+        return self.db.users
+
+    async def get_user(self, chat_id, projection=None):
+        return await self.users.find_one({"chat_id": chat_id}, projection)
+
+    async def create_user(self, chat_id, user_data):
+        result = await self.users.update_one(
+            {"chat_id": chat_id},
+            {"$setOnInsert": {**user_data, "chat_id": chat_id}},
+            upsert=True,
+        )
+        return result.upserted_id is not None
+
+    async def update_user(self, chat_id, update_data):
+        await self.users.update_one({"chat_id": chat_id}, {"$set": update_data})
+
+    async def get_user_credentials(self, chat_id):
+        return credentials_from_user(await self.get_user(chat_id, CREDENTIAL_FIELDS))
+
+    async def save_user_credentials(self, chat_id, creds_json):
+        await self.update_user(chat_id, credentials_update(creds_json))
+
+    async def get_user_settings(self, chat_id):
+        settings = settings_cache.get(chat_id)
+        if settings is None:
+            settings = settings_from_user(await self.get_user(chat_id, SETTINGS_FIELDS))
+            settings_cache.put(chat_id, settings)
+        return settings
+
+    async def get_user_context(self, chat_id):
+        user = await self.get_user(chat_id, {**CREDENTIAL_FIELDS, **SETTINGS_FIELDS})
+        settings = settings_from_user(user)
+        settings_cache.put(chat_id, settings)
+        return {
+            "credentials": credentials_from_user(user),
+            "settings": settings,
+        }
+
+    async def update_user_settings(self, chat_id, settings):
+        await self.update_user(chat_id, {"settings": settings})
+        settings_cache.invalidate(chat_id)
+
+    async def update_user_setting(self, chat_id, path, value):
+        await self.users.update_one({"chat_id": chat_id}, {"$set": {f"settings.{path}": value}})
+        settings_cache.invalidate(chat_id)
+
+async_db = AsyncDatabase()
@@ -1,41 +1,217 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import OperationFailure
+from collections import OrderedDict
 from app.config import Config
+from app.metrics import metrics, instrumented
+import copy
+import datetime
+import json
+import threading
+import time
 
+CREDENTIAL_FIELDS = {"credentials": 1, "credentials_revoked": 1}
+SETTINGS_FIELDS = {"settings": 1}
+
+def default_settings():
+    return {"colors": {}, "notifications": True, "reminder_minutes": Config.REMINDER_LEAD_MINUTES}
+
+def mongo_client_options():
+    # Shared by the sync and async clients
+    return {
+        "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": Config.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": Config.MONGO_SOCKET_TIMEOUT_MS,
+    }
+
+def credentials_from_user(user):
+    # Revoked credentials are treated as missing so callers go straight
+    # to re-auth instead of attempting a refresh that cannot succeed.
+    if user and "credentials" in user and not user.get("credentials_revoked"):
+        return user["credentials"]
+    return None
+
+def credentials_update(creds_json):
+    # Keep the expiry as an indexed field for the background refresher
+    expiry = json.loads(creds_json).get("expiry")
+    return {
+        "credentials": creds_json,
+        "credentials_expiry": datetime.datetime.fromisoformat(expiry.rstrip("Z")) if expiry else None,
+        "credentials_revoked": False,
+    }
+
+class SettingsCache:
+    """Per-user settings kept for a TTL and dropped on every update.
+
+    Shared by the sync and async database, so the create path reads
+    settings without a Mongo round-trip. Other processes see an update
+    once their copy expires.
+    """
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chat_id -> (settings, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chat_id):
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(chat_id)
+                self.hits += 1
+                # Callers may edit the dict before saving it
+                return copy.deepcopy(entry[0])
+            self._entries.pop(chat_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, chat_id, settings):
+        with self._lock:
+            self._entries[chat_id] = (copy.deepcopy(settings), time.monotonic())
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "hit_ratio": self.hits / total if total else 0.0}
+
+settings_cache = SettingsCache(Config.SETTINGS_CACHE_SIZE, Config.SETTINGS_CACHE_TTL)
+metrics.register_collector("settings_cache", settings_cache.stats)
+
+def settings_from_user(user):
+    # Stored settings may predate newer keys, so defaults fill the gaps
+    return {**default_settings(), **((user or {}).get("settings") or {})}
+
+class LazyCollection:
+    """Collection handle for module-level singletons.
+
+    Resolves to the real collection on first use, so importing a module
+    never creates the Mongo client.
+    """
+
+    def __init__(self, database, name):
+        self._database = database
+        self._name = name
+        self._collection = None
+
+    def __getattr__(self, attr):
+        if self._collection is None:
+            self._collection = self._database.db[self._name]
+        return getattr(self._collection, attr)
+
+@instrumented("mongo")
 class Database:
     def __init__(self):
-        self.client = MongoClient(Config.MONGO_URI)
-        self.db = self.client[Config.DB_NAME]
-        self.users = self.db.users
+        # The client (and its connection pool and monitor threads) is
+        # created on first use rather than at import time.
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = MongoClient(Config.MONGO_URI, **mongo_client_options())
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[Config.DB_NAME]
+
+    @property
+    def users(self):
+        return self.db.users
 
-    def get_user(self, chat_id):
-        return self.users.find_one({"chat_id": chat_id})
+    def collection(self, name):
+        return LazyCollection(self, name)
+
+    def ensure_indexes(self):
+        # Called once at startup; create_index is a no-op when the index exists
+        try:
+            self.users.create_index([("chat_id", ASCENDING)], unique=True)
+        except OperationFailure as e:
+            print(f"Could not create unique chat_id index (duplicate users?): {e}")
+        self.users.create_index([("credentials_expiry", ASCENDING)])
+
+    def get_user(self, chat_id, projection=None):
+        return self.users.find_one({"chat_id": chat_id}, projection)
 
     def create_user(self, chat_id, user_data):
-        if not self.get_user(chat_id):
-            user_data["chat_id"] = chat_id
-            self.users.insert_one(user_data)
-            return True
-        return False
+        # Single atomic upsert: no window between the lookup and the insert
+        result = self.users.update_one(
+            {"chat_id": chat_id},
+            {"$setOnInsert": {**user_data, "chat_id": chat_id}},
+            upsert=True,
+        )
+        return result.upserted_id is not None
 
     def update_user(self, chat_id, update_data):
         self.users.update_one({"chat_id": chat_id}, {"$set": update_data})
 
     def get_user_credentials(self, chat_id):
-        user = self.get_user(chat_id)
-        if user and "credentials" in user:
-            return user["credentials"]
-        return None
+        return credentials_from_user(self.get_user(chat_id, CREDENTIAL_FIELDS))
 
     def save_user_credentials(self, chat_id, creds_json):
-        self.update_user(chat_id, {"credentials": creds_json})
+        self.update_user(chat_id, credentials_update(creds_json))
+
+    def mark_credentials_revoked(self, chat_id):
+        self.update_user(chat_id, {"credentials_revoked": True})
+
+    def find_expiring_credentials(self, before, limit):
+        now = datetime.datetime.utcnow()
+        return list(self.users.find(
+            {
+                "credentials_expiry": {"$lt": before},
+                "credentials_revoked": {"$ne": True},
+                "$or": [{"credentials_lease": None}, {"credentials_lease": {"$lt": now}}],
+            },
+            {"chat_id": 1, "credentials": 1},
+        ).sort("credentials_expiry", ASCENDING).limit(limit))
+
+    def claim_credentials_refresh(self, chat_id, lease_seconds):
+        # Atomic lease so several bot processes never refresh the same user
+        now = datetime.datetime.utcnow()
+        result = self.users.update_one(
+            {"chat_id": chat_id, "$or": [{"credentials_lease": None}, {"credentials_lease": {"$lt": now}}]},
+            {"$set": {"credentials_lease": now + datetime.timedelta(seconds=lease_seconds)}},
+        )
+        return result.modified_count == 1
 
     def get_user_settings(self, chat_id):
-        user = self.get_user(chat_id)
-        if user and "settings" in user:
-            return user["settings"]
-        return {"colors": {}, "notifications": True}
+        settings = settings_cache.get(chat_id)
+        if settings is None:
+            settings = settings_from_user(self.get_user(chat_id, SETTINGS_FIELDS))
+            settings_cache.put(chat_id, settings)
+        return settings
+
+    def get_user_context(self, chat_id):
+        # Credentials and settings in one round-trip for the hot paths
+        user = self.get_user(chat_id, {**CREDENTIAL_FIELDS, **SETTINGS_FIELDS})
+        settings = settings_from_user(user)
+        settings_cache.put(chat_id, settings)
+        return {
+            "credentials": credentials_from_user(user),
+            "settings": settings,
+        }
 
     def update_user_settings(self, chat_id, settings):
         self.update_user(chat_id, {"settings": settings})
+        settings_cache.invalidate(chat_id)
+
+    def update_user_setting(self, chat_id, path, value):
+        # path is a dotted key inside settings, e.g. "colors.Work"
+        self.users.update_one({"chat_id": chat_id}, {"$set": {f"settings.{path}": value}})
+        settings_cache.invalidate(chat_id)
 
 db = Database()
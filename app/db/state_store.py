@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from pymongo import ASCENDING
+from app.config import Config
+from app.db.mongo import db
+import datetime
+import json
+import threading
+import time
+
+class StateStore:
+    """Short-lived conversation state (pending proposals, OAuth flows, ...).
+
+    Values must be JSON-serializable; both backends store them serialized,
+    so callers always get a fresh copy back and never share live objects.
+    """
+
+    def get(self, namespace, key):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def pop(self, namespace, key):
+        value = self.get(namespace, key)
+        if value is not None:
+            self.delete(namespace, key)
+        return value
+
+    def ensure_indexes(self):
+        pass
+
+class MemoryStateStore(StateStore):
+    # Bounded in-process backend: entries expire after their TTL and the
+    # least recently used ones are evicted past max_size.
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (namespace, key) -> (payload, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+        return json.loads(payload)
+
+    def set(self, namespace, key, value, ttl):
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._entries[(namespace, key)] = (payload, time.monotonic() + ttl)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class MongoStateStore(StateStore):
+    # Shared backend for several bot replicas; a TTL index removes expired
+    # documents and reads ignore ones the TTL monitor has not reached yet.
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    @staticmethod
+    def _id(namespace, key):
+        return f"{namespace}:{key}"
+
+    def get(self, namespace, key):
+        doc = self.collection.find_one({"_id": self._id(namespace, key)}, {"payload": 1, "expires_at": 1})
+        if doc is None or doc["expires_at"] < datetime.datetime.utcnow():
+            return None
+        return json.loads(doc["payload"])
+
+    def set(self, namespace, key, value, ttl):
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+        self.collection.update_one(
+            {"_id": self._id(namespace, key)},
+            {"$set": {"payload": json.dumps(value, separators=(",", ":")), "expires_at": expires_at}},
+            upsert=True,
+        )
+
+    def delete(self, namespace, key):
+        self.collection.delete_one({"_id": self._id(namespace, key)})
+
+    def pop(self, namespace, key):
+        # Atomic, so two replicas never both consume the same state
+        doc = self.collection.find_one_and_delete({"_id": self._id(namespace, key)})
+        if doc is None or doc["expires_at"] < datetime.datetime.utcnow():
+            return None
+        return json.loads(doc["payload"])
+
+if Config.STATE_BACKEND == "mongo":
+    state_store = MongoStateStore(db.collection("conversation_state"))
+else:
+    state_store = MemoryStateStore(Config.STATE_MAX_ENTRIES)
@@ -0,0 +1,257 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.config import Config
+import functools
+import inspect
+import sys
+import threading
+import time
+
+# In-process latency histograms and counters, rendered as Prometheus text.
+# Components: handler, ai, gemini, google, mongo, telegram.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+class Metrics:
+    def __init__(self):
+        self._histograms = {}  # (component, operation) -> Histogram
+        self._counters = Counter()  # (name, component, operation) -> value
+        self._collectors = {}  # prefix -> callable returning {name: number}
+        self._lock = threading.Lock()
+
+    def observe(self, component, operation, seconds, error=False):
+        key = (component, operation)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self._counters[("errors_total", component, operation)] += 1
+
+    def inc(self, name, component, operation, value=1):
+        with self._lock:
+            self._counters[(name, component, operation)] += value
+
+    def register_collector(self, prefix, collect):
+        # collect() is called at scrape time, e.g. a cache's stats()
+        self._collectors[prefix] = collect
+
+    def _collect(self):
+        values = {}
+        for prefix, collect in list(self._collectors.items()):
+            try:
+                for name, value in collect().items():
+                    if isinstance(value, (int, float)):
+                        values[f"{prefix}_{name}"] = value
+            except Exception as e:
+                print(f"Metrics collector {prefix} failed: {e}")
+        return values
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = [
+            "# HELP planify_operation_seconds Latency of instrumented operations.",
+            "# TYPE planify_operation_seconds histogram",
+        ]
+        with self._lock:
+            histograms = [(key, list(h.counts), h.total, h.count) for key, h in sorted(self._histograms.items())]
+            counters = sorted(self._counters.items())
+        for (component, operation), counts, total, count in histograms:
+            labels = f'component="{component}",operation="{operation}"'
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'planify_operation_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"planify_operation_seconds_sum{{{labels}}} {total}")
+            lines.append(f"planify_operation_seconds_count{{{labels}}} {count}")
+        for name in sorted({key[0] for key, _ in counters}):
+            lines.append(f"# TYPE planify_{name} counter")
+            for (counter, component, operation), value in counters:
+                if counter == name:
+                    lines.append(f'planify_{name}{{component="{component}",operation="{operation}"}} {value}')
+        for name, value in sorted(self._collect().items()):
+            lines.append(f"# TYPE planify_{name} gauge")
+            lines.append(f"planify_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, limit=25):
+        """Short human-readable report for /stats, slowest operations first."""
+        with self._lock:
+            rows = [
+                (component, operation, h.count, h.total / h.count if h.count else 0.0,
+                 h.quantile(0.5), h.quantile(0.99), self._counters[("errors_total", component, operation)])
+                for (component, operation), h in self._histograms.items()
+            ]
+        rows.sort(key=lambda row: row[3] * row[2], reverse=True)
+        lines = ["op                           n    avg   p50   p99  err%"]
+        for component, operation, count, mean, p50, p99, errors in rows[:limit]:
+            name = f"{component}.{operation}"[:26]
+            lines.append(f"{name:<26} {count:>5} {_ms(mean):>5} {_ms(p50):>5} {_ms(p99):>5} {100 * errors / count:>4.1f}")
+        collected = self._collect()
+        if collected:
+            lines.append("")
+            lines += [f"{name} = {round(value, 3)}" for name, value in sorted(collected.items())]
+        return "\n".join(lines)
+
+def _ms(seconds):
+    if seconds == float("inf"):
+        return ">10s"
+    return f"{seconds * 1000:.0f}" if seconds < 10 else f"{seconds:.0f}s"
+
+metrics = Metrics()
+
+def timed(component, operation=None):
+    """Records latency and raised errors of a function (sync or async)."""
+    def decorator(func):
+        name = operation or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = False
+                try:
+                    return await func(*args, **kwargs)
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    metrics.observe(component, name, time.perf_counter() - start, error)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                metrics.observe(component, name, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
+
+def instrumented(component):
+    """Class decorator: times every public method defined on the class."""
+    def decorator(cls):
+        for name, member in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(member):
+                continue
+            setattr(cls, name, timed(component, name)(member))
+        return cls
+    return decorator
+
+# --- Exposition ---
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != Config.METRICS_PATH:
+            self.send_response(404)
+            self.end_headers()
+            return
+        write_metrics(self)
+
+    def log_message(self, format, *args):
+        pass
+
+def write_metrics(handler):
+    body = metrics.render().encode("utf-8")
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/plain; version=0.0.4")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+def start_metrics_server(host, port):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+# --- Sampling profiler ---
+
+# Frames a thread parks in while it has nothing to do
+IDLE_MODULES = {"threading.py", "queue.py", "selectors.py", "socket.py", "socketserver.py", "ssl.py"}
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval.
+
+    Cheap enough to leave on in production at ~10ms intervals; the hottest
+    frames show where handler time actually goes.
+    """
+
+    def __init__(self, interval=0.01, depth=3):
+        self.interval = interval
+        self.depth = depth
+        self.samples = Counter()
+        self.total = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.rsplit('/', 1)[-1] in IDLE_MODULES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stacks.append(" < ".join(stack))
+            # top() may be iterating the counter on a handler thread
+            with self._lock:
+                self.samples.update(stacks)
+                self.total += len(stacks)
+
+    def top(self, limit=10):
+        with self._lock:
+            if not self.total:
+                return []
+            return [(stack, count / self.total) for stack, count in self.samples.most_common(limit)]
+
+profiler = None
+
+def start_profiler(interval):
+    global profiler
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    return profiler
@@ -1,48 +1,477 @@
-from google import genai
-from google.genai import types
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import List
 from app.config import Config
+from app.services.schemas import CalendarEventSchema, CalendarEventPatch
+from app.services.local_parser import LocalEventParser
+from app.services.partial_json import parse_partial, complete_items
+from app.db.mongo import db
+from app.metrics import metrics, instrumented, timed
+from collections import OrderedDict
+import asyncio
+import hashlib
 import json
 import datetime
+import re
+import threading
+import time
 
-class CalendarEventSchema(BaseModel):
-    summary: str = Field(description="Brief title of the event")
-    start_time: str = Field(description="Start time in ISO 8601 format (YYYY-MM-DDTHH:MM:SS)")
-    end_time: str = Field(description="End time in ISO 8601 format (YYYY-MM-DDTHH:MM:SS)")
-    location: Optional[str] = Field(description="Location of the event if specified")
-    attendees: List[str] = Field(description="List of email addresses for attendees", default=[])
-    description: Optional[str] = Field(description="Detailed description extracted from text")
-    category: str = Field(description="Category of the event: Work, Personal, Health, Finance, Other")
+# Phrases whose meaning shifts within the hour ("in 20 minutes", "now") are
+# never cached; texts naming an explicit date are cached per calendar day
+# instead of per weekday.
+_MINUTE_RELATIVE_RE = re.compile(r"\b(in\s+(an?|\d+|half an?)\s*(min|minute|minutes|mins|hour|hours|hr|hrs|h)\b|right now|\bnow\b)")
+_ABSOLUTE_DATE_RE = re.compile(
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b"
+    r"|\b\d{1,2}(st|nd|rd|th)\b"
+    r"|\b\d{1,4}[/.-]\d{1,2}([/.-]\d{1,4})?\b"
+)
 
+def normalize_text(text):
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(".!?")
+
+class ExtractionCache:
+    """Caches extracted events keyed by normalized text and a time bucket.
+
+    Entries hold the list of events found in a message, each stored relative
+    to the day it was extracted on (day offset plus time of day) and
+    re-anchored to the current date on a hit, so "standup tomorrow 9am" keeps
+    meaning tomorrow. An optional Mongo tier
+    with a TTL index shares entries between processes and restarts.
+    """
+
+    def __init__(self, max_size=5000, ttl=86400, collection=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.collection = collection
+        self._entries = OrderedDict()  # key -> (payload, expires_at)
+        self._lock = threading.Lock()
+        self._indexes_ready = False
+        self.hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def make_key(self, text, now):
+        normalized = normalize_text(text)
+        if not normalized or _MINUTE_RELATIVE_RE.search(normalized):
+            return None
+        # The prompt carries the current time, so the answer depends on the
+        # weekday ("on friday") and the hour ("at 6", "tonight").
+        if _ABSOLUTE_DATE_RE.search(normalized):
+            bucket = f"{now.date().isoformat()}:{now.hour}"
+        else:
+            bucket = f"w{now.weekday()}:{now.hour}"
+        return hashlib.sha256(f"events|{bucket}|{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, text, now):
+        key = self.make_key(text, now)
+        if key is None:
+            return None
+        payload = self._get_memory(key)
+        if payload is None and self.collection is not None:
+            payload = self._get_mongo(key)
+            if payload is not None:
+                self.mongo_hits += 1
+                self._put_memory(key, payload)
+        elif payload is not None:
+            self.hits += 1
+        if payload is None:
+            self.misses += 1
+            return None
+        return [self._from_relative(item, now) for item in payload]
+
+    def put(self, text, now, events):
+        key = self.make_key(text, now)
+        if key is None or not events:
+            return
+        payload = [self._to_relative(event, now) for event in events]
+        if None in payload:
+            return
+        self.stores += 1
+        self._put_memory(key, payload)
+        if self.collection is not None:
+            self._put_mongo(key, payload)
+
+    def stats(self):
+        lookups = self.hits + self.mongo_hits + self.misses
+        return {
+            "hits": self.hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "size": len(self._entries),
+            "hit_ratio": (self.hits + self.mongo_hits) / lookups if lookups else 0.0,
+        }
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def _put_memory(self, key, payload):
+        with self._lock:
+            self._entries[key] = (payload, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_mongo(self, key):
+        try:
+            doc = self.collection.find_one({"_id": key}, {"payload": 1, "expires_at": 1})
+        except Exception as e:
+            print(f"Extraction cache error: {e}")
+            return None
+        # TTL monitor runs about once a minute, so check expiry ourselves
+        if doc and doc["expires_at"] > datetime.datetime.utcnow():
+            return doc["payload"]
+        return None
+
+    def _put_mongo(self, key, payload):
+        try:
+            if not self._indexes_ready:
+                self.collection.create_index("expires_at", expireAfterSeconds=0)
+                self._indexes_ready = True
+            expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {"payload": payload, "expires_at": expires_at}},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Extraction cache error: {e}")
+
+    @staticmethod
+    def _to_relative(event, now):
+        data = event.model_dump()
+        for field in ("start_time", "end_time"):
+            try:
+                value = datetime.datetime.fromisoformat(data[field])
+            except (TypeError, ValueError):
+                return None
+            # Keep the original time-of-day suffix (and any UTC offset) verbatim
+            data[field] = {
+                "days": (value.date() - now.date()).days,
+                "clock": data[field][10:],
+            }
+        return data
+
+    @staticmethod
+    def _from_relative(payload, now):
+        data = dict(payload)
+        for field in ("start_time", "end_time"):
+            day = now.date() + datetime.timedelta(days=payload[field]["days"])
+            data[field] = day.isoformat() + payload[field]["clock"]
+        return CalendarEventSchema(**data)
+
+def merge_patch(event, patch):
+    """Applies a patch dict to an event; None if the result is not a valid event."""
+    data = {**event.model_dump(), **patch}
+    if "start_time" in patch and "end_time" not in patch:
+        # A moved start keeps the event's length
+        try:
+            delta = datetime.datetime.fromisoformat(patch["start_time"]) - datetime.datetime.fromisoformat(event.start_time)
+            data["end_time"] = (datetime.datetime.fromisoformat(event.end_time) + delta).isoformat()
+        except (TypeError, ValueError):
+            return None
+    try:
+        return CalendarEventSchema(**data)
+    except ValueError:
+        return None
+
+@instrumented("ai")
 class AIService:
     def __init__(self):
-        # Initialize the client using the API key from config
-        # Note: The user code showed `client = genai.Client()`, assuming env var or passing api_key
-        self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
+        # google.genai takes most of a second to import, so the client is
+        # only built on first use (or by the startup warm-up)
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.cache = ExtractionCache(
+            max_size=Config.AI_CACHE_SIZE,
+            ttl=Config.AI_CACHE_TTL,
+            collection=db.collection("extraction_cache") if Config.AI_CACHE_MONGO else None,
+        )
+        self.local_parser = LocalEventParser()
+        self.fast_path_hits = 0
+        self.local_fallbacks = 0
+        self.local_edits = 0
+        self.model_edits = 0
+        metrics.register_collector("ai", self._stats)
 
-    def extract_event_details(self, text: str, current_time: str) -> CalendarEventSchema:
-        prompt = f"""
-        Extract calendar event details from the following text.
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=Config.GEMINI_API_KEY)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _stats(self):
+        return {**self.cache.stats(), "fast_path_hits": self.fast_path_hits, "local_fallbacks": self.local_fallbacks,
+                "local_edits": self.local_edits, "model_edits": self.model_edits}
+
+    def _build_prompt(self, text: str, current_time: str) -> str:
+        return f"""
+        Extract every calendar event mentioned in the following text.
+        Return a list with one entry per event, in the order they appear.
         The current date and time is: {current_time}.
         If the year is not specified, assume the upcoming occurrence relative to now.
         Infer the category (Work, Personal, Health, Finance, Other) based on the context.
         Text: "{text}"
         """
-        
+
+    def _build_patch_prompt(self, event: CalendarEventSchema, correction: str, current_time: str, source=None) -> str:
+        original = f'It was extracted from the message: "{source}"' if source else ""
+        return f"""
+        Here is a proposed calendar event as JSON: {event.model_dump_json()}
+        {original}
+        The current date and time is: {current_time}.
+        Apply this correction from the user: "{correction}"
+        Return only the fields the correction changes and leave out every other field.
+        To remove the location, description or attendees, list them in "clear" instead.
+        If the start moves and the correction says nothing about the length, move the end by the same amount.
+        """
+
+    def _generation_config(self, schema=list[CalendarEventSchema]):
+        from google.genai import types
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=schema
+        )
+
+    def _parse_locally(self, text, now):
+        # Simple single-event phrasings are parsed without a model call; the
+        # low-confidence result is still kept as a fallback for when Gemini
+        # is unavailable.
+        event, confidence = self.local_parser.parse(text, now)
+        if event and confidence >= Config.LOCAL_PARSER_MIN_CONFIDENCE:
+            self.fast_path_hits += 1
+            return [event], None
+        return None, event
+
+    def _fallback(self, events, local_event):
+        if not events and local_event is not None:
+            self.local_fallbacks += 1
+            return [local_event]
+        return events
+
+    @staticmethod
+    def _parse_response(response):
+        return AIService._parse_json(response.text)
+
+    @staticmethod
+    def _parse_json(text):
+        # The response text should be a JSON list of events
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = [data]
+        return [CalendarEventSchema(**item) for item in data]
+
+    @staticmethod
+    def _notify_partial(on_partial, buffer, shown):
+        # Calls on_partial with the raw event dicts whenever a field completes
+        partial = complete_items(parse_partial(buffer))
+        if partial and partial != shown:
+            try:
+                on_partial(partial)
+            except Exception as e:
+                print(f"Partial render error: {e}")
+            return partial
+        return shown
+
+    def extract_events(self, text: str, current_time: str, on_partial=None) -> List[CalendarEventSchema]:
+        """Returns every event found in the text (empty list if none).
+
+        With on_partial (and AI_STREAMING on), Gemini's answer is streamed and
+        on_partial receives the events parsed so far as plain dicts.
+        """
+        now = datetime.datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+        events, local_event = self._parse_locally(text, now)
+        if events:
+            return events
+        cached = self.cache.get(text, now)
+        if cached:
+            return cached
+        if on_partial and Config.AI_STREAMING:
+            events = self._stream_events(text, current_time, on_partial)
+        else:
+            events = self._generate_events(text, current_time)
+        self.cache.put(text, now, events)
+        return self._fallback(events, local_event)
+
+    async def aextract_events(self, text: str, current_time: str, on_partial=None) -> List[CalendarEventSchema]:
+        now = datetime.datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+        events, local_event = self._parse_locally(text, now)
+        if events:
+            return events
+        # The Mongo tier is blocking, so only hop to a thread when it is enabled
+        if self.cache.collection is not None:
+            cached = await asyncio.to_thread(self.cache.get, text, now)
+        else:
+            cached = self.cache.get(text, now)
+        if cached:
+            return cached
+        if on_partial and Config.AI_STREAMING:
+            events = await self._astream_events(text, current_time, on_partial)
+        else:
+            events = await self._agenerate_events(text, current_time)
+        if self.cache.collection is not None:
+            await asyncio.to_thread(self.cache.put, text, now, events)
+        else:
+            self.cache.put(text, now, events)
+        return self._fallback(events, local_event)
+
+    def extract_event_details(self, text: str, current_time: str) -> CalendarEventSchema:
+        # Single-event view of extract_events: the first event, or None
+        events = self.extract_events(text, current_time)
+        return events[0] if events else None
+
+    async def aextract_event_details(self, text: str, current_time: str) -> CalendarEventSchema:
+        events = await self.aextract_events(text, current_time)
+        return events[0] if events else None
+
+    def apply_correction(self, event: CalendarEventSchema, correction: str, current_time: str, source=None):
+        """Returns the corrected event, or None if the correction could not be applied.
+
+        The event comes back unchanged when the correction changes nothing.
+        Simple corrections are parsed locally; anything else sends Gemini
+        only the current event and the correction, and merges back the
+        fields it says changed. Fields the correction does not mention are
+        kept as they are.
+        """
+        now = datetime.datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+        patch = self.local_parser.parse_correction(correction, event, now)
+        if patch is not None:
+            self.local_edits += 1
+        else:
+            patch = self._generate_patch(event, correction, current_time, source)
+            if patch is None:
+                return None
+            self.model_edits += 1
+        return merge_patch(event, patch)
+
+    async def aapply_correction(self, event: CalendarEventSchema, correction: str, current_time: str, source=None):
+        now = datetime.datetime.strptime(current_time, "%Y-%m-%d %H:%M:%S")
+        patch = self.local_parser.parse_correction(correction, event, now)
+        if patch is not None:
+            self.local_edits += 1
+        else:
+            patch = await self._agenerate_patch(event, correction, current_time, source)
+            if patch is None:
+                return None
+            self.model_edits += 1
+        return merge_patch(event, patch)
+
+    @timed("gemini", "generate_patch")
+    def _generate_patch(self, event, correction, current_time, source=None):
         try:
             response = self.client.models.generate_content(
-                model="gemini-2.0-flash", 
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    response_schema=CalendarEventSchema
-                )
+                model="gemini-2.0-flash",
+                contents=self._build_patch_prompt(event, correction, current_time, source),
+                config=self._generation_config(CalendarEventPatch)
+            )
+            return CalendarEventPatch.model_validate_json(response.text).to_update()
+        except Exception as e:
+            print(f"AI Error: {e}")
+            metrics.inc("errors_total", "gemini", "generate_patch")
+            return None
+
+    @timed("gemini", "generate_patch")
+    async def _agenerate_patch(self, event, correction, current_time, source=None):
+        try:
+            response = await self.client.aio.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=self._build_patch_prompt(event, correction, current_time, source),
+                config=self._generation_config(CalendarEventPatch)
             )
-            
-            # The response.text should be JSON
-            data = json.loads(response.text)
-            return CalendarEventSchema(**data)
+            return CalendarEventPatch.model_validate_json(response.text).to_update()
         except Exception as e:
             print(f"AI Error: {e}")
+            metrics.inc("errors_total", "gemini", "generate_patch")
             return None
+
+    @timed("gemini", "generate_content")
+    def _generate_events(self, text: str, current_time: str) -> List[CalendarEventSchema]:
+        try:
+            response = self.client.models.generate_content(
+                model="gemini-2.0-flash", 
+                contents=self._build_prompt(text, current_time),
+                config=self._generation_config()
+            )
+            return self._parse_response(response)
+        except Exception as e:
+            print(f"AI Error: {e}")
+            metrics.inc("errors_total", "gemini", "generate_content")
+            return []
+
+    @timed("gemini", "generate_content")
+    async def _agenerate_events(self, text: str, current_time: str) -> List[CalendarEventSchema]:
+        # Same as _generate_events, using the genai async client
+        try:
+            response = await self.client.aio.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=self._build_prompt(text, current_time),
+                config=self._generation_config()
+            )
+            return self._parse_response(response)
+        except Exception as e:
+            print(f"AI Error: {e}")
+            metrics.inc("errors_total", "gemini", "generate_content")
+            return []
+
+    @timed("gemini", "generate_content_stream")
+    def _stream_events(self, text: str, current_time: str, on_partial) -> List[CalendarEventSchema]:
+        started = time.perf_counter()
+        buffer = ""
+        shown = None
+        try:
+            stream = self.client.models.generate_content_stream(
+                model="gemini-2.0-flash",
+                contents=self._build_prompt(text, current_time),
+                config=self._generation_config()
+            )
+            for chunk in stream:
+                if started is not None:
+                    # Time to first token: what the user now waits before seeing anything
+                    metrics.observe("gemini", "first_chunk", time.perf_counter() - started)
+                    started = None
+                buffer += chunk.text or ""
+                shown = self._notify_partial(on_partial, buffer, shown)
+            return self._parse_json(buffer)
+        except Exception as e:
+            print(f"AI Error: {e}")
+            metrics.inc("errors_total", "gemini", "generate_content_stream")
+            return []
+
+    @timed("gemini", "generate_content_stream")
+    async def _astream_events(self, text: str, current_time: str, on_partial) -> List[CalendarEventSchema]:
+        started = time.perf_counter()
+        buffer = ""
+        shown = None
+        try:
+            stream = await self.client.aio.models.generate_content_stream(
+                model="gemini-2.0-flash",
+                contents=self._build_prompt(text, current_time),
+                config=self._generation_config()
+            )
+            async for chunk in stream:
+                if started is not None:
+                    metrics.observe("gemini", "first_chunk", time.perf_counter() - started)
+                    started = None
+                buffer += chunk.text or ""
+                shown = self._notify_partial(on_partial, buffer, shown)
+            return self._parse_json(buffer)
+        except Exception as e:
+            print(f"AI Error: {e}")
+            metrics.inc("errors_total", "gemini", "generate_content_stream")
+            return []
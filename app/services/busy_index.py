@@ -0,0 +1,185 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+from app.config import Config
+from app.services.event_mirror import event_timestamp
+import datetime
+import threading
+import time
+
+class BusyIndex:
+    """Sorted, non-overlapping busy intervals (naive UTC) of one user.
+
+    Overlap checks and gap searches are a bisect away, so once the index
+    is loaded a proposal can be checked without touching the API.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            self.add(start, end)
+
+    def add(self, start, end):
+        if end <= start:
+            return
+        # Merge with every interval it touches
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def overlaps(self, start, end):
+        """Busy intervals that intersect [start, end)."""
+        lo = bisect_right(self.ends, start)
+        hi = bisect_left(self.starts, end)
+        return list(zip(self.starts[lo:hi], self.ends[lo:hi]))
+
+    def free_slots(self, start, end, lo, hi, limit=2):
+        """Free slots as long as [start, end) within [lo, hi], nearest first."""
+        duration = end - start
+        first = bisect_right(self.ends, lo)
+        last = bisect_left(self.starts, hi)
+        slots = []
+        cursor = lo
+        for i in range(first, last + 1):
+            gap_end = min(self.starts[i], hi) if i < last else hi
+            if gap_end - cursor >= duration:
+                # The slot inside this gap that is closest to the requested start
+                slot_start = min(max(start, cursor), gap_end - duration)
+                slots.append((slot_start, slot_start + duration))
+            if i < last:
+                cursor = max(cursor, self.ends[i])
+        slots.sort(key=lambda slot: abs(slot[0] - start))
+        return slots[:limit]
+
+    def __len__(self):
+        return len(self.starts)
+
+class BusyCache:
+    """Per-user BusyIndex filled from one freebusy query and kept for a TTL.
+
+    The bot's own creates are added to the cached index; deletes drop it,
+    since freebusy intervals are merged and cannot be split back apart.
+    """
+
+    def __init__(self, ttl=300, window_days=30, max_users=1000):
+        self.ttl = ttl
+        self.window_days = window_days
+        self.max_users = max_users
+        self._entries = OrderedDict()  # chat_id -> (index, window_start, window_end, loaded_at)
+        self._loading = {}  # chat_id -> threading.Event
+        self._lock = threading.Lock()
+
+    def _lookup(self, chat_id):
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry and time.monotonic() - entry[3] < self.ttl:
+                self._entries.move_to_end(chat_id)
+                return entry
+            self._entries.pop(chat_id, None)
+            return None
+
+    def get(self, service):
+        """Returns (index, window_start, window_end), or None if freebusy failed."""
+        chat_id = service.chat_id
+        entry = self._lookup(chat_id)
+        if entry:
+            return entry[:3]
+        with self._lock:
+            loading = self._loading.get(chat_id)
+            if loading is None:
+                loading = self._loading[chat_id] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # Another thread (usually the prefetch) is already querying
+            loading.wait(10)
+            entry = self._lookup(chat_id)
+            return entry[:3] if entry else None
+        try:
+            return self._load(service)
+        finally:
+            with self._lock:
+                self._loading.pop(chat_id, None)
+            loading.set()
+
+    def _load(self, service):
+        now = datetime.datetime.utcnow()
+        window_start = now - datetime.timedelta(hours=1)
+        window_end = now + datetime.timedelta(days=self.window_days)
+        try:
+            busy = service.query_freebusy(window_start, window_end)
+        except Exception as e:
+            print(f"Freebusy error: {e}")
+            return None
+        index = BusyIndex((event_timestamp({"dateTime": b["start"]}), event_timestamp({"dateTime": b["end"]}))
+                          for b in busy)
+        with self._lock:
+            self._entries[service.chat_id] = (index, window_start, window_end, time.monotonic())
+            self._entries.move_to_end(service.chat_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return index, window_start, window_end
+
+    def prefetch(self, service):
+        # Started before the AI call so the freebusy round-trip overlaps it
+        if self._lookup(service.chat_id) is None:
+            threading.Thread(target=self.get, args=(service,), daemon=True).start()
+
+    def check(self, service, event):
+        """Conflict info for an extracted event, or None if it is free (or unknown)."""
+        entry = self.get(service)
+        if not entry:
+            return None
+        index, window_start, window_end = entry
+        tz = ZoneInfo(Config.TIMEZONE)
+        try:
+            start = _to_utc(event.start_time, tz)
+            end = _to_utc(event.end_time, tz)
+        except ValueError:
+            return None
+        if end <= start or start < window_start or end > window_end:
+            return None
+        busy = index.overlaps(start, end)
+        if not busy:
+            return None
+        # Suggestions stay on the same local day, during waking hours
+        day = datetime.datetime.fromisoformat(event.start_time).date()
+        lo = _to_utc(datetime.datetime.combine(day, datetime.time(Config.FREE_SLOT_DAY_START)).isoformat(), tz)
+        hi = _to_utc(datetime.datetime.combine(day, datetime.time(Config.FREE_SLOT_DAY_END)).isoformat(), tz)
+        lo = max(lo, datetime.datetime.utcnow())
+        free = index.free_slots(start, end, lo, hi) if lo < hi else []
+        return {
+            "busy": [_to_local(s, tz) for s in busy],
+            "free": [_to_local(s, tz) for s in free],
+        }
+
+    def add(self, chat_id, event):
+        with self._lock:
+            entry = self._entries.get(chat_id)
+        if entry:
+            start, end = event_timestamp(event.get("start")), event_timestamp(event.get("end"))
+            if start and end:
+                with self._lock:
+                    entry[0].add(start, end)
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+def _to_utc(value, tz):
+    # Proposal times are naive local times in Config.TIMEZONE
+    local = datetime.datetime.fromisoformat(value)
+    if local.tzinfo is None:
+        local = local.replace(tzinfo=tz)
+    return local.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def _to_local(interval, tz):
+    return tuple(t.replace(tzinfo=datetime.timezone.utc).astimezone(tz).replace(tzinfo=None) for t in interval)
+
+busy_cache = BusyCache(Config.BUSY_CACHE_TTL, Config.BUSY_WINDOW_DAYS, Config.CALENDAR_POOL_SIZE)
@@ -0,0 +1,281 @@
+import csv
+import datetime
+from zoneinfo import ZoneInfo
+from pydantic import ValidationError
+from app.config import Config
+from app.services.event_mirror import event_timestamp
+from app.services.schemas import CalendarEventSchema, CATEGORIES
+
+# Streaming .ics / .csv import and export. Everything here works on line
+# iterators and generators, so a file is never held in memory as a whole.
+
+CSV_COLUMNS = {
+    "summary": ("summary", "title", "subject", "name", "event"),
+    "start": ("start", "start_time", "start time", "starts", "start datetime"),
+    "end": ("end", "end_time", "end time", "ends", "end datetime"),
+    "start_date": ("start date", "date"),
+    "end_date": ("end date",),
+    "location": ("location", "place", "where"),
+    "description": ("description", "notes", "details"),
+    "attendees": ("attendees", "guests", "emails"),
+    "category": ("category", "type"),
+}
+
+def iter_download(url, timeout=30, chunk_size=64 * 1024):
+    """Yields decoded lines of a remote file as it downloads."""
+    import requests
+
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(chunk_size=chunk_size):
+            yield line.decode("utf-8-sig", errors="replace")
+
+def parse_events(filename, lines):
+    """Yields (CalendarEventSchema or None, error) for each event in the file."""
+    parser = parse_ics if filename.lower().endswith(".ics") else parse_csv
+    for fields in parser(lines):
+        try:
+            yield to_event(fields), None
+        except (ValueError, ValidationError) as e:
+            yield None, f"{fields.get('summary') or 'Untitled'}: {str(e).splitlines()[0]}"
+
+# --- iCalendar ---
+
+def _unfold(lines):
+    # RFC 5545 folds long lines; continuation lines start with a space or tab
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+def parse_ics(lines):
+    """Yields one dict of raw fields per VEVENT."""
+    fields = None
+    depth = 0  # components nested in the event, e.g. VALARM
+    for line in _unfold(lines):
+        if line == "BEGIN:VEVENT":
+            fields = {"attendees": []}
+            depth = 0
+            continue
+        if fields is None:
+            continue
+        if line == "END:VEVENT" and not depth:
+            yield fields
+            fields = None
+            continue
+        if line.startswith("BEGIN:"):
+            depth += 1
+            continue
+        if line.startswith("END:"):
+            depth = max(depth - 1, 0)
+            continue
+        if depth:
+            # An alarm's DESCRIPTION or DURATION is not the event's
+            continue
+        name, _, value = line.partition(":")
+        name, *params = name.split(";")
+        params = dict(p.split("=", 1) for p in params if "=" in p)
+        name = name.upper()
+        if name == "SUMMARY":
+            fields["summary"] = _ics_unescape(value)
+        elif name in ("DTSTART", "DTEND"):
+            try:
+                fields["start" if name == "DTSTART" else "end"] = _ics_datetime(value, params)
+            except ValueError:
+                fields.setdefault("error", f"bad date '{value}'")
+                continue
+            if name == "DTSTART":
+                fields["all_day"] = params.get("VALUE") == "DATE" or len(value) == 8
+        elif name == "DURATION":
+            fields["duration"] = _ics_duration(value)
+        elif name == "LOCATION":
+            fields["location"] = _ics_unescape(value)
+        elif name == "DESCRIPTION":
+            fields["description"] = _ics_unescape(value)
+        elif name == "ATTENDEE" and value.lower().startswith("mailto:"):
+            fields["attendees"].append(value[7:])
+        elif name == "CATEGORIES":
+            fields["category"] = value.split(",")[0]
+        elif name in ("RRULE", "RDATE", "RECURRENCE-ID"):
+            # Importing only the first occurrence would silently drop the rest
+            fields["error"] = "recurring events are not supported"
+
+def _ics_unescape(value):
+    return (value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",")
+            .replace("\\;", ";").replace("\\\\", "\\"))
+
+def _ics_escape(value):
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def _ics_datetime(value, params):
+    # Returns a naive local datetime in Config.TIMEZONE
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.datetime.strptime(value[:8], "%Y%m%d")
+    parsed = datetime.datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    elif params.get("TZID"):
+        try:
+            parsed = parsed.replace(tzinfo=ZoneInfo(params["TZID"]))
+        except Exception:
+            return parsed
+    else:
+        return parsed
+    return parsed.astimezone(ZoneInfo(Config.TIMEZONE)).replace(tzinfo=None)
+
+def _ics_duration(value):
+    # Only the day/hour/minute forms Calendar apps actually emit (e.g. PT1H30M, P1D)
+    days = hours = minutes = 0
+    number = ""
+    for char in value.lstrip("+P"):
+        if char.isdigit():
+            number += char
+        elif char in "DHMW" and number:
+            amount = int(number)
+            if char == "W":
+                days += 7 * amount
+            elif char == "D":
+                days += amount
+            elif char == "H":
+                hours += amount
+            else:
+                minutes += amount
+            number = ""
+    return datetime.timedelta(days=days, hours=hours, minutes=minutes)
+
+# --- CSV ---
+
+def parse_csv(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        return
+    columns = {}
+    for index, name in enumerate(header):
+        name = name.strip().lower()
+        for field, aliases in CSV_COLUMNS.items():
+            if name in aliases and field not in columns:
+                columns[field] = index
+    if "summary" not in columns or not ({"start", "start_date"} & columns.keys()):
+        raise ValueError("CSV needs a summary/title column and a start column")
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        raw = {field: row[index].strip() for field, index in columns.items() if index < len(row)}
+        fields = {
+            "summary": raw.get("summary"),
+            "location": raw.get("location") or None,
+            "description": raw.get("description") or None,
+            "attendees": [a.strip() for a in raw.get("attendees", "").replace(",", ";").split(";") if a.strip()],
+            "category": raw.get("category"),
+        }
+        # Either full datetimes, or separate date and time columns (Google's CSV layout)
+        try:
+            fields["start"] = _csv_datetime(raw.get("start_date"), raw.get("start"))
+            end_date = raw.get("end_date") or raw.get("start_date")
+            if raw.get("end") or raw.get("end_date"):
+                fields["end"] = _csv_datetime(end_date, raw.get("end"))
+        except ValueError as e:
+            fields["error"] = str(e)
+        yield fields
+
+def _csv_datetime(date_part, time_part):
+    value = " ".join(part for part in (date_part, time_part) if part)
+    if not value:
+        raise ValueError("missing date")
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in ("%m/%d/%Y %I:%M %p", "%m/%d/%Y %H:%M", "%m/%d/%Y", "%d.%m.%Y %H:%M", "%d.%m.%Y"):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date '{value}'")
+
+def to_event(fields):
+    if fields.get("error"):
+        raise ValueError(fields["error"])
+    start = fields.get("start")
+    if not start:
+        raise ValueError("missing start")
+    end = fields.get("end")
+    all_day = fields.get("all_day")
+    if not end:
+        default = datetime.timedelta(days=1) if all_day else datetime.timedelta(hours=1)
+        end = start + (fields.get("duration") or default)
+    if end <= start:
+        raise ValueError("ends before it starts")
+    # All-day events keep bare dates; the end date is exclusive, as in iCalendar
+    time_format = "%Y-%m-%d" if all_day else "%Y-%m-%dT%H:%M:%S"
+    category = (fields.get("category") or "").strip().title()
+    return CalendarEventSchema(
+        summary=fields.get("summary") or "Untitled",
+        start_time=start.strftime(time_format),
+        end_time=end.strftime(time_format),
+        location=fields.get("location"),
+        description=fields.get("description"),
+        attendees=fields.get("attendees") or [],
+        category=category if category in CATEGORIES else "Other",
+    )
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# --- Export ---
+
+def iter_ics(events):
+    """Yields the lines of an .ics file for an iterable of Calendar event resources."""
+    yield "BEGIN:VCALENDAR"
+    yield "VERSION:2.0"
+    yield "PRODID:-//Planify//Telegram Bot//EN"
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    for event in events:
+        yield "BEGIN:VEVENT"
+        yield f"UID:{event['id']}@planify"
+        yield f"DTSTAMP:{stamp}"
+        for name, key in (("DTSTART", "start"), ("DTEND", "end")):
+            when = event.get(key) or {}
+            if when.get("date"):
+                yield f"{name};VALUE=DATE:{when['date'].replace('-', '')}"
+            else:
+                yield f"{name}:{event_timestamp(when).strftime('%Y%m%dT%H%M%SZ')}"
+        yield from _fold(f"SUMMARY:{_ics_escape(event.get('summary', ''))}")
+        if event.get("location"):
+            yield from _fold(f"LOCATION:{_ics_escape(event['location'])}")
+        if event.get("description"):
+            yield from _fold(f"DESCRIPTION:{_ics_escape(event['description'])}")
+        for attendee in event.get("attendees", []):
+            if attendee.get("email"):
+                yield f"ATTENDEE:mailto:{attendee['email']}"
+        yield "END:VEVENT"
+    yield "END:VCALENDAR"
+
+def _fold(line, limit=75):
+    # RFC 5545 limits lines to 75 octets, so multi-byte characters count
+    # for more than one; a continuation line starts with a space
+    current, size = "", 0
+    for char in line:
+        octets = len(char.encode("utf-8"))
+        if size + octets > limit:
+            yield current
+            current, size = " ", 1
+        current += char
+        size += octets
+    yield current
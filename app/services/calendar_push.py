@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pymongo import ASCENDING
+from app.config import Config
+from app.db.mongo import db
+from app.services.event_mirror import event_mirror
+from app.services.google_service import calendar_pool
+import datetime
+import hmac
+import secrets
+import threading
+import uuid
+
+class CalendarPush:
+    """Calendar push channels, so the mirror syncs when an event changes.
+
+    Each authorized user has one channel watching their primary calendar
+    (events.watch). Google POSTs to CALENDAR_PUSH_URL when something
+    changes, and the notification triggers an incremental syncToken pull,
+    which writes the event's reminders. Calendars are never polled; the
+    only periodic work is re-registering channels shortly before they
+    expire, found via the indexed push_channel.expires_at.
+    """
+
+    def __init__(self, users, mirror, address, ttl=604800, renew_before=86400, retry=3600,
+                 interval=300, batch_size=100, workers=4):
+        self.users = users
+        self.mirror = mirror
+        self.address = address
+        self.ttl = ttl
+        self.renew_before = renew_before
+        self.retry = retry
+        self.interval = interval
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calendar-push")
+        self._sync_lock = threading.Lock()
+        self._syncing = set()
+        self._again = set()  # changed again while their sync was running
+        self._stop = threading.Event()
+        self._thread = None
+
+    def ensure_indexes(self):
+        self.users.create_index([("push_channel.id", ASCENDING)])
+        self.users.create_index([("push_channel.expires_at", ASCENDING)])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="calendar-push-renewal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    # --- Notifications ---
+
+    def handle(self, headers):
+        """Handles one notification; returns the HTTP status to answer with."""
+        channel_id = headers.get("X-Goog-Channel-ID")
+        if not channel_id:
+            return 400
+        user = self.users.find_one({"push_channel.id": channel_id}, {"chat_id": 1, "push_channel": 1})
+        if not user:
+            # A channel replaced by a renewal, or of an account that re-authorized
+            return 404
+        if not hmac.compare_digest(headers.get("X-Goog-Channel-Token", ""), user["push_channel"]["token"]):
+            return 403
+        # "sync" confirms a new channel, "exists" is a change; both are worth a pull
+        self.request_sync(user["chat_id"])
+        return 200
+
+    def request_sync(self, chat_id):
+        # One sync per chat at a time; changes during it get one more pull
+        with self._sync_lock:
+            if chat_id in self._syncing:
+                self._again.add(chat_id)
+                return
+            self._syncing.add(chat_id)
+        self._executor.submit(self._sync, chat_id)
+
+    def _sync(self, chat_id):
+        while True:
+            try:
+                service = calendar_pool.get(chat_id)
+                if service.is_authenticated():
+                    self.mirror.sync(service, force=True)
+            except Exception as e:
+                print(f"Push sync failed for {chat_id}: {e}")
+            with self._sync_lock:
+                if chat_id not in self._again:
+                    self._syncing.discard(chat_id)
+                    return
+                self._again.discard(chat_id)
+
+    # --- Channel renewal ---
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                while self.renew_due() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Calendar push renewal error: {e}")
+            self._stop.wait(self.interval)
+
+    def renew_due(self):
+        """Registers channels for users whose channel expires soon or who have none."""
+        renew_by = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.renew_before)
+        users = list(self.users.find(
+            {
+                "$or": [
+                    {"push_channel.expires_at": {"$lt": renew_by}},
+                    {"push_channel.expires_at": None, "credentials": {"$exists": True}},
+                ],
+                "credentials_revoked": {"$ne": True},
+            },
+            {"chat_id": 1, "push_channel": 1},
+        ).sort("push_channel.expires_at", ASCENDING).limit(self.batch_size))
+        list(self._executor.map(self.renew, users))
+        return len(users)
+
+    def renew(self, user):
+        chat_id = user["chat_id"]
+        old = user.get("push_channel") or {}
+        # Pushing the expiry forward is the lease: other processes skip the
+        # user, and a failed registration comes due again after `retry`
+        lease = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.renew_before + self.retry)
+        result = self.users.update_one(
+            {"chat_id": chat_id, "push_channel.expires_at": old.get("expires_at")},
+            {"$set": {"push_channel.expires_at": lease}},
+        )
+        if result.modified_count != 1:
+            return
+        try:
+            service = calendar_pool.get(chat_id)
+            if not service.is_authenticated():
+                return
+            self.watch(service)
+        except Exception as e:
+            print(f"Calendar push registration failed for {chat_id}: {e}")
+            return
+        if old.get("id"):
+            # The new channel overlaps the old one, so no change is missed
+            try:
+                service.stop_channel(old["id"], old["resource_id"])
+            except Exception as e:
+                print(f"Could not stop push channel for {chat_id}: {e}")
+        else:
+            # First channel: catch up on what changed before it existed
+            self.request_sync(chat_id)
+
+    def watch(self, service):
+        channel_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(32)
+        response = service.watch_events(channel_id, self.address, token, self.ttl)
+        if response.get("expiration"):
+            expires_at = datetime.datetime.utcfromtimestamp(int(response["expiration"]) / 1000)
+        else:
+            expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+        channel = {"id": channel_id, "resource_id": response["resourceId"], "token": token, "expires_at": expires_at}
+        self.users.update_one({"chat_id": service.chat_id}, {"$set": {"push_channel": channel}})
+        return channel
+
+# --- Listener for polling/async mode ---
+
+class PushHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        # Notifications carry everything in headers; the body is empty
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status = calendar_push.handle(self.headers) if self.path == Config.CALENDAR_PUSH_PATH else 404
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_push_server(host, port):
+    server = ThreadingHTTPServer((host, port), PushHandler)
+    threading.Thread(target=server.serve_forever, name="calendar-push-server", daemon=True).start()
+    return server
+
+calendar_push = CalendarPush(
+    db.collection("users"),
+    event_mirror,
+    Config.CALENDAR_PUSH_URL.rstrip("/") + Config.CALENDAR_PUSH_PATH,
+    ttl=Config.CALENDAR_PUSH_TTL,
+    renew_before=Config.CALENDAR_PUSH_RENEW_BEFORE,
+    retry=Config.CALENDAR_PUSH_RETRY,
+    interval=Config.CALENDAR_PUSH_INTERVAL,
+    batch_size=Config.CALENDAR_PUSH_BATCH,
+    workers=Config.CALENDAR_PUSH_WORKERS,
+)
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from app.config import Config
+from app.db.mongo import db
+from app.services.google_service import calendar_pool
+import datetime
+import json
+import threading
+
+class CredentialRefresher:
+    """Refreshes OAuth tokens shortly before they expire, off the request path.
+
+    Every interval it picks the users whose token expires within the refresh
+    window (via the indexed credentials_expiry field), leases them so other
+    processes skip them, and refreshes them on a small thread pool. Tokens
+    that Google rejects as revoked are flagged so handlers ask for re-auth
+    right away.
+    """
+
+    def __init__(self, interval=60, window=600, batch_size=100, workers=4, lease_seconds=120):
+        self.interval = interval
+        self.window = window
+        self.batch_size = batch_size
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="credential-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self._stop.is_set():
+                try:
+                    # Keep going while full batches come back, so a backlog
+                    # drains in one cycle instead of one batch per interval.
+                    while self.run_once(executor) >= self.batch_size:
+                        pass
+                except Exception as e:
+                    print(f"Credential refresher error: {e}")
+                self._stop.wait(self.interval)
+
+    def run_once(self, executor):
+        before = datetime.datetime.utcnow() + datetime.timedelta(seconds=self.window)
+        users = db.find_expiring_credentials(before, self.batch_size)
+        list(executor.map(self.refresh_user, users))
+        return len(users)
+
+    def refresh_user(self, user):
+        chat_id = user["chat_id"]
+        if not db.claim_credentials_refresh(chat_id, self.lease_seconds):
+            return
+        try:
+            creds = Credentials.from_authorized_user_info(json.loads(user["credentials"]), Config.SCOPES)
+            if not creds.refresh_token:
+                self._revoke(chat_id)
+                return
+            creds.refresh(Request())
+            db.save_user_credentials(chat_id, creds.to_json())
+        except RefreshError as e:
+            # invalid_grant means the user revoked access or the token died;
+            # anything else is transient and retried once the lease runs out.
+            if "invalid_grant" in str(e):
+                self._revoke(chat_id)
+            else:
+                print(f"Credential refresh failed for {chat_id}: {e}")
+        except Exception as e:
+            print(f"Credential refresh failed for {chat_id}: {e}")
+
+    def _revoke(self, chat_id):
+        db.mark_credentials_revoked(chat_id)
+        calendar_pool.invalidate(chat_id)
+
+credential_refresher = CredentialRefresher(
+    interval=Config.CREDENTIAL_REFRESH_INTERVAL,
+    window=Config.CREDENTIAL_REFRESH_WINDOW,
+    batch_size=Config.CREDENTIAL_REFRESH_BATCH,
+    workers=Config.CREDENTIAL_REFRESH_WORKERS,
+)
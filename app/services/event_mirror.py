@@ -0,0 +1,204 @@
+from googleapiclient.errors import HttpError
+from pymongo import ASCENDING, UpdateOne, DeleteOne
+from zoneinfo import ZoneInfo
+from app.config import Config
+from app.db.mongo import db
+from app.services.reminder_service import reminder_store
+import datetime
+
+# Fields of a Calendar event resource kept in the mirror
+MIRRORED_FIELDS = ("id", "summary", "start", "end", "location", "description",
+                   "attendees", "colorId", "htmlLink", "status")
+
+def event_timestamp(when):
+    # Calendar start/end objects hold either dateTime (with offset) or an all-day date
+    if not when:
+        return None
+    if when.get("dateTime"):
+        value = datetime.datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00"))
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=ZoneInfo(when.get("timeZone") or Config.TIMEZONE))
+    elif when.get("date"):
+        day = datetime.date.fromisoformat(when["date"])
+        value = datetime.datetime.combine(day, datetime.time(), ZoneInfo(when.get("timeZone") or Config.TIMEZONE))
+    else:
+        return None
+    # Stored as naive UTC, the way pymongo hands datetimes back
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+class EventMirror:
+    """Per-user copy of upcoming Calendar events, kept current with syncToken.
+
+    Task lists and event details are served from Mongo; the Calendar API is
+    only asked for changes since the last sync. Push notifications (see
+    app/services/calendar_push.py) trigger the same sync when an event
+    changes in Google Calendar, so its reminders are written without the
+    user opening the bot.
+    """
+
+    def __init__(self, collection, users, reminders=None):
+        self.collection = collection
+        self.users = users
+        self.reminders = reminders
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        self.collection.create_index([("chat_id", ASCENDING), ("event_id", ASCENDING)], unique=True)
+        self.collection.create_index([("chat_id", ASCENDING), ("start_ts", ASCENDING)])
+        if self.reminders:
+            self.reminders.ensure_indexes()
+        self._indexes_ready = True
+
+    def _get_sync_state(self, chat_id):
+        user = self.users.find_one({"chat_id": chat_id}, {"event_sync": 1})
+        return (user or {}).get("event_sync") or {}
+
+    def sync(self, service, force=False):
+        """Pulls changes since the last sync. Returns False if it could not sync."""
+        if not self._indexes_ready:
+            self.ensure_indexes()
+        chat_id = service.chat_id
+        state = self._get_sync_state(chat_id)
+        synced_at = state.get("synced_at")
+        if not force and state.get("token") and synced_at and \
+                (datetime.datetime.utcnow() - synced_at).total_seconds() < Config.MIRROR_SYNC_INTERVAL:
+            return True
+
+        token = state.get("token")
+        try:
+            next_token = self._pull(service, token)
+        except HttpError as e:
+            if e.resp.status != 410:
+                print(f"Event sync error: {e}")
+                return False
+            # Sync token expired: start over with a full sync
+            self.collection.delete_many({"chat_id": chat_id})
+            if self.reminders:
+                self.reminders.clear(chat_id)
+            try:
+                next_token = self._pull(service, None)
+            except Exception as e:
+                print(f"Event sync error: {e}")
+                return False
+        except Exception as e:
+            print(f"Event sync error: {e}")
+            return False
+
+        self.users.update_one(
+            {"chat_id": chat_id},
+            {"$set": {"event_sync": {"token": next_token, "synced_at": datetime.datetime.utcnow()}}},
+        )
+        return True
+
+    def _pull(self, service, sync_token):
+        chat_id = service.chat_id
+        # Past events are not shown anywhere, so a full sync skips them
+        horizon = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        settings = self._get_settings(chat_id) if self.reminders else None
+        page_token = None
+        while True:
+            page = service.list_event_changes(sync_token=sync_token, page_token=page_token)
+            ops, docs, removed = [], [], []
+            for event in page.get("items", []):
+                if event.get("status") == "cancelled":
+                    ops.append(DeleteOne({"chat_id": chat_id, "event_id": event["id"]}))
+                    removed.append(event["id"])
+                    continue
+                doc = self._to_doc(chat_id, event)
+                if sync_token is None and doc["end_ts"] and doc["end_ts"] < horizon:
+                    continue
+                ops.append(UpdateOne({"chat_id": chat_id, "event_id": event["id"]}, {"$set": doc}, upsert=True))
+                docs.append(doc)
+            if ops:
+                self.collection.bulk_write(ops, ordered=False)
+            if self.reminders:
+                self.reminders.schedule(chat_id, docs, settings)
+                self.reminders.cancel(chat_id, removed)
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return page.get("nextSyncToken")
+
+    def _get_settings(self, chat_id):
+        # Served from the settings cache on the create path
+        return db.get_user_settings(chat_id)
+
+    @staticmethod
+    def _to_doc(chat_id, event):
+        return {
+            "chat_id": chat_id,
+            "event_id": event["id"],
+            "start_ts": event_timestamp(event.get("start")),
+            "end_ts": event_timestamp(event.get("end")),
+            "event": {k: event[k] for k in MIRRORED_FIELDS if k in event},
+        }
+
+    def list_upcoming(self, chat_id, page=0, page_size=10):
+        """Returns (events, has_more) for one page of upcoming events."""
+        now = datetime.datetime.utcnow()
+        cursor = self.collection.find(
+            {"chat_id": chat_id, "end_ts": {"$gt": now}},
+            {"event": 1, "_id": 0},
+        ).sort("start_ts", ASCENDING).skip(page * page_size).limit(page_size + 1)
+        events = [doc["event"] for doc in cursor]
+        return events[:page_size], len(events) > page_size
+
+    def iter_upcoming(self, chat_id, batch_size=500):
+        # Cursor over every upcoming event, fetched from Mongo in batches
+        cursor = self.collection.find(
+            {"chat_id": chat_id, "end_ts": {"$gt": datetime.datetime.utcnow()}},
+            {"event": 1, "_id": 0},
+        ).sort("start_ts", ASCENDING).batch_size(batch_size)
+        return (doc["event"] for doc in cursor)
+
+    def get_event(self, chat_id, event_id):
+        doc = self.collection.find_one({"chat_id": chat_id, "event_id": event_id}, {"event": 1})
+        return doc["event"] if doc else None
+
+    # Write-through for changes the bot makes itself
+    def upsert_event(self, chat_id, event):
+        if not event:
+            return
+        doc = self._to_doc(chat_id, event)
+        self.collection.update_one(
+            {"chat_id": chat_id, "event_id": event["id"]},
+            {"$set": doc},
+            upsert=True,
+        )
+        if self.reminders:
+            self.reminders.schedule(chat_id, [doc], self._get_settings(chat_id))
+
+    def upsert_events(self, chat_id, events):
+        docs = [self._to_doc(chat_id, event) for event in events if event]
+        if not docs:
+            return
+        self.collection.bulk_write([
+            UpdateOne({"chat_id": chat_id, "event_id": doc["event_id"]}, {"$set": doc}, upsert=True)
+            for doc in docs
+        ], ordered=False)
+        if self.reminders:
+            self.reminders.schedule(chat_id, docs, self._get_settings(chat_id))
+
+    def replan_reminders(self, chat_id):
+        # The lead time changed: every upcoming event gets its reminder moved
+        if not self.reminders:
+            return
+        docs = self.collection.find(
+            {"chat_id": chat_id, "start_ts": {"$gt": datetime.datetime.utcnow()}},
+            {"event_id": 1, "start_ts": 1, "event.summary": 1, "_id": 0},
+        )
+        self.reminders.replan(chat_id, docs, self._get_settings(chat_id))
+
+    def remove_event(self, chat_id, event_id):
+        self.collection.delete_one({"chat_id": chat_id, "event_id": event_id})
+        if self.reminders:
+            self.reminders.cancel(chat_id, [event_id])
+
+    def clear(self, chat_id):
+        # Used on re-auth, the account may have changed; the push channel
+        # renewal then registers one for the new account
+        self.collection.delete_many({"chat_id": chat_id})
+        self.users.update_one({"chat_id": chat_id}, {"$unset": {"event_sync": "", "push_channel": ""}})
+        if self.reminders:
+            self.reminders.clear(chat_id)
+
+event_mirror = EventMirror(db.collection("events"), db.collection("users"), reminder_store)
@@ -1,38 +1,121 @@
-from google.auth.transport.requests import Request
+from google.auth.exceptions import RefreshError
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from collections import OrderedDict
+import asyncio
 import datetime
 import json
+import threading
+import time
 from app.config import Config
 from app.db.mongo import db
+from app.metrics import metrics, instrumented
 
+# Calendar allows at most 50 calls per batch request
+BATCH_LIMIT = 50
+
+# The Calendar discovery document is static, so parse the bundled copy once
+# and reuse it for every client instead of letting build() reload it.
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+
+def get_discovery_doc():
+    global _discovery_doc
+    if _discovery_doc is None:
+        with _discovery_lock:
+            if _discovery_doc is None:
+                from googleapiclient.discovery_cache import get_static_doc
+                _discovery_doc = json.loads(get_static_doc('calendar', 'v3'))
+    return _discovery_doc
+
+def build_calendar(creds):
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(get_discovery_doc(), credentials=creds)
+
+# httplib2.Http is not thread-safe, and a pooled client is used from polling
+# threads, executor threads and background prefetches at once. The client
+# (credentials plus parsed discovery doc) is shared; every request runs on
+# the calling thread's own connection, wrapped with the user's credentials.
+_thread_local = threading.local()
+
+def thread_http(creds):
+    from googleapiclient.http import build_http
+    from google_auth_httplib2 import AuthorizedHttp
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = _thread_local.http = build_http()
+    return AuthorizedHttp(creds, http=http)
+
+def _event_time(value):
+    # A bare YYYY-MM-DD (all-day events from imported files) is a date
+    if len(value) == 10:
+        return {'date': value}
+    return {'dateTime': value, 'timeZone': Config.TIMEZONE}
+
+def build_event_body(event, color_id=None):
+    # Maps an extracted CalendarEventSchema onto a Calendar API event resource
+    body = {
+        'summary': event.summary,
+        'start': _event_time(event.start_time),
+        'end': _event_time(event.end_time),
+    }
+    if event.location:
+        body['location'] = event.location
+    if event.description:
+        body['description'] = event.description
+    if event.attendees:
+        body['attendees'] = [{'email': email} for email in event.attendees]
+    if color_id:
+        body['colorId'] = color_id
+    return body
+
+@instrumented("google")
 class GoogleCalendarService:
-    def __init__(self, chat_id):
+    def __init__(self, chat_id, creds_json=None):
+        # creds_json may be passed in by callers that already fetched it
+        # (e.g. from the async driver); None means load it from Mongo.
         self.chat_id = chat_id
-        self.creds = self._load_credentials()
+        self.creds = self._load_credentials(creds_json)
         self.service = None
         if self.creds:
             try:
-                self.service = build('calendar', 'v3', credentials=self.creds)
+                self.service = build_calendar(self.creds)
             except Exception as e:
                 print(f"Error building service: {e}")
                 self.creds = None # Force re-auth if invalid
 
-    def _load_credentials(self):
-        creds_json = db.get_user_credentials(self.chat_id)
+    def _load_credentials(self, creds_json=None):
+        if creds_json is None:
+            creds_json = db.get_user_credentials(self.chat_id)
         if creds_json:
             creds = Credentials.from_authorized_user_info(json.loads(creds_json), Config.SCOPES)
             if creds and creds.expired and creds.refresh_token:
+                # Normally the background refresher gets here first; this is
+                # the fallback for tokens it has not reached yet.
+                from google.auth.transport.requests import Request
                 try:
                     creds.refresh(Request())
                     # Save refreshed creds
                     db.save_user_credentials(self.chat_id, creds.to_json())
+                except RefreshError as e:
+                    if "invalid_grant" in str(e):
+                        db.mark_credentials_revoked(self.chat_id)
+                    return None
                 except Exception:
                     return None
             return creds
         return None
 
+    def _execute(self, request):
+        try:
+            return request.execute(http=thread_http(self.creds))
+        except RefreshError:
+            # Token was revoked or can no longer be refreshed: drop the pooled
+            # client so the next lookup forces re-auth.
+            self.creds = None
+            self.service = None
+            calendar_pool.invalidate(self.chat_id)
+            raise
+
     def is_authenticated(self):
         return self.creds is not None
 
@@ -46,6 +129,7 @@ class GoogleCalendarService:
         
         # Strategy: Logic to be handled in the bot. 
         # Here we just initialize the flow.
+        from google_auth_oauthlib.flow import InstalledAppFlow
         try:
             flow = InstalledAppFlow.from_client_secrets_file(
                 Config.CREDENTIALS_FILE, Config.SCOPES)
@@ -56,18 +140,31 @@ class GoogleCalendarService:
             
             # We will use the copy-paste URL method which is often the fallback.
             flow.redirect_uri = 'urn:ietf:wg:oauth:2.0:oob'
-            auth_url, _ = flow.authorization_url(prompt='consent')
-            return auth_url, flow
+            auth_url, state = flow.authorization_url(prompt='consent')
+            # The flow itself is not kept around: this is everything needed
+            # to rebuild it when the code comes back, possibly in another process.
+            flow_state = {
+                "state": state,
+                "code_verifier": flow.code_verifier,
+                "redirect_uri": flow.redirect_uri,
+            }
+            return auth_url, flow_state
         except Exception as e:
             print(f"Error creating flow: {e}")
             return None, None
 
-    def finish_auth(self, flow, code):
+    def finish_auth(self, flow_state, code):
+        from google_auth_oauthlib.flow import InstalledAppFlow
         try:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                Config.CREDENTIALS_FILE, Config.SCOPES,
+                state=flow_state["state"],
+                code_verifier=flow_state["code_verifier"],
+                redirect_uri=flow_state["redirect_uri"])
             flow.fetch_token(code=code)
             self.creds = flow.credentials
             db.save_user_credentials(self.chat_id, self.creds.to_json())
-            self.service = build('calendar', 'v3', credentials=self.creds)
+            self.service = build_calendar(self.creds)
             return True, "Authenticated successfully!"
         except Exception as e:
             return False, str(e)
@@ -76,30 +173,235 @@ class GoogleCalendarService:
         if not self.service:
             return None
         now = datetime.datetime.utcnow().isoformat() + 'Z'
-        events_result = self.service.events().list(
+        events_result = self._execute(self.service.events().list(
             calendarId='primary', timeMin=now,
             maxResults=max_results, singleEvents=True,
-            orderBy='startTime').execute()
+            orderBy='startTime'))
         return events_result.get('items', [])
 
+    def list_event_changes(self, sync_token=None, page_token=None):
+        # One page of the incremental sync feed. Without a sync token this is
+        # a full listing; the last page carries nextSyncToken.
+        params = {'calendarId': 'primary', 'singleEvents': True, 'showDeleted': True, 'maxResults': 2500}
+        if sync_token:
+            params['syncToken'] = sync_token
+        if page_token:
+            params['pageToken'] = page_token
+        return self._execute(self.service.events().list(**params))
+
+    def watch_events(self, channel_id, address, token, ttl):
+        # Push channel on the primary calendar; Google POSTs to address on every change
+        body = {'id': channel_id, 'type': 'web_hook', 'address': address, 'token': token,
+                'params': {'ttl': str(ttl)}}
+        return self._execute(self.service.events().watch(calendarId='primary', body=body))
+
+    def stop_channel(self, channel_id, resource_id):
+        self._execute(self.service.channels().stop(body={'id': channel_id, 'resourceId': resource_id}))
+
+    def query_freebusy(self, time_min, time_max):
+        # Busy intervals of the primary calendar between two naive UTC datetimes
+        body = {
+            'timeMin': time_min.isoformat() + 'Z',
+            'timeMax': time_max.isoformat() + 'Z',
+            'items': [{'id': 'primary'}],
+        }
+        result = self._execute(self.service.freebusy().query(body=body))
+        return result.get('calendars', {}).get('primary', {}).get('busy', [])
+
     def create_event(self, event_data):
         if not self.service:
             return None
-        event = self.service.events().insert(calendarId='primary', body=event_data).execute()
+        event = self._execute(self.service.events().insert(calendarId='primary', body=event_data))
         return event
 
     def delete_event(self, event_id):
         if not self.service:
             return False
         try:
-            self.service.events().delete(calendarId='primary', eventId=event_id).execute()
+            self._execute(self.service.events().delete(calendarId='primary', eventId=event_id))
             return True
         except Exception:
             return False
 
+    # --- Batch operations ---
+    # Each runs through the batch endpoint (up to BATCH_LIMIT calls per HTTP
+    # request) and returns one (result, error) pair per input item, in order.
+
+    def _run_batch(self, requests):
+        results = [(None, None)] * len(requests)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        for offset in range(0, len(requests), BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for index, request in enumerate(requests[offset:offset + BATCH_LIMIT], start=offset):
+                batch.add(request, request_id=str(index))
+            self._execute(batch)
+        return results
+
+    def create_events(self, bodies):
+        if not self.service:
+            return None
+        events = self.service.events()
+        return self._run_batch([events.insert(calendarId='primary', body=body) for body in bodies])
+
+    def delete_events(self, event_ids):
+        if not self.service:
+            return None
+        events = self.service.events()
+        results = self._run_batch([events.delete(calendarId='primary', eventId=event_id) for event_id in event_ids])
+        # A delete has an empty response, report success as True
+        return [(error is None, error) for _, error in results]
+
+    def update_events_color(self, event_ids, color_id):
+        if not self.service:
+            return None
+        events = self.service.events()
+        return self._run_batch([events.patch(calendarId='primary', eventId=event_id, body={'colorId': color_id})
+                                for event_id in event_ids])
+
+    def add_attendees(self, events, emails):
+        # patch replaces the whole attendee list, so merge with what each
+        # event (e.g. from the mirror) already has
+        if not self.service:
+            return None
+        requests = []
+        for event in events:
+            attendees = list(event.get('attendees', []))
+            known = {a.get('email') for a in attendees}
+            attendees += [{'email': email} for email in emails if email not in known]
+            requests.append(self.service.events().patch(
+                calendarId='primary', eventId=event['id'], body={'attendees': attendees}))
+        return self._run_batch(requests)
+
     def get_colors(self):
          if not self.service:
             return None
-         colors = self.service.colors().get().execute()
+         colors = self._execute(self.service.colors().get())
          return colors.get('event', {})
 
+
+
+# Calendar's event colour ids and the names its UI shows for them. The
+# palette is global and practically never changes.
+EVENT_COLORS = {
+    "1": {"name": "Lavender", "background": "#a4bdfc"},
+    "2": {"name": "Sage", "background": "#7ae7bf"},
+    "3": {"name": "Grape", "background": "#dbadff"},
+    "4": {"name": "Flamingo", "background": "#ff887c"},
+    "5": {"name": "Banana", "background": "#fbd75b"},
+    "6": {"name": "Tangerine", "background": "#ffb878"},
+    "7": {"name": "Peacock", "background": "#46d6db"},
+    "8": {"name": "Graphite", "background": "#e1e1e1"},
+    "9": {"name": "Blueberry", "background": "#5484ed"},
+    "10": {"name": "Basil", "background": "#51b749"},
+    "11": {"name": "Tomato", "background": "#dc2127"},
+}
+
+class ColorPalette:
+    """Process-wide copy of the event colour palette, fetched once per TTL."""
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self._colors = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, service=None):
+        if self._colors is not None and time.monotonic() - self._fetched_at < self.ttl:
+            return self._colors
+        with self._lock:
+            if self._colors is not None and time.monotonic() - self._fetched_at < self.ttl:
+                return self._colors
+            colors = None
+            if service is not None and service.is_authenticated():
+                try:
+                    colors = service.get_colors()
+                except Exception as e:
+                    print(f"Colour palette error: {e}")
+            if colors:
+                self._colors = {
+                    color_id: {"name": EVENT_COLORS.get(color_id, {}).get("name", f"Colour {color_id}"),
+                               "background": value.get("background")}
+                    for color_id, value in colors.items()
+                }
+                self._fetched_at = time.monotonic()
+                return self._colors
+            # Not fetched yet (or the API failed): the built-in copy will do
+            return self._colors or EVENT_COLORS
+
+color_palette = ColorPalette(Config.COLOR_PALETTE_TTL)
+
+class CalendarServicePool:
+    """Process-wide LRU/TTL cache of authenticated GoogleCalendarService objects.
+
+    What is shared is the credentials and the built client; requests run on
+    a per-thread Http (see thread_http), so one pooled service can be used
+    from several threads at once.
+    """
+
+    def __init__(self, max_size=1000, ttl=1800):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chat_id -> (service, created_at)
+        self._lock = threading.Lock()
+
+    def _lookup(self, chat_id, now):
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry:
+                service, created_at = entry
+                creds = service.creds
+                # Expired tokens go back through _load_credentials so the
+                # refreshed token is persisted; stale entries are rebuilt.
+                if now - created_at < self.ttl and creds and not creds.expired:
+                    self._entries.move_to_end(chat_id)
+                    return service
+                del self._entries[chat_id]
+        return None
+
+    def _store(self, chat_id, service, now):
+        # Only authenticated services are pooled, so a user who has just
+        # authorized is picked up on the next lookup.
+        if service.is_authenticated():
+            with self._lock:
+                self._entries[chat_id] = (service, now)
+                self._entries.move_to_end(chat_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return service
+
+    def get(self, chat_id, creds_json=None):
+        # Callers that already have the stored credentials pass them. On a
+        # miss otherwise, credentials and settings come back in one
+        # round-trip (get_user_context), which also fills the settings
+        # cache the handler reads next.
+        now = time.monotonic()
+        service = self._lookup(chat_id, now)
+        if service:
+            return service
+        if creds_json is None:
+            creds_json = db.get_user_context(chat_id)["credentials"] or ""
+        return self._store(chat_id, GoogleCalendarService(chat_id, creds_json), now)
+
+    async def aget(self, chat_id, async_db):
+        now = time.monotonic()
+        service = self._lookup(chat_id, now)
+        if service:
+            return service
+        creds_json = (await async_db.get_user_context(chat_id))["credentials"]
+        # Credential parsing, a possible token refresh and the client build
+        # are blocking, so they run in the executor.
+        service = await asyncio.to_thread(GoogleCalendarService, chat_id, creds_json or "")
+        return self._store(chat_id, service, now)
+
+    def invalidate(self, chat_id):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+calendar_pool = CalendarServicePool(Config.CALENDAR_POOL_SIZE, Config.CALENDAR_POOL_TTL)
+metrics.register_collector("calendar_pool", lambda: {"size": len(calendar_pool)})
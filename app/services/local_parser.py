@@ -0,0 +1,388 @@
+import datetime
+import re
+from app.services.schemas import CalendarEventSchema, CATEGORIES, CLEARABLE_FIELDS
+
+# Rule-based extractor for short, common phrasings ("gym at 6pm",
+# "standup tomorrow 9:30 for 15 min @office"). Anything it is unsure about
+# gets a low confidence so the caller can fall back to Gemini.
+
+WEEKDAYS = {
+    "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1,
+    "wed": 2, "wednesday": 2, "thu": 3, "thur": 3, "thurs": 3, "thursday": 3,
+    "fri": 4, "friday": 4, "sat": 5, "saturday": 5, "sun": 6, "sunday": 6,
+}
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9,
+    "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+CATEGORY_KEYWORDS = {
+    "Work": {"meeting", "standup", "stand-up", "sync", "call", "review", "client", "interview",
+             "office", "demo", "presentation", "deadline", "1:1", "retro", "planning"},
+    "Health": {"gym", "doctor", "dentist", "workout", "run", "yoga", "therapy", "physio",
+               "checkup", "hospital", "clinic", "swim", "training"},
+    "Finance": {"bank", "pay", "bill", "bills", "tax", "taxes", "invoice", "rent", "budget",
+                "accountant", "mortgage"},
+    "Personal": {"birthday", "dinner", "lunch", "breakfast", "party", "date", "movie", "family",
+                 "mom", "dad", "friends", "wedding", "haircut", "shopping"},
+}
+# Words that signal something this parser cannot express (recurrence,
+# multiple events, conditions), so the LLM must handle the message.
+COMPLEX_RE = re.compile(r"\b(every|daily|weekly|monthly|until|except|unless|and then|between|each|"
+                        r"remind|reschedule|cancel)\b", re.I)
+
+_WEEKDAY_PATTERN = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+# Date-like text still in the summary once the recognized date is taken
+# out: a date this parser misread or ignored ("on 10/25", "the 3rd", "next
+# week", "in two weeks") or a recurrence ("weekdays"). Either way the
+# message has to go to Gemini.
+LEFTOVER_DATE_RE = re.compile(
+    rf"\d|\b(?:{_WEEKDAY_PATTERN}|{_MONTH_PATTERN})\b"
+    r"|\b(?:first|second|third|fourth|fifth|last)\b"
+    r"|\b(?:next|this|coming|following)\s+(?:week|month|year|weekend)\b"
+    r"|\bin\s+\w+\s+(?:days?|weeks?|months?|years?)\b"
+    r"|\b(?:weekends?|weekdays?|weekly|fortnight|tonight|morning|afternoon|evening)\b"
+    r"|\b(?:end|start|beginning|middle)\s+of\b",
+    re.I,
+)
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+LOCATION_RE = re.compile(r"(?:^|\s)@\s*([^,;@]+?)(?=\s+(?:at|on|for|with|tomorrow|today|tonight)\b|[,;]|$)", re.I)
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+MONTH_DAY_RE = re.compile(rf"\b(?:on\s+)?(?:({_MONTH_PATTERN})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?|(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({_MONTH_PATTERN})\b\.?)", re.I)
+RELATIVE_DAY_RE = re.compile(r"\b(day after tomorrow|tomorrow|tmrw|tmr|today|tonight)\b", re.I)
+IN_DAYS_RE = re.compile(r"\bin\s+(\d+)\s+(day|days|week|weeks)\b", re.I)
+WEEKDAY_RE = re.compile(rf"\b(?:(next|this)\s+|on\s+)?({_WEEKDAY_PATTERN})\b\.?", re.I)
+RANGE_RE = re.compile(r"\b(?:from\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*(?:-|to|until|till)\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b", re.I)
+TIME_RE = re.compile(r"\b(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)(?=\W|$)|\b(?:at\s+)?(\d{1,2}):(\d{2})\b|\bat\s+(\d{1,2})\b|\b(?:at\s+)?(noon|midday|midnight)\b", re.I)
+DURATION_RE = re.compile(r"\bfor\s+(an?|half an?|\d+(?:\.\d+)?)\s*(hours|hour|hrs|hr|h|minutes|minute|mins|min|m)\b", re.I)
+FILLER_RE = re.compile(r"\b(on|at|for|with|from|to|in|the|a|an)\b\s*$|^\s*\b(on|at|for|with|from|to|in)\b", re.I)
+
+# Corrections to a proposal ("change time to 5pm", "rename to Sync", "add bob@x.com")
+_CATEGORY_PATTERN = "|".join(category.lower() for category in CATEGORIES)
+RENAME_RE = re.compile(r"^(?:rename(?:\s+it)?|call\s+it|(?:change|set|update)\s+(?:the\s+)?(?:title|name|summary))\s+(?:to\s+)?(.+)$", re.I)
+DESCRIPTION_EDIT_RE = re.compile(r"^(?:change|set|update)\s+(?:the\s+)?(?:description|notes)\s+(?:to\s+)?(.+)$", re.I)
+# "location:" with nothing after it clears the location
+LOCATION_EDIT_RE = re.compile(r"^(?:(?:change|set|update|move)\s+(?:the\s+)?(?:location|place|venue)\s+(?:to\s+)?(?=\S)|location(?:\s*:|\s+is\b|\s)\s*|(?:move(?:\s+it)?\s+to\s+)?@\s*(?=\S))(.*)$", re.I)
+CATEGORY_EDIT_RE = re.compile(rf"^(?:(?:change|set)\s+(?:the\s+)?category\s+(?:to\s+)?|category\s*:?\s*|make\s+it\s+(?:a\s+)?)({_CATEGORY_PATTERN})(?:\s+event)?$", re.I)
+CLEAR_EDIT_RE = re.compile(r"^(?:(?:remove|clear|delete|drop)\s+(?:the\s+)?|no\s+)(location|place|venue|description|notes|attendees|guests)$", re.I)
+ATTENDEE_EDIT_RE = re.compile(r"^(add|invite|remove|drop|uninvite)\s+(.+)$", re.I)
+EDIT_PREFIX_RE = re.compile(r"^(?:please\s+)?(?:(?:change|move|set|update|reschedule|push|shift|make)\s+)?"
+                            r"(?:(?:it|(?:the\s+)?(?:start\s+time|time|start|date|day|meeting|event))\s+)?(?:to\s+)?", re.I)
+EDIT_DURATION_RE = re.compile(r"\b(?:for\s+)?(an?|half an?|\d+(?:\.\d+)?)\s*(hours|hour|hrs|hr|h|minutes|minute|mins|min|m)\b(?:\s+long)?", re.I)
+# Longer than this is more likely a misparse than an event; Gemini decides
+MAX_DURATION = datetime.timedelta(days=7)
+EDIT_FILLER_RE = re.compile(r"\b(on|at|for|to|from|the|it|instead|please|and|also)\b|[\s,.;!]+", re.I)
+
+
+class LocalEventParser:
+    def parse(self, text, now):
+        """Returns (CalendarEventSchema or None, confidence between 0 and 1)."""
+        lowered = text.lower()
+        confidence = 0.0
+        consumed = []  # (start, end) spans that are not part of the summary
+
+        def take(match):
+            consumed.append(match.span())
+
+        attendees = EMAIL_RE.findall(text)
+        for match in EMAIL_RE.finditer(text):
+            take(match)
+        # Blank out emails so their "@" is not read as a location
+        scrubbed = EMAIL_RE.sub(lambda m: " " * len(m.group(0)), text)
+
+        location = None
+        location_match = LOCATION_RE.search(scrubbed)
+        if location_match:
+            location = location_match.group(1).strip()
+            take(location_match)
+
+        # --- Time of day ---
+        clock = _find_clock(scrubbed)
+        if clock is None:
+            return None, 0.0
+        start_clock, end_clock, time_certain, time_match = clock
+        if time_match:
+            take(time_match)
+        if start_clock is None:
+            return None, 0.0
+        confidence += 0.45 if time_certain else 0.25
+
+        # --- Date ---
+        found = _find_date(scrubbed, now, start_clock)
+        if found is None:
+            return None, 0.0
+        date, start_clock, date_match = found
+        date_found = date_match is not None
+        if date_found:
+            take(date_match)
+            confidence += 0.25
+        else:
+            # Only a time: the next time the clock shows it
+            date = now.date()
+            if start_clock <= now.time():
+                date += datetime.timedelta(days=1)
+            confidence += 0.15
+
+        start = datetime.datetime.combine(date, start_clock)
+        if date_found and start < now:
+            # An explicit date in the past is more likely a misparse than intent
+            confidence -= 0.3
+
+        # --- Duration ---
+        if end_clock is not None:
+            end = datetime.datetime.combine(date, end_clock)
+            if end <= start:
+                end += datetime.timedelta(days=1)
+        else:
+            duration = datetime.timedelta(hours=1)
+            duration_match = DURATION_RE.search(scrubbed)
+            if duration_match:
+                take(duration_match)
+                duration = _to_duration(duration_match.group(1), duration_match.group(2))
+                if duration is None:
+                    return None, 0.0
+            end = start + duration
+
+        # --- Summary ---
+        summary = _strip_spans(text, consumed)
+        summary = re.sub(r"\s+", " ", summary).strip(" ,.;-")
+        for _ in range(3):
+            summary = FILLER_RE.sub("", summary).strip(" ,.;-")
+        if not summary:
+            return None, 0.0
+        words = summary.split()
+        if len(words) <= 6:
+            confidence += 0.2
+        elif len(words) > 10:
+            confidence -= 0.3
+        if COMPLEX_RE.search(lowered) or LEFTOVER_DATE_RE.search(summary):
+            confidence = min(confidence, 0.3)
+
+        event = CalendarEventSchema(
+            summary=summary[0].upper() + summary[1:],
+            start_time=start.strftime("%Y-%m-%dT%H:%M:%S"),
+            end_time=end.strftime("%Y-%m-%dT%H:%M:%S"),
+            location=location,
+            attendees=attendees,
+            description=None,
+            category=_guess_category(lowered),
+        )
+        return event, max(0.0, min(confidence, 1.0))
+
+    def parse_correction(self, text, event, now):
+        """Returns the fields a simple correction changes, or None.
+
+        Handles renames, location, description, category, adding or removing
+        attendees, clearing the location, description or attendees, and a
+        new time, date or duration ("move it to friday 5pm", "make it 2 hours"). None means the correction needs Gemini: anything
+        in it this parser cannot account for.
+        """
+        text = text.strip()
+        match = RENAME_RE.match(text)
+        if match:
+            return {"summary": match.group(1).strip(" \"'")}
+        match = DESCRIPTION_EDIT_RE.match(text)
+        if match:
+            return {"description": match.group(1).strip()}
+        match = CATEGORY_EDIT_RE.match(text)
+        if match:
+            return {"category": match.group(1).title()}
+        match = LOCATION_EDIT_RE.match(text)
+        if match:
+            return {"location": match.group(1).strip(" \"'") or CLEARABLE_FIELDS["location"]}
+        match = CLEAR_EDIT_RE.match(text)
+        if match:
+            field = {"place": "location", "venue": "location", "notes": "description",
+                     "guests": "attendees"}.get(match.group(1).lower(), match.group(1).lower())
+            return {field: CLEARABLE_FIELDS[field]}
+        match = ATTENDEE_EDIT_RE.match(text)
+        if match:
+            emails = EMAIL_RE.findall(match.group(2))
+            if not emails or EDIT_FILLER_RE.sub("", EMAIL_RE.sub("", match.group(2))):
+                return None
+            if match.group(1).lower() in ("add", "invite"):
+                return {"attendees": event.attendees + [e for e in emails if e not in event.attendees]}
+            removed = {e.lower() for e in emails}
+            return {"attendees": [e for e in event.attendees if e.lower() not in removed]}
+        return self._parse_reschedule(EDIT_PREFIX_RE.sub("", text, count=1), event, now)
+
+    def _parse_reschedule(self, body, event, now):
+        try:
+            start = datetime.datetime.fromisoformat(event.start_time)
+            end = datetime.datetime.fromisoformat(event.end_time)
+        except ValueError:
+            return None
+        clock = _find_clock(body)
+        if clock is None:
+            return None
+        start_clock, end_clock, _, time_match = clock
+        if time_match and start_clock is None:
+            return None
+        found = _find_date(body, now, start_clock or start.time())
+        if found is None:
+            return None
+        date, adjusted_clock, date_match = found
+        if start_clock:
+            start_clock = adjusted_clock
+        duration_match = None if end_clock else EDIT_DURATION_RE.search(body)
+        matches = [m for m in (time_match, date_match, duration_match) if m]
+        # Every word has to be accounted for, or the correction meant something else
+        if not matches or EDIT_FILLER_RE.sub("", _strip_spans(body, [m.span() for m in matches])):
+            return None
+
+        new_start = start
+        if date:
+            new_start = new_start.replace(year=date.year, month=date.month, day=date.day)
+        if start_clock:
+            new_start = new_start.replace(hour=start_clock.hour, minute=start_clock.minute, second=0)
+        if end_clock:
+            new_end = new_start.replace(hour=end_clock.hour, minute=end_clock.minute, second=0)
+            if new_end <= new_start:
+                new_end += datetime.timedelta(days=1)
+        elif duration_match:
+            duration = _to_duration(duration_match.group(1), duration_match.group(2))
+            if duration is None:
+                return None
+            new_end = new_start + duration
+        else:
+            # Moving an event keeps its length
+            new_end = new_start + (end - start)
+        return {"start_time": new_start.isoformat(), "end_time": new_end.isoformat()}
+
+
+def _find_clock(text):
+    """(start, end, certain, match) for the time of day in text.
+
+    Every field is None/False when there is no time; returns None when
+    there are several times, which usually means several events.
+    """
+    range_match = RANGE_RE.search(text)
+    if range_match:
+        end_clock = _to_clock(range_match.group(4), range_match.group(5), range_match.group(6))
+        # "3-5pm": the start shares the end's meridiem unless that would put it after the end
+        start_meridiem = range_match.group(3) or range_match.group(6)
+        start_clock = _to_clock(range_match.group(1), range_match.group(2), start_meridiem)
+        if start_clock and end_clock and start_clock >= end_clock and not range_match.group(3):
+            start_clock = _to_clock(range_match.group(1), range_match.group(2), "am")
+        return start_clock, end_clock, start_clock is not None and end_clock is not None, range_match
+    time_matches = list(TIME_RE.finditer(text))
+    if len(time_matches) > 1:
+        return None
+    if not time_matches:
+        return None, None, False, None
+    match = time_matches[0]
+    if match.group(1):
+        return _to_clock(match.group(1), match.group(2), match.group(3)), None, True, match
+    if match.group(4):
+        return _to_clock(match.group(4), match.group(5), None), None, True, match
+    if match.group(6):
+        # Bare "at 6": guess the meridiem the way people usually mean it
+        hour = int(match.group(6))
+        if 1 <= hour <= 7:
+            hour += 12
+        return (datetime.time(hour % 24) if hour < 24 else None), None, False, match
+    clock = datetime.time(0) if match.group(7).lower() == "midnight" else datetime.time(12)
+    return clock, None, True, match
+
+def _find_date(text, now, start_clock):
+    """(date, start_clock, match) for the date phrase in text.
+
+    date and match are None when there is none; returns None for several
+    date phrases or an impossible date. "tonight" can move start_clock
+    into the evening.
+    """
+    iso_match = ISO_DATE_RE.search(text)
+    month_match = MONTH_DAY_RE.search(text)
+    relative_match = RELATIVE_DAY_RE.search(text)
+    in_days_match = IN_DAYS_RE.search(text)
+    weekday_match = WEEKDAY_RE.search(text)
+    date_matches = [m for m in (iso_match, month_match, relative_match, in_days_match, weekday_match) if m]
+    if len(date_matches) > 1:
+        return None
+    date = None
+    if iso_match:
+        try:
+            date = datetime.date(int(iso_match.group(1)), int(iso_match.group(2)), int(iso_match.group(3)))
+        except ValueError:
+            return None
+    elif month_match:
+        month = MONTHS[(month_match.group(1) or month_match.group(4)).lower()]
+        day = int(month_match.group(2) or month_match.group(3))
+        try:
+            date = datetime.date(now.year, month, day)
+            # No year given: the upcoming occurrence
+            if date < now.date():
+                date = datetime.date(now.year + 1, month, day)
+        except ValueError:
+            return None
+    elif relative_match:
+        word = relative_match.group(1).lower()
+        offset = {"today": 0, "tonight": 0, "day after tomorrow": 2}.get(word, 1)
+        date = now.date() + datetime.timedelta(days=offset)
+        if word == "tonight" and start_clock.hour < 12:
+            start_clock = start_clock.replace(hour=start_clock.hour + 12)
+    elif in_days_match:
+        amount = int(in_days_match.group(1))
+        if in_days_match.group(2).lower().startswith("week"):
+            amount *= 7
+        date = now.date() + datetime.timedelta(days=amount)
+    elif weekday_match:
+        target = WEEKDAYS[weekday_match.group(2).lower()]
+        days_ahead = (target - now.weekday()) % 7
+        if days_ahead == 0 and (weekday_match.group(1) or "").lower() == "next":
+            days_ahead = 7
+        date = now.date() + datetime.timedelta(days=days_ahead)
+        if date == now.date() and start_clock <= now.time():
+            date += datetime.timedelta(days=7)
+    return date, start_clock, (date_matches[0] if date_matches else None)
+
+def _to_clock(hour, minute, meridiem):
+    hour = int(hour)
+    minute = int(minute or 0)
+    if meridiem:
+        meridiem = meridiem.lower().replace(".", "")
+        if not 1 <= hour <= 12:
+            return None
+        if meridiem == "pm" and hour != 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return datetime.time(hour, minute)
+
+def _to_duration(amount, unit):
+    amount = amount.lower()
+    if amount.startswith("half"):
+        value = 0.5
+    elif amount in ("a", "an"):
+        value = 1.0
+    else:
+        value = float(amount)
+    # Checked before building the timedelta, which overflows on huge values
+    hours = value if unit.lower().startswith("h") else value / 60
+    if hours > MAX_DURATION.total_seconds() / 3600:
+        return None
+    return datetime.timedelta(hours=hours)
+
+def _strip_spans(text, spans):
+    result = []
+    last = 0
+    for start, end in sorted(spans):
+        if start >= last:
+            result.append(text[last:start])
+            last = end
+        else:
+            last = max(last, end)
+    result.append(text[last:])
+    return " ".join(result)
+
+def _guess_category(lowered):
+    words = set(re.findall(r"[\w:-]+", lowered))
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if words & keywords:
+            return category
+    return "Other"
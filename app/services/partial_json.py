@@ -0,0 +1,71 @@
+import json
+
+# Incremental view of a JSON document that is still being streamed. Only
+# values that have fully arrived are kept: a half-received string such as
+# "2026-10-1" is dropped rather than shown, so fields appear once complete.
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+def parse_partial(text):
+    """Parses the longest complete prefix of a truncated JSON document.
+
+    Returns None until anything usable has arrived.
+    """
+    stack = []           # open containers
+    expecting_key = []   # per open object: is the next string a key?
+    in_string = escape = False
+    string_is_key = False
+    cut = None           # (end index, closers) of the last complete prefix
+
+    def mark(end):
+        nonlocal cut
+        cut = (end, "".join(_CLOSERS[c] for c in reversed(stack)))
+
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+                if not string_is_key:
+                    mark(i + 1)
+            continue
+        if char == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1] == "{" and expecting_key[-1]
+        elif char in "{[":
+            stack.append(char)
+            expecting_key.append(char == "{")
+            mark(i + 1)
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            expecting_key.pop()
+            mark(i + 1)
+        elif char == ":":
+            if expecting_key:
+                expecting_key[-1] = False
+        elif char == ",":
+            # Whatever precedes the comma (a number, true, ...) is complete
+            mark(i)
+            if stack and stack[-1] == "{":
+                expecting_key[-1] = True
+
+    if cut is None:
+        return None
+    end, closers = cut
+    try:
+        return json.loads(text[:end] + closers)
+    except ValueError:
+        return None
+
+def complete_items(data):
+    """Objects of a partially parsed top-level array (or a single object)."""
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return [item for item in data if isinstance(item, dict)]
+    return []
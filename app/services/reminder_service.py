@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ASCENDING, ReturnDocument, UpdateOne, DeleteMany
+from zoneinfo import ZoneInfo
+from app.config import Config
+from app.db.mongo import db, default_settings
+import datetime
+import heapq
+import threading
+
+class ReminderStore:
+    """One document per (event, fire time) in the reminders collection.
+
+    Reminders are written alongside the event mirror, so nothing ever has
+    to poll calendars: the scheduler only reads the (status, shard, fire_at)
+    index for what is due next. The fire time is part of the _id, which
+    makes re-syncing an unchanged event a no-op and keeps an already sent
+    reminder from being sent again.
+    """
+
+    def __init__(self, collection, shard_count=1):
+        self.collection = collection
+        self.shard_count = max(1, shard_count)
+        self._watchers = []
+
+    def ensure_indexes(self):
+        self.collection.create_index([("status", ASCENDING), ("shard", ASCENDING), ("fire_at", ASCENDING)])
+        self.collection.create_index([("chat_id", ASCENDING), ("event_id", ASCENDING)])
+        # Sent and missed reminders clean themselves up a day later
+        self.collection.create_index("fire_at", expireAfterSeconds=86400)
+
+    def watch(self, callback):
+        # Lets an in-process scheduler wake up for reminders due before its next load
+        self._watchers.append(callback)
+
+    def shard_of(self, chat_id):
+        return chat_id % self.shard_count
+
+    def schedule(self, chat_id, docs, settings=None):
+        """Creates or moves the reminders for mirrored event docs."""
+        settings = settings or default_settings()
+        lead = datetime.timedelta(minutes=settings.get("reminder_minutes", Config.REMINDER_LEAD_MINUTES))
+        now = datetime.datetime.utcnow()
+        ops = []
+        earliest = None
+        for doc in docs:
+            start_ts = doc.get("start_ts")
+            if not start_ts or start_ts <= now:
+                continue
+            fire_at = start_ts - lead
+            reminder_id = f"{chat_id}:{doc['event_id']}:{fire_at.isoformat()}"
+            ops.append(UpdateOne(
+                {"_id": reminder_id},
+                {
+                    "$set": {"summary": doc["event"].get("summary", "Event"), "start_ts": start_ts},
+                    "$setOnInsert": {
+                        "chat_id": chat_id,
+                        "event_id": doc["event_id"],
+                        "fire_at": fire_at,
+                        "shard": self.shard_of(chat_id),
+                        "status": "pending",
+                    },
+                },
+                upsert=True,
+            ))
+            # The event moved: its reminders for the old time are stale
+            ops.append(DeleteMany({"chat_id": chat_id, "event_id": doc["event_id"], "_id": {"$ne": reminder_id}}))
+            earliest = fire_at if earliest is None else min(earliest, fire_at)
+        if not ops:
+            return
+        self.collection.bulk_write(ops, ordered=True)
+        for callback in self._watchers:
+            callback(earliest)
+
+    def replan(self, chat_id, docs, settings):
+        """Moves pending reminders to a new lead time.
+
+        Events already reminded about are left alone, so a longer lead does
+        not send their reminder a second time.
+        """
+        reminded = set(self.collection.distinct("event_id", {"chat_id": chat_id, "status": {"$ne": "pending"}}))
+        self.schedule(chat_id, [doc for doc in docs if doc["event_id"] not in reminded], settings)
+
+    def cancel(self, chat_id, event_ids):
+        if event_ids:
+            self.collection.delete_many({"chat_id": chat_id, "event_id": {"$in": list(event_ids)}})
+
+    def clear(self, chat_id):
+        self.collection.delete_many({"chat_id": chat_id})
+
+    def due(self, shards, until, grace, limit=1000):
+        """Pending reminders firing before `until`, including missed ones within the grace period."""
+        now = datetime.datetime.utcnow()
+        query = {
+            "status": "pending",
+            "fire_at": {"$gte": now - datetime.timedelta(seconds=grace), "$lte": until},
+            "start_ts": {"$gt": now},
+        }
+        if shards is not None:
+            query["shard"] = {"$in": list(shards)}
+        return list(self.collection.find(query, {"fire_at": 1}).sort("fire_at", ASCENDING).limit(limit))
+
+    def claim(self, reminder_id, lease_seconds=120):
+        # Only one process gets the document back; the lease lets another
+        # pick it up if this one dies before marking it sent.
+        now = datetime.datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {"_id": reminder_id, "status": "pending", "$or": [
+                {"claimed_until": {"$exists": False}},
+                {"claimed_until": {"$lt": now}},
+            ]},
+            {"$set": {"claimed_until": now + datetime.timedelta(seconds=lease_seconds)}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def mark(self, reminder_id, status):
+        self.collection.update_one({"_id": reminder_id}, {"$set": {"status": status}})
+
+class ReminderScheduler:
+    """Fires reminders from an in-memory heap that is refilled from Mongo.
+
+    Every load interval the reminders due within the lookahead window are
+    read from the index and pushed onto the heap; the thread sleeps until
+    the earliest of them. On start the grace period catches up on reminders
+    missed while the bot was down. Processes can split the work by shard
+    (chat_id modulo REMINDER_SHARD_COUNT), and the atomic claim keeps
+    overlapping processes from sending the same reminder twice.
+    """
+
+    def __init__(self, store, shards=None, load_interval=30, lookahead=300, grace=900, workers=4):
+        self.store = store
+        self.shards = shards
+        self.load_interval = load_interval
+        self.lookahead = lookahead
+        self.grace = grace
+        self.workers = workers
+        self.send = None
+        self._heap = []  # (fire_at, reminder_id)
+        self._queued = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._next_load = None
+        self._thread = None
+        store.watch(self._on_schedule)
+
+    def start(self, send):
+        self.send = send
+        self._thread = threading.Thread(target=self._loop, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def _on_schedule(self, fire_at):
+        if self._next_load and fire_at < self._next_load:
+            self._next_load = datetime.datetime.utcnow()
+            self._wake.set()
+
+    def _load(self):
+        now = datetime.datetime.utcnow()
+        until = now + datetime.timedelta(seconds=self.lookahead)
+        for doc in self.store.due(self.shards, until, self.grace):
+            if doc["_id"] not in self._queued:
+                self._queued.add(doc["_id"])
+                heapq.heappush(self._heap, (doc["fire_at"], doc["_id"]))
+        self._next_load = now + datetime.timedelta(seconds=self.load_interval)
+
+    def _loop(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self._stop.is_set():
+                try:
+                    now = datetime.datetime.utcnow()
+                    if self._next_load is None or now >= self._next_load:
+                        self._load()
+                    while self._heap and self._heap[0][0] <= now:
+                        _, reminder_id = heapq.heappop(self._heap)
+                        self._queued.discard(reminder_id)
+                        executor.submit(self.fire, reminder_id)
+                    wake_at = self._next_load
+                    if self._heap:
+                        wake_at = min(wake_at, self._heap[0][0])
+                    timeout = (wake_at - datetime.datetime.utcnow()).total_seconds()
+                except Exception as e:
+                    print(f"Reminder scheduler error: {e}")
+                    timeout = self.load_interval
+                self._wake.wait(max(timeout, 0))
+                self._wake.clear()
+
+    def fire(self, reminder_id):
+        reminder = self.store.claim(reminder_id)
+        if not reminder:
+            return
+        try:
+            settings = db.get_user_settings(reminder["chat_id"])
+            if not settings.get("notifications", True):
+                self.store.mark(reminder_id, "skipped")
+                return
+            self.send(reminder["chat_id"], format_reminder(reminder))
+            self.store.mark(reminder_id, "sent")
+        except Exception as e:
+            # Left claimed; it is retried once the lease expires if still within the grace period
+            print(f"Reminder {reminder_id} failed: {e}")
+
+def format_reminder(reminder):
+    start = reminder["start_ts"].replace(tzinfo=datetime.timezone.utc).astimezone(ZoneInfo(Config.TIMEZONE))
+    minutes = max(0, round((reminder["start_ts"] - datetime.datetime.utcnow()).total_seconds() / 60))
+    when = f"in {minutes} min" if minutes else "now"
+    return f"⏰ Reminder: {reminder['summary']} starts {when} ({start.strftime('%H:%M')})."
+
+def configured_shards():
+    if not Config.REMINDER_SHARDS.strip():
+        return None
+    return [int(shard) for shard in Config.REMINDER_SHARDS.split(",") if shard.strip()]
+
+reminder_store = ReminderStore(db.collection("reminders"), Config.REMINDER_SHARD_COUNT)
+reminder_scheduler = ReminderScheduler(
+    reminder_store,
+    shards=configured_shards(),
+    load_interval=Config.REMINDER_LOAD_INTERVAL,
+    lookahead=Config.REMINDER_LOOKAHEAD,
+    grace=Config.REMINDER_GRACE,
+    workers=Config.REMINDER_WORKERS,
+)
@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+CATEGORIES = ("Work", "Personal", "Health", "Finance", "Other")
+# Event fields a correction can remove, and their value once removed
+CLEARABLE_FIELDS = {"location": None, "description": None, "attendees": []}
+
+class CalendarEventSchema(BaseModel):
+    summary: str = Field(description="Brief title of the event")
+    start_time: str = Field(description="Start time in ISO 8601 format (YYYY-MM-DDTHH:MM:SS)")
+    end_time: str = Field(description="End time in ISO 8601 format (YYYY-MM-DDTHH:MM:SS)")
+    location: Optional[str] = Field(description="Location of the event if specified")
+    attendees: List[str] = Field(description="List of email addresses for attendees", default=[])
+    description: Optional[str] = Field(description="Detailed description extracted from text")
+    category: str = Field(description="Category of the event: Work, Personal, Health, Finance, Other")
+
+class CalendarEventPatch(BaseModel):
+    """Fields a correction changes; the ones left out stay as they are."""
+    summary: Optional[str] = Field(default=None, description="New title, only if it changes")
+    start_time: Optional[str] = Field(default=None, description="New start in ISO 8601 format (YYYY-MM-DDTHH:MM:SS), only if it changes")
+    end_time: Optional[str] = Field(default=None, description="New end in ISO 8601 format (YYYY-MM-DDTHH:MM:SS), only if it changes")
+    location: Optional[str] = Field(default=None, description="New location, only if it changes")
+    attendees: Optional[List[str]] = Field(default=None, description="Full new list of attendee emails, only if it changes")
+    description: Optional[str] = Field(default=None, description="New description, only if it changes")
+    category: Optional[str] = Field(default=None, description="New category (Work, Personal, Health, Finance, Other), only if it changes")
+    clear: Optional[List[str]] = Field(default=None, description="Fields the user asks to remove: location, description and/or attendees")
+
+    def to_update(self):
+        """The patch as a dict of changed fields, with cleared ones set to empty."""
+        update = self.model_dump(exclude_none=True, exclude={"clear"})
+        for field in self.clear or []:
+            if field in CLEARABLE_FIELDS:
+                update[field] = CLEARABLE_FIELDS[field]
+        return update
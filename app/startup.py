@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+import threading
+import time
+
+class StartupTimer:
+    """Wall time of each startup phase, for the breakdown printed at boot."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []  # (name, seconds)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - start))
+
+    def report(self, title="Startup"):
+        with self._lock:
+            phases = list(self.phases)
+        lines = [f"⏱ {title}: {(time.perf_counter() - self.started) * 1000:.0f} ms since launch"]
+        lines += [f"   {name:<24} {seconds * 1000:>7.1f} ms" for name, seconds in phases]
+        return "\n".join(lines)
+
+startup = StartupTimer()
+
+def run_in_background(steps, report=False):
+    """Runs (name, callable) steps on a daemon thread, timing each one.
+
+    Used for index creation and warm-up, so polling starts without waiting
+    on Mongo round-trips or heavy SDK imports.
+    """
+    def run():
+        timer = StartupTimer()
+        for name, step in steps:
+            try:
+                with timer.phase(name):
+                    step()
+            except Exception as e:
+                print(f"Startup step {name} failed: {e}")
+        if report:
+            print(timer.report("Background warm-up"))
+
+    thread = threading.Thread(target=run, name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def warm_up_steps(ai_service):
+    # Everything the first user request would otherwise pay for
+    from app.db.mongo import db
+    from app.services.google_service import get_discovery_doc
+
+    def import_google_clients():
+        import googleapiclient.discovery  # noqa: F401
+        import google_auth_oauthlib.flow  # noqa: F401
+        import google.auth.transport.requests  # noqa: F401
+
+    return [
+        ("mongo connection", lambda: db.client.admin.command("ping")),
+        ("gemini client", lambda: (ai_service.client, ai_service._generation_config())),
+        ("google client modules", import_google_clients),
+        ("calendar discovery doc", get_discovery_doc),
+    ]
@@ -0,0 +1,274 @@
+"""In-process stand-ins for Telegram, Gemini, Google Calendar and Mongo.
+
+install() must run before anything under app/ is imported: the Mongo
+client, the bot and the AI client are created at import time.
+"""
+import datetime
+import itertools
+import json
+import os
+import threading
+import time
+
+class Latency:
+    """Sleeps for a fixed delay plus optional uniform jitter, in milliseconds."""
+
+    def __init__(self, ms=0.0, jitter_ms=0.0, seed=0):
+        import random
+
+        self.ms = ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, fraction=1.0):
+        if not self.ms and not self.jitter_ms:
+            return
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        time.sleep((self.ms + jitter) * fraction / 1000)
+
+# --- Telegram ---
+
+class FakeTelegram:
+    """CUSTOM_REQUEST_SENDER that answers Bot API calls locally."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._ids = itertools.count(1000)
+
+    def __call__(self, method, url, **kwargs):
+        self.latency.wait()
+        self.calls += 1
+        name = url.rsplit("/", 1)[-1]
+        params = kwargs.get("params") or {}
+        if name == "getMe":
+            return _Response({"id": 1, "is_bot": True, "first_name": "Planify", "username": "planify_bench_bot"})
+        if name in ("sendMessage", "editMessageText", "sendDocument"):
+            return _Response({
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0) or 0), "type": "private"},
+                "text": params.get("text", ""),
+            })
+        return _Response(True)
+
+class _Response:
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, result):
+        self.text = json.dumps({"ok": True, "result": result})
+
+    def json(self):
+        return json.loads(self.text)
+
+# --- Gemini ---
+
+class FakeGenAIClient:
+    """Answers generate_content with one event for tomorrow, like a cooperative model.
+
+    generate_content_stream returns the same answer in STREAM_CHUNKS pieces;
+    the first arrives after FIRST_CHUNK of the latency, the rest spread evenly.
+    """
+
+    STREAM_CHUNKS = 8
+    FIRST_CHUNK = 0.3
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.models = self
+        self.calls = 0
+
+    def generate_content(self, model=None, contents=None, config=None):
+        from app.services.schemas import CalendarEventPatch
+
+        self.latency.wait()
+        self.calls += 1
+        if getattr(config, "response_schema", None) is CalendarEventPatch:
+            # An edit the local parser could not handle: the model only returns what changed
+            return _GenAIResponse(json.dumps({"summary": "Benchmark event (edited)"}))
+        return _GenAIResponse(self._answer())
+
+    def generate_content_stream(self, model=None, contents=None, config=None):
+        self.calls += 1
+        text = self._answer()
+        size = -(-len(text) // self.STREAM_CHUNKS)
+        for i in range(0, len(text), size):
+            self.latency.wait(self.FIRST_CHUNK if i == 0 else (1 - self.FIRST_CHUNK) / (self.STREAM_CHUNKS - 1))
+            yield _GenAIResponse(text[i:i + size])
+
+    def _answer(self):
+        start = (datetime.datetime.now() + datetime.timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        event = {
+            "summary": "Benchmark event",
+            "start_time": start.strftime("%Y-%m-%dT%H:%M:%S"),
+            "end_time": (start + datetime.timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "location": None,
+            "attendees": [],
+            "description": None,
+            "category": "Work",
+        }
+        return json.dumps([event])
+
+class _GenAIResponse:
+    def __init__(self, text):
+        self.text = text
+
+# --- Google Calendar ---
+
+class _FakeCreds:
+    expired = False
+
+    def to_json(self):
+        return json.dumps({"token": "bench", "refresh_token": "bench"})
+
+class FakeCalendarService:
+    """Duck-typed GoogleCalendarService keeping events in a dict."""
+
+    def __init__(self, chat_id, latency, seed_events=0):
+        self.chat_id = chat_id
+        self.latency = latency
+        self.creds = _FakeCreds()
+        self.service = self
+        self.events = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        start = datetime.datetime.utcnow().replace(microsecond=0) + datetime.timedelta(days=1)
+        for i in range(seed_events):
+            when = start + datetime.timedelta(hours=i)
+            event_id = f"seed{chat_id}x{i}"
+            self.events[event_id] = {
+                "id": event_id,
+                "summary": f"Seeded event {i}",
+                "start": {"dateTime": when.isoformat() + "Z"},
+                "end": {"dateTime": (when + datetime.timedelta(minutes=30)).isoformat() + "Z"},
+            }
+
+    def is_authenticated(self):
+        return True
+
+    def get_auth_url(self):
+        self.latency.wait()
+        return "https://accounts.example/auth", {"state": "s", "code_verifier": "v", "redirect_uri": "urn:ietf:wg:oauth:2.0:oob"}
+
+    def finish_auth(self, flow_state, code):
+        self.latency.wait()
+        return True, "Authenticated successfully!"
+
+    def list_event_changes(self, sync_token=None, page_token=None):
+        self.latency.wait()
+        with self._lock:
+            items = list(self.events.values())
+        return {"items": items, "nextSyncToken": "bench"}
+
+    def query_freebusy(self, time_min, time_max):
+        self.latency.wait()
+        with self._lock:
+            return [{"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+                    for e in self.events.values() if e["start"].get("dateTime")]
+
+    def _insert(self, body):
+        event = dict(body, id=f"ev{self.chat_id}x{next(self._ids)}")
+        with self._lock:
+            self.events[event["id"]] = event
+        return event
+
+    def create_event(self, body):
+        self.latency.wait()
+        return self._insert(body)
+
+    def create_events(self, bodies):
+        # One simulated round-trip per batch request, like the real client
+        self.latency.wait()
+        return [(self._insert(body), None) for body in bodies]
+
+    def delete_event(self, event_id):
+        self.latency.wait()
+        with self._lock:
+            return self.events.pop(event_id, None) is not None
+
+    def delete_events(self, event_ids):
+        self.latency.wait()
+        with self._lock:
+            return [(self.events.pop(i, None) is not None, None) for i in event_ids]
+
+class FakeCalendarPool:
+    def __init__(self, latency, seed_events=0):
+        self.latency = latency
+        self.seed_events = seed_events
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id, creds_json=None):
+        with self._lock:
+            service = self._services.get(chat_id)
+            if service is None:
+                service = self._services[chat_id] = FakeCalendarService(chat_id, self.latency, self.seed_events)
+            return service
+
+    def invalidate(self, chat_id):
+        pass
+
+    def __len__(self):
+        return len(self._services)
+
+# --- Mongo ---
+
+def _patch_mongomock():
+    import mongomock
+    import pymongo
+    from pymongo import UpdateOne, DeleteOne, DeleteMany, InsertOne
+
+    # mongomock's bulk_write predates the operation objects of newer
+    # pymongo releases; replay them one by one instead.
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        for op in requests:
+            if isinstance(op, UpdateOne):
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, DeleteOne):
+                self.delete_one(op._filter)
+            elif isinstance(op, DeleteMany):
+                self.delete_many(op._filter)
+            elif isinstance(op, InsertOne):
+                self.insert_one(op._doc)
+
+    mongomock.collection.Collection.bulk_write = bulk_write
+    pymongo.MongoClient = mongomock.MongoClient
+
+def install(mongo="mongomock", telegram_ms=0.0, real_rate_limits=False):
+    """Prepares the environment and patches the module-level clients.
+
+    mongo is "mongomock" or a MongoDB URI (e.g. a throwaway local mongod).
+    """
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "1:bench")
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ["CREDENTIAL_REFRESH_ENABLED"] = "false"
+    os.environ["REMINDERS_ENABLED"] = "false"
+    if not real_rate_limits:
+        # Telegram's flood limits would otherwise be all the benchmark measures
+        os.environ["OUTBOX_GLOBAL_RATE"] = "1000000"
+        os.environ["OUTBOX_CHAT_RATE"] = "1000000"
+        os.environ["OUTBOX_CHAT_BURST"] = "1000000"
+    if mongo == "mongomock":
+        _patch_mongomock()
+    else:
+        os.environ["MONGO_URI"] = mongo
+        # Always a throwaway database, even if DB_NAME points at the real one
+        os.environ["DB_NAME"] = f"planify_bench_{os.getpid()}"
+
+    from telebot import apihelper
+    telegram = FakeTelegram(Latency(telegram_ms))
+    apihelper.CUSTOM_REQUEST_SENDER = telegram
+    return telegram
+
+def attach(ai_ms=0.0, calendar_ms=0.0, jitter=0.0, seed_events=0):
+    """Swaps the AI client and Calendar pool of the already imported handlers."""
+    from app.bot import handlers
+
+    ai_client = FakeGenAIClient(Latency(ai_ms, ai_ms * jitter, seed=1))
+    handlers.ai_service.client = ai_client
+    pool = FakeCalendarPool(Latency(calendar_ms, calendar_ms * jitter, seed=2), seed_events)
+    handlers.calendar_pool = pool
+    return ai_client, pool
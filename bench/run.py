@@ -0,0 +1,162 @@
+"""Offline benchmark: drives the real handlers against in-process fakes.
+
+    python -m bench.run
+    python -m bench.run --scenarios create,list --concurrency 1,8,32 --iterations 50 --ai-ms 800
+    python -m bench.run --replay updates.jsonl --concurrency 16
+
+Reports per scenario and concurrency level: handler latency p50/p99
+(service time of each update), throughput (updates/s over the wall time)
+and the peak memory traced while the run was in flight.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from bench import fakes
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="create,list,delete,edit,auth")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated chats/workers per run")
+    parser.add_argument("--iterations", type=int, default=20, help="flows per chat")
+    parser.add_argument("--ai-ms", type=float, default=300.0, help="fake Gemini latency")
+    parser.add_argument("--calendar-ms", type=float, default=80.0, help="fake Calendar API latency")
+    parser.add_argument("--telegram-ms", type=float, default=30.0, help="fake Bot API latency")
+    parser.add_argument("--jitter", type=float, default=0.2, help="extra random latency, as a fraction")
+    parser.add_argument("--local-ratio", type=float, default=0.5, help="share of create texts the local parser handles")
+    parser.add_argument("--mongo", default="mongomock", help='"mongomock" or a MongoDB URI')
+    parser.add_argument("--replay", help="JSONL file of recorded Telegram updates (replaces --scenarios)")
+    parser.add_argument("--real-rate-limits", action="store_true", help="keep the outbox's Telegram flood limits")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows the run down)")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run_level(name, updates, concurrency, trace_memory):
+    """Feeds updates through the chat-partitioned dispatcher and times each one."""
+    from telebot import types
+    from app.bot.bot_instance import bot
+    from app.bot.dispatcher import ChatPartitionedDispatcher
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    done = threading.Semaphore(0)
+
+    def handle(update):
+        nonlocal errors
+        start = time.perf_counter()
+        failed = False
+        try:
+            bot.process_new_updates([update])
+        except Exception as e:
+            failed = True
+            print(f"[{name}] handler error: {e}", file=sys.stderr)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += failed
+        done.release()
+
+    dispatcher = ChatPartitionedDispatcher(handle, workers=concurrency, max_pending=len(updates) + 1,
+                                           max_per_chat=len(updates) + 1, put_timeout=5)
+    parsed = [types.Update.de_json(json.dumps(update)) for update in updates]
+
+    if trace_memory:
+        tracemalloc.start()
+    dispatcher.start()
+    started = time.perf_counter()
+    for update in parsed:
+        while not dispatcher.submit(update):
+            time.sleep(0.01)
+    for _ in parsed:
+        done.acquire()
+    wall = time.perf_counter() - started
+    dispatcher.stop()
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "updates": len(parsed),
+        "throughput": len(parsed) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "peak_mb": peak / 2**20,
+        "errors": errors,
+    }
+
+def build_updates(scenario, concurrency, iterations, local_ratio, chat_base):
+    from bench.scenarios import SCENARIOS
+
+    flows = SCENARIOS[scenario]
+    updates = []
+    # Interleave chats so every worker has something to do from the start
+    for iteration in range(iterations):
+        for chat in range(concurrency):
+            updates += flows(chat_base + chat, iteration, local_ratio=local_ratio)
+    return updates
+
+def main(argv=None):
+    args = parse_args(argv)
+    telegram = fakes.install(args.mongo, args.telegram_ms, args.real_rate_limits)
+
+    # Imported only now: app modules build their clients at import time
+    from app.bot import handlers  # noqa: F401  (registers the handlers)
+    from app.db.mongo import db
+    from app.services.event_mirror import event_mirror
+    from app.bot.bot_instance import bot
+
+    bot.threaded = False
+    db.ensure_indexes()
+    event_mirror.ensure_indexes()
+    ai_client, pool = fakes.attach(args.ai_ms, args.calendar_ms, args.jitter, seed_events=args.iterations)
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = []
+    chat_base = 1
+    runs = [("replay", None)] if args.replay else [(s, s) for s in args.scenarios.split(",")]
+    for name, scenario in runs:
+        for concurrency in levels:
+            if scenario is None:
+                from bench.scenarios import load_replay
+                updates = list(load_replay(args.replay))
+            else:
+                # Fresh chats per run, so state from earlier runs does not leak in
+                updates = build_updates(scenario, concurrency, args.iterations, args.local_ratio, chat_base)
+                for chat_id in range(chat_base, chat_base + concurrency):
+                    db.create_user(chat_id, {"username": f"bench{chat_id}"})
+                chat_base += concurrency
+            results.append(run_level(name, updates, concurrency, not args.no_memory))
+            print_row(results[-1])
+
+    print(f"\nfake calls: telegram={telegram.calls} gemini={ai_client.calls} calendar clients={len(pool)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+_HEADER_PRINTED = False
+
+def print_row(row):
+    global _HEADER_PRINTED
+    if not _HEADER_PRINTED:
+        print(f"{'scenario':<10}{'conc':>5}{'updates':>9}{'upd/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'peak MB':>9}{'errors':>8}")
+        _HEADER_PRINTED = True
+    print(f"{row['scenario']:<10}{row['concurrency']:>5}{row['updates']:>9}{row['throughput']:>9.1f}"
+          f"{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['peak_mb']:>9.2f}{row['errors']:>8}")
+
+if __name__ == "__main__":
+    main()
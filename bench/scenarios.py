@@ -0,0 +1,88 @@
+"""Synthetic Telegram updates for each benchmark scenario.
+
+A scenario yields, per chat, the ordered list of update dicts one user
+would send for one iteration of the flow. Only the updates are synthetic:
+they go through the real handlers.
+"""
+import itertools
+import json
+
+_ids = itertools.count(1)
+
+# Phrasings the local parser resolves on its own
+LOCAL_TEXTS = [
+    "gym tomorrow at 6pm",
+    "dentist friday 10am @clinic",
+    "standup tomorrow 9:30 for 15 min",
+    "lunch with Sam today at 1pm",
+]
+
+def _user(chat_id):
+    return {"id": chat_id, "is_bot": False, "first_name": "Bench", "username": f"bench{chat_id}"}
+
+def message(chat_id, text):
+    return {
+        "update_id": next(_ids),
+        "message": {
+            "message_id": next(_ids),
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": _user(chat_id),
+            "text": text,
+        },
+    }
+
+def callback(chat_id, data, message_id=1):
+    return {
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "chat_instance": str(chat_id),
+            "data": data,
+            "from": _user(chat_id),
+            "message": {"message_id": message_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "card"},
+        },
+    }
+
+def create(chat_id, iteration, local_ratio=0.5):
+    # Unique text so LLM-bound messages miss the extraction cache
+    if int((iteration + 1) * local_ratio) > int(iteration * local_ratio):
+        text = LOCAL_TEXTS[iteration % len(LOCAL_TEXTS)]
+    else:
+        text = f"Plan the offsite agenda #{chat_id}-{iteration} with the team sometime next week, and book a room"
+    return [message(chat_id, text), callback(chat_id, "confirm_event")]
+
+def list_events(chat_id, iteration, **_):
+    return [message(chat_id, "My Tasks"), callback(chat_id, "tasks_page_1"), callback(chat_id, "refresh_tasks")]
+
+def delete(chat_id, iteration, **_):
+    # Deletes one of the events seeded into the fake calendar
+    event_id = f"seed{chat_id}x{iteration}"
+    return [message(chat_id, "My Tasks"), callback(chat_id, f"view_{event_id}"), callback(chat_id, f"delete_{event_id}")]
+
+def edit(chat_id, iteration, **_):
+    return [
+        message(chat_id, LOCAL_TEXTS[iteration % len(LOCAL_TEXTS)]),
+        callback(chat_id, "edit_event"),
+        message(chat_id, "Change time to 5pm"),
+        callback(chat_id, "cancel_event"),
+    ]
+
+def auth(chat_id, iteration, **_):
+    return [message(chat_id, "/auth"), message(chat_id, "4/bench-code")]
+
+SCENARIOS = {
+    "create": create,
+    "list": list_events,
+    "delete": delete,
+    "edit": edit,
+    "auth": auth,
+}
+
+def load_replay(path):
+    """Recorded updates, one Telegram Update JSON object per line."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
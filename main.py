@@ -1,12 +1,60 @@
-import telebot
-from app.config import Config
-from app.bot import bot_instance
-# Import handlers to register them
-from app.bot import handlers 
+from app.startup import startup, run_in_background, warm_up_steps
+with startup.phase("config"):
+    from app.config import Config
+with startup.phase("telebot + bot"):
+    from app.bot import bot_instance
+with startup.phase("mongo + state modules"):
+    from app.db.mongo import db
+    from app.services.event_mirror import event_mirror
+    from app.db.state_store import state_store
 
 if __name__ == "__main__":
     print("🤖 Planify Bot Started...")
+    # Import handlers to register them; async mode has its own set
+    with startup.phase("handlers"):
+        if Config.BOT_MODE == "async":
+            from app.bot import async_handlers as handlers
+        else:
+            from app.bot import handlers
+    # Indexes are idempotent, so they are created off the startup path
+    steps = [
+        ("mongo indexes", db.ensure_indexes),
+        ("mirror indexes", event_mirror.ensure_indexes),
+        ("state indexes", state_store.ensure_indexes),
+    ]
+    if Config.WARMUP:
+        steps += warm_up_steps(handlers.ai_service)
+    run_in_background(steps, report=Config.STARTUP_REPORT)
+    if Config.CREDENTIAL_REFRESH_ENABLED:
+        from app.services.credential_refresher import credential_refresher
+        credential_refresher.start()
+    if Config.METRICS_PORT and Config.BOT_MODE != "webhook":
+        from app.metrics import start_metrics_server
+        start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT)
+    if Config.PROFILER_INTERVAL:
+        from app.metrics import start_profiler
+        start_profiler(Config.PROFILER_INTERVAL)
+    if Config.CALENDAR_PUSH_URL:
+        from app.services.calendar_push import calendar_push, start_push_server
+        calendar_push.ensure_indexes()
+        calendar_push.start()
+        if Config.BOT_MODE != "webhook":
+            start_push_server(Config.CALENDAR_PUSH_HOST, Config.CALENDAR_PUSH_PORT)
+    if Config.REMINDERS_ENABLED:
+        from app.services.reminder_service import reminder_scheduler
+        from app.bot.outbox import outbox
+        reminder_scheduler.start(outbox.send_message)
+    if Config.STARTUP_REPORT:
+        print(startup.report())
     try:
-        bot_instance.bot.infinity_polling()
+        if Config.BOT_MODE == "webhook":
+            from app.bot.webhook import run_webhook
+            run_webhook()
+        elif Config.BOT_MODE == "async":
+            import asyncio
+            from app.bot.async_handlers import run_async
+            asyncio.run(run_async())
+        else:
+            bot_instance.bot.infinity_polling()
     except Exception as e:
         print(f"Bot error: {e}")
@@ -0,0 +1,6 @@
+import os
+
+# Modules that build the bot or clients at import time read these; tests
+# never reach Telegram or Gemini, so any value works
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "1:test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
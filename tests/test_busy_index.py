@@ -0,0 +1,112 @@
+import datetime
+
+from app.services.busy_index import BusyIndex, BusyCache
+
+def at(hour, minute=0, day=20):
+    return datetime.datetime(2026, 10, day, hour, minute)
+
+def test_add_merges_touching_and_overlapping_intervals():
+    index = BusyIndex([(at(9), at(10)), (at(10), at(11)), (at(13), at(14)), (at(13, 30), at(15))])
+    assert list(zip(index.starts, index.ends)) == [(at(9), at(11)), (at(13), at(15))]
+    index.add(at(10, 30), at(13, 15))
+    assert list(zip(index.starts, index.ends)) == [(at(9), at(15))]
+
+def test_add_ignores_empty_intervals():
+    index = BusyIndex([(at(10), at(10)), (at(11), at(10))])
+    assert len(index) == 0
+
+def test_overlaps_is_half_open():
+    index = BusyIndex([(at(9), at(10)), (at(12), at(13))])
+    assert index.overlaps(at(10), at(12)) == []
+    assert index.overlaps(at(9, 30), at(12, 30)) == [(at(9), at(10)), (at(12), at(13))]
+
+def test_free_slots_nearest_first():
+    index = BusyIndex([(at(9), at(10)), (at(11), at(15))])
+    slots = index.free_slots(at(12), at(13), at(8), at(18))
+    assert slots == [(at(10), at(11)), (at(15), at(16))]
+
+def test_free_slots_respect_bounds():
+    index = BusyIndex([(at(8), at(17))])
+    assert index.free_slots(at(12), at(14), at(8), at(18)) == []
+
+class FakeService:
+    chat_id = 1
+
+    def __init__(self, busy):
+        self.busy = busy
+        self.calls = 0
+
+    def query_freebusy(self, time_min, time_max):
+        self.calls += 1
+        return self.busy
+
+def test_cache_check_reports_conflicts_and_free_time(monkeypatch):
+    monkeypatch.setattr("app.services.busy_index.Config.TIMEZONE", "UTC")
+    day = (datetime.datetime.utcnow() + datetime.timedelta(days=2)).date()
+    iso = lambda hour: f"{day}T{hour:02d}:00:00Z"
+    service = FakeService([{"start": iso(10), "end": iso(12)}])
+    cache = BusyCache(ttl=60)
+
+    class Event:
+        start_time = f"{day}T11:00:00"
+        end_time = f"{day}T12:00:00"
+
+    conflict = cache.check(service, Event)
+    noon = datetime.datetime.combine(day, datetime.time(12))
+    assert conflict["busy"] == [(noon.replace(hour=10), noon)]
+    assert conflict["free"][0] == (noon, noon.replace(hour=13))
+    cache.check(service, Event)
+    assert service.calls == 1
+
+def test_cache_add_extends_the_cached_index():
+    day = (datetime.datetime.utcnow() + datetime.timedelta(days=2)).date()
+    service = FakeService([])
+    cache = BusyCache(ttl=60)
+    index, _, _ = cache.get(service)
+    cache.add(1, {"start": {"dateTime": f"{day}T10:00:00Z"}, "end": {"dateTime": f"{day}T11:00:00Z"}})
+    noon = datetime.datetime.combine(day, datetime.time(12))
+    assert index.overlaps(noon.replace(hour=10, minute=30), noon) == [(noon.replace(hour=10), noon.replace(hour=11))]
+    assert service.calls == 1
+
+def test_cache_invalidate_reloads():
+    service = FakeService([])
+    cache = BusyCache(ttl=60)
+    cache.get(service)
+    cache.invalidate(1)
+    cache.get(service)
+    assert service.calls == 2
+
+def test_cache_failed_query_is_not_cached():
+    class BrokenService(FakeService):
+        def query_freebusy(self, time_min, time_max):
+            self.calls += 1
+            raise RuntimeError("quota")
+    service = BrokenService([])
+    cache = BusyCache(ttl=60)
+    assert cache.get(service) is None
+    assert cache.get(service) is None
+    assert service.calls == 2
+
+def test_cache_evicts_least_recently_used():
+    services = [FakeService([]) for _ in range(3)]
+    for chat_id, service in enumerate(services):
+        service.chat_id = chat_id
+    cache = BusyCache(ttl=60, max_users=2)
+    cache.get(services[0])
+    cache.get(services[1])
+    cache.get(services[0])
+    cache.get(services[2])
+    cache.get(services[0])
+    cache.get(services[1])
+    assert [service.calls for service in services] == [1, 2, 1]
+
+def test_cache_check_outside_window_is_unknown(monkeypatch):
+    monkeypatch.setattr("app.services.busy_index.Config.TIMEZONE", "UTC")
+    far = (datetime.datetime.utcnow() + datetime.timedelta(days=90)).date()
+    service = FakeService([{"start": f"{far}T10:00:00Z", "end": f"{far}T12:00:00Z"}])
+
+    class Event:
+        start_time = f"{far}T11:00:00"
+        end_time = f"{far}T12:00:00"
+
+    assert BusyCache(ttl=60).check(service, Event) is None
@@ -0,0 +1,80 @@
+from app.services.calendar_files import iter_ics, parse_events
+from app.services.google_service import build_event_body
+
+def ics(*body):
+    return ["BEGIN:VCALENDAR", "VERSION:2.0", *body, "END:VCALENDAR"]
+
+def test_nested_alarm_does_not_override_event_fields():
+    lines = ics(
+        "BEGIN:VEVENT",
+        "SUMMARY:Dentist",
+        "DTSTART:20261020T100000",
+        "DESCRIPTION:Bring the x-rays",
+        "BEGIN:VALARM",
+        "ACTION:DISPLAY",
+        "DESCRIPTION:Reminder",
+        "DURATION:PT15M",
+        "END:VALARM",
+        "END:VEVENT",
+    )
+    [(event, error)] = list(parse_events("cal.ics", lines))
+    assert error is None
+    assert event.description == "Bring the x-rays"
+    assert (event.start_time, event.end_time) == ("2026-10-20T10:00:00", "2026-10-20T11:00:00")
+
+def test_recurring_events_are_reported_as_skipped():
+    lines = ics(
+        "BEGIN:VEVENT",
+        "SUMMARY:Standup",
+        "DTSTART:20261020T093000",
+        "DTEND:20261020T094500",
+        "RRULE:FREQ=DAILY;COUNT=5",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "SUMMARY:Review",
+        "DTSTART:20261021T140000",
+        "END:VEVENT",
+    )
+    results = list(parse_events("cal.ics", lines))
+    assert results[0] == (None, "Standup: recurring events are not supported")
+    assert results[1][0].summary == "Review"
+
+def test_bad_date_skips_only_that_event():
+    lines = ics(
+        "BEGIN:VEVENT",
+        "SUMMARY:Broken",
+        "DTSTART:2026-10-20T10:00",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "SUMMARY:Review",
+        "DTSTART:20261021T140000",
+        "END:VEVENT",
+    )
+    results = list(parse_events("cal.ics", lines))
+    assert results[0] == (None, "Broken: bad date '2026-10-20T10:00'")
+    assert results[1][0].summary == "Review"
+
+def test_all_day_events_stay_all_day():
+    lines = ics(
+        "BEGIN:VEVENT",
+        "SUMMARY:Holiday",
+        "DTSTART;VALUE=DATE:20261224",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "SUMMARY:Trip",
+        "DTSTART;VALUE=DATE:20261101",
+        "DTEND;VALUE=DATE:20261104",
+        "END:VEVENT",
+    )
+    (holiday, _), (trip, _) = parse_events("cal.ics", lines)
+    assert (holiday.start_time, holiday.end_time) == ("2026-12-24", "2026-12-25")
+    assert (trip.start_time, trip.end_time) == ("2026-11-01", "2026-11-04")
+    assert build_event_body(trip)["start"] == {"date": "2026-11-01"}
+
+def test_export_folds_on_octets():
+    event = {"id": "e1", "summary": "Ü" * 100, "start": {"date": "2026-11-01"}, "end": {"date": "2026-11-02"}}
+    lines = list(iter_ics([event]))
+    summary = lines[lines.index("BEGIN:VEVENT") + 5:lines.index("END:VEVENT")]
+    assert all(len(line.encode("utf-8")) <= 75 for line in summary)
+    assert all(line.startswith(" ") for line in summary[1:])
+    assert "".join(line[1:] if i else line for i, line in enumerate(summary)) == "SUMMARY:" + "Ü" * 100
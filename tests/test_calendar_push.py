@@ -0,0 +1,91 @@
+import datetime
+
+import mongomock
+import pytest
+
+from app.services import calendar_push as push_module
+from app.services.calendar_push import CalendarPush
+
+class FakeService:
+    def __init__(self, chat_id, fail=False):
+        self.chat_id = chat_id
+        self.fail = fail
+        self.watched = []
+        self.stopped = []
+
+    def is_authenticated(self):
+        return True
+
+    def watch_events(self, channel_id, address, token, ttl):
+        if self.fail:
+            raise RuntimeError("watch failed")
+        self.watched.append((channel_id, address, token))
+        return {"resourceId": f"res-{channel_id}", "expiration": "4102444800000"}
+
+    def stop_channel(self, channel_id, resource_id):
+        self.stopped.append((channel_id, resource_id))
+
+class FakeMirror:
+    def __init__(self):
+        self.synced = []
+
+    def sync(self, service, force=False):
+        self.synced.append(service.chat_id)
+
+@pytest.fixture
+def setup(monkeypatch):
+    users = mongomock.MongoClient().db.users
+    services = {}
+    monkeypatch.setattr(push_module.calendar_pool, "get", lambda chat_id: services.setdefault(chat_id, FakeService(chat_id)))
+    mirror = FakeMirror()
+    push = CalendarPush(users, mirror, "https://bot.example/calendar/notify", workers=1)
+    return push, users, services, mirror
+
+def drain(push):
+    push._executor.shutdown(wait=True)
+
+def test_registers_a_channel_for_authorized_users(setup):
+    push, users, services, mirror = setup
+    users.insert_many([{"chat_id": 1, "credentials": "{}"}, {"chat_id": 2}])
+    assert push.renew_due() == 1
+    drain(push)
+    channel = users.find_one({"chat_id": 1})["push_channel"]
+    assert services[1].watched == [(channel["id"], "https://bot.example/calendar/notify", channel["token"])]
+    assert channel["expires_at"] == datetime.datetime(2100, 1, 1)
+    assert "push_channel" not in users.find_one({"chat_id": 2})
+    # The first channel catches up on changes made before it existed
+    assert mirror.synced == [1]
+
+def test_notification_triggers_a_sync(setup):
+    push, users, services, mirror = setup
+    users.insert_one({"chat_id": 1, "push_channel": {"id": "c1", "token": "secret", "expires_at": datetime.datetime(2100, 1, 1)}})
+    assert push.handle({"X-Goog-Channel-ID": "c1", "X-Goog-Channel-Token": "wrong"}) == 403
+    assert push.handle({"X-Goog-Channel-ID": "other", "X-Goog-Channel-Token": "secret"}) == 404
+    assert push.handle({"X-Goog-Channel-ID": "c1", "X-Goog-Channel-Token": "secret", "X-Goog-Resource-State": "exists"}) == 200
+    drain(push)
+    assert mirror.synced == [1]
+
+def test_renewal_replaces_expiring_channel(setup):
+    push, users, services, mirror = setup
+    soon = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    users.insert_one({"chat_id": 1, "credentials": "{}",
+                      "push_channel": {"id": "old", "resource_id": "r-old", "token": "t", "expires_at": soon}})
+    assert push.renew_due() == 1
+    drain(push)
+    assert services[1].stopped == [("old", "r-old")]
+    assert users.find_one({"chat_id": 1})["push_channel"]["id"] != "old"
+    assert mirror.synced == []
+
+def test_failed_registration_waits_for_the_retry(setup):
+    push, users, services, mirror = setup
+    services[1] = FakeService(1, fail=True)
+    users.insert_one({"chat_id": 1, "credentials": "{}"})
+    assert push.renew_due() == 1
+    # Leased until the retry: the next sweep leaves it alone
+    assert push.renew_due() == 0
+
+def test_channels_far_from_expiry_are_not_renewed(setup):
+    push, users, services, mirror = setup
+    users.insert_one({"chat_id": 1, "credentials": "{}",
+                      "push_channel": {"id": "c1", "token": "t", "expires_at": datetime.datetime(2100, 1, 1)}})
+    assert push.renew_due() == 0
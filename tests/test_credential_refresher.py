@@ -0,0 +1,114 @@
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mongomock
+import pytest
+from google.auth.exceptions import RefreshError
+
+from app.db.mongo import Database
+from app.services import credential_refresher as refresher_module
+from app.services.credential_refresher import CredentialRefresher
+
+def creds_json(expires_in, refresh_token="refresh"):
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+    return json.dumps({"token": "old", "refresh_token": refresh_token, "client_id": "id",
+                       "client_secret": "secret", "expiry": expiry.isoformat() + "Z"})
+
+class FakePool:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, chat_id):
+        self.invalidated.append(chat_id)
+
+@pytest.fixture
+def db(monkeypatch):
+    database = Database()
+    database._client = mongomock.MongoClient()
+    monkeypatch.setattr(refresher_module, "db", database)
+    return database
+
+@pytest.fixture
+def pool(monkeypatch):
+    fake = FakePool()
+    monkeypatch.setattr(refresher_module, "calendar_pool", fake)
+    return fake
+
+@pytest.fixture
+def refresh(monkeypatch):
+    # Records the refresh tokens used; errors maps a refresh token to what it raises
+    calls = []
+    errors = {}
+
+    def fake_refresh(creds, request):
+        calls.append(creds.refresh_token)
+        if creds.refresh_token in errors:
+            raise errors[creds.refresh_token]
+        creds.token = "new"
+        creds.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    monkeypatch.setattr(refresher_module.Credentials, "refresh", fake_refresh)
+    return calls, errors
+
+def add_user(db, chat_id, expires_in, refresh_token="refresh"):
+    db.create_user(chat_id, {"username": f"u{chat_id}"})
+    db.save_user_credentials(chat_id, creds_json(expires_in, refresh_token))
+
+def test_refreshes_only_tokens_expiring_within_the_window(db, pool, refresh):
+    add_user(db, 1, expires_in=60)
+    add_user(db, 2, expires_in=3600)
+    refresher = CredentialRefresher(window=600)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert refresher.run_once(executor) == 1
+    user = db.users.find_one({"chat_id": 1})
+    assert json.loads(user["credentials"])["token"] == "new"
+    assert user["credentials_expiry"] > datetime.datetime.utcnow() + datetime.timedelta(minutes=50)
+    assert json.loads(db.users.find_one({"chat_id": 2})["credentials"])["token"] == "old"
+    assert refresh[0] == ["refresh"]
+
+def test_invalid_grant_and_missing_refresh_token_revoke(db, pool, refresh):
+    calls, errors = refresh
+    errors["dead"] = RefreshError("invalid_grant: Token has been expired or revoked.")
+    add_user(db, 1, expires_in=60, refresh_token="dead")
+    add_user(db, 2, expires_in=60, refresh_token=None)
+    refresher = CredentialRefresher()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        refresher.run_once(executor)
+        assert sorted(pool.invalidated) == [1, 2]
+        assert db.get_user_credentials(1) is None and db.get_user_credentials(2) is None
+        # Revoked users are not picked up again
+        assert refresher.run_once(executor) == 0
+    assert calls == ["dead"]
+
+def test_transient_errors_wait_for_the_lease(db, pool, refresh):
+    calls, errors = refresh
+    errors["flaky"] = RefreshError("temporarily unavailable")
+    add_user(db, 1, expires_in=60, refresh_token="flaky")
+    refresher = CredentialRefresher()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        refresher.run_once(executor)
+        assert refresher.run_once(executor) == 0
+    assert calls == ["flaky"]
+    assert pool.invalidated == []
+    assert db.get_user_credentials(1) is not None
+
+def test_a_leased_user_is_refreshed_once(db, pool, refresh):
+    add_user(db, 1, expires_in=60)
+    user = db.find_expiring_credentials(datetime.datetime.utcnow() + datetime.timedelta(minutes=10), 10)[0]
+    first, second = CredentialRefresher(), CredentialRefresher()
+    first.refresh_user(user)
+    second.refresh_user(user)
+    assert refresh[0] == ["refresh"]
+
+def test_loop_drains_full_batches_in_one_cycle(db, pool, refresh):
+    for chat_id in range(5):
+        add_user(db, chat_id, expires_in=60)
+    refresher = CredentialRefresher(interval=600, batch_size=2, workers=2)
+    refresher.start()
+    deadline = time.monotonic() + 5
+    while len(refresh[0]) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    refresher.stop()
+    assert len(refresh[0]) == 5
@@ -0,0 +1,84 @@
+import threading
+import time
+import types
+
+from app.bot.dispatcher import ChatPartitionedDispatcher, get_update_chat_id
+
+def update(chat_id, seq, update_id=0):
+    chat = types.SimpleNamespace(id=chat_id)
+    return types.SimpleNamespace(update_id=update_id, seq=seq, message=types.SimpleNamespace(chat=chat))
+
+def test_chat_id_of_messages_callbacks_and_others():
+    assert get_update_chat_id(update(7, 0)) == 7
+    call = types.SimpleNamespace(message=None, from_user=types.SimpleNamespace(id=9))
+    assert get_update_chat_id(types.SimpleNamespace(update_id=1, callback_query=call)) == 9
+    call.message = types.SimpleNamespace(chat=types.SimpleNamespace(id=8))
+    assert get_update_chat_id(types.SimpleNamespace(update_id=1, callback_query=call)) == 8
+    assert get_update_chat_id(types.SimpleNamespace(update_id=5)) == ("update", 5)
+
+def test_updates_of_a_chat_run_in_order_one_at_a_time():
+    handled = {chat_id: [] for chat_id in range(4)}
+    active = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def handle(u):
+        chat_id = u.message.chat.id
+        with lock:
+            if chat_id in active:
+                overlaps.append(chat_id)
+            active.add(chat_id)
+        time.sleep(0.001)
+        with lock:
+            active.discard(chat_id)
+            handled[chat_id].append(u.seq)
+
+    dispatcher = ChatPartitionedDispatcher(handle, workers=4, max_per_chat=100)
+    dispatcher.start()
+    for seq in range(20):
+        for chat_id in handled:
+            assert dispatcher.submit(update(chat_id, seq))
+    deadline = time.monotonic() + 5
+    while dispatcher.queue_depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert overlaps == []
+    assert all(seqs == list(range(20)) for seqs in handled.values())
+
+def test_busy_chat_does_not_starve_others():
+    order = []
+    dispatcher = ChatPartitionedDispatcher(lambda u: order.append((u.message.chat.id, u.seq)), workers=1)
+    for seq in range(3):
+        dispatcher.submit(update(1, seq))
+    dispatcher.submit(update(2, 0))
+    dispatcher.start()
+    while dispatcher.queue_depth():
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert order == [(1, 0), (2, 0), (1, 1), (1, 2)]
+
+def test_backpressure_per_chat_and_overall():
+    dispatcher = ChatPartitionedDispatcher(lambda u: None, max_pending=3, max_per_chat=2, put_timeout=0.01)
+    assert dispatcher.submit(update(1, 0))
+    assert dispatcher.submit(update(1, 1))
+    assert not dispatcher.submit(update(1, 2))
+    assert dispatcher.submit(update(2, 0))
+    assert not dispatcher.submit(update(3, 0))
+    assert dispatcher.queue_depth() == 3
+
+def test_handler_errors_do_not_stop_the_worker():
+    handled = []
+
+    def handle(u):
+        if u.seq == 0:
+            raise RuntimeError("boom")
+        handled.append(u.seq)
+
+    dispatcher = ChatPartitionedDispatcher(handle, workers=1)
+    dispatcher.start()
+    dispatcher.submit(update(1, 0))
+    dispatcher.submit(update(1, 1))
+    while dispatcher.queue_depth():
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert handled == [1]
@@ -0,0 +1,75 @@
+import datetime
+
+import mongomock
+
+from app.services.ai_service import ExtractionCache, normalize_text
+from app.services.schemas import CalendarEventSchema
+
+MONDAY = datetime.datetime(2026, 10, 19, 10, 5)
+
+def event(start, end, summary="Standup"):
+    return CalendarEventSchema(summary=summary, start_time=start, end_time=end,
+                               location=None, description=None, category="Work")
+
+def test_normalize_text():
+    assert normalize_text("  Standup   TOMORROW 9am!! ") == "standup tomorrow 9am"
+
+def test_hit_is_re_anchored_to_the_current_day():
+    cache = ExtractionCache()
+    cache.put("standup tomorrow 9am", MONDAY, [event("2026-10-20T09:00:00", "2026-10-20T09:15:00")])
+    next_monday = MONDAY + datetime.timedelta(days=7, minutes=20)
+    [hit] = cache.get("Standup tomorrow 9am.", next_monday)
+    assert (hit.start_time, hit.end_time) == ("2026-10-27T09:00:00", "2026-10-27T09:15:00")
+    assert hit.summary == "Standup"
+
+def test_time_of_day_and_offset_are_kept_verbatim():
+    cache = ExtractionCache()
+    cache.put("call friday 5pm", MONDAY, [event("2026-10-23T17:00:00+02:00", "2026-10-24T01:30:00+02:00")])
+    [hit] = cache.get("call friday 5pm", MONDAY + datetime.timedelta(days=7))
+    assert (hit.start_time, hit.end_time) == ("2026-10-30T17:00:00+02:00", "2026-10-31T01:30:00+02:00")
+
+def test_relative_texts_are_keyed_by_weekday_and_hour():
+    cache = ExtractionCache()
+    cache.put("gym tonight", MONDAY, [event("2026-10-19T19:00:00", "2026-10-19T20:00:00")])
+    assert cache.get("gym tonight", MONDAY + datetime.timedelta(days=1)) is None
+    assert cache.get("gym tonight", MONDAY + datetime.timedelta(hours=1)) is None
+    assert cache.get("gym tonight", MONDAY + datetime.timedelta(days=14)) is not None
+
+def test_absolute_dates_are_keyed_by_day():
+    cache = ExtractionCache()
+    cache.put("dentist oct 30 at 9", MONDAY, [event("2026-10-30T09:00:00", "2026-10-30T10:00:00")])
+    assert cache.get("dentist oct 30 at 9", MONDAY + datetime.timedelta(minutes=30)) is not None
+    # A week later "oct 30" is 7 days closer, so the relative entry would be wrong
+    assert cache.get("dentist oct 30 at 9", MONDAY + datetime.timedelta(days=7)) is None
+
+def test_minute_relative_texts_are_not_cached():
+    cache = ExtractionCache()
+    for text in ("call mom in 20 minutes", "meeting now"):
+        cache.put(text, MONDAY, [event("2026-10-19T10:25:00", "2026-10-19T10:30:00")])
+        assert cache.get(text, MONDAY) is None
+    assert cache.stats()["stores"] == 0
+
+def test_events_without_valid_times_are_not_cached():
+    cache = ExtractionCache()
+    cache.put("standup tomorrow", MONDAY, [event("tomorrow", "2026-10-20T09:15:00")])
+    assert cache.get("standup tomorrow", MONDAY) is None
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ExtractionCache(max_size=2)
+    for text in ("a at 9", "b at 9", "c at 9"):
+        cache.put(text, MONDAY, [event("2026-10-20T09:00:00", "2026-10-20T10:00:00")])
+    assert cache.get("a at 9", MONDAY) is None
+    assert cache.get("c at 9", MONDAY) is not None
+    assert cache.stats()["size"] == 2
+
+def test_mongo_tier_is_shared_and_expires():
+    collection = mongomock.MongoClient().db.extraction_cache
+    ExtractionCache(collection=collection).put("standup tomorrow 9am", MONDAY, [event("2026-10-20T09:00:00", "2026-10-20T09:15:00")])
+    other = ExtractionCache(collection=collection)
+    [hit] = other.get("standup tomorrow 9am", MONDAY + datetime.timedelta(days=7))
+    assert hit.start_time == "2026-10-27T09:00:00"
+    assert other.stats()["mongo_hits"] == 1
+    assert other.get("standup tomorrow 9am", MONDAY) is not None
+    assert other.stats()["hits"] == 1
+    collection.update_many({}, {"$set": {"expires_at": datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}})
+    assert ExtractionCache(collection=collection).get("standup tomorrow 9am", MONDAY) is None
@@ -0,0 +1,54 @@
+import threading
+
+from google.oauth2.credentials import Credentials
+
+from app.services import google_service
+from app.services.google_service import CalendarServicePool, GoogleCalendarService, thread_http
+
+CREDS = Credentials(token="token")
+
+def test_thread_http_is_per_thread():
+    seen = {}
+
+    def grab(name):
+        seen[name] = (thread_http(CREDS).http, thread_http(CREDS).http)
+
+    threads = [threading.Thread(target=grab, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # One connection reused within a thread, never shared between threads
+    assert seen["a"][0] is seen["a"][1]
+    assert seen["a"][0] is not seen["b"][0]
+
+class FakeRequest:
+    def execute(self, http=None):
+        self.http = http
+        return {}
+
+def test_execute_runs_on_the_calling_threads_http():
+    service = GoogleCalendarService(1, creds_json="")
+    service.creds = CREDS
+    request = FakeRequest()
+    service._execute(request)
+    assert request.http.http is thread_http(CREDS).http
+    assert request.http.credentials is CREDS
+
+class FakeDatabase:
+    def __init__(self):
+        self.context_calls = 0
+
+    def get_user_context(self, chat_id):
+        self.context_calls += 1
+        return {"credentials": None, "settings": {}}
+
+    def get_user_credentials(self, chat_id):
+        raise AssertionError("credentials are loaded with the settings")
+
+def test_pool_miss_loads_credentials_and_settings_together(monkeypatch):
+    fake_db = FakeDatabase()
+    monkeypatch.setattr(google_service, "db", fake_db)
+    service = CalendarServicePool().get(7)
+    assert not service.is_authenticated()
+    assert fake_db.context_calls == 1
@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+
+from app.config import Config
+from app.services.local_parser import LocalEventParser
+from app.services.schemas import CalendarEventSchema
+
+# Saturday
+NOW = datetime.datetime(2026, 10, 17, 10, 0)
+
+@pytest.fixture
+def parser():
+    return LocalEventParser()
+
+@pytest.mark.parametrize("text, start, end, summary", [
+    ("gym tomorrow at 6pm", "2026-10-18T18:00:00", "2026-10-18T19:00:00", "Gym"),
+    ("dentist friday 10am @clinic", "2026-10-23T10:00:00", "2026-10-23T11:00:00", "Dentist"),
+    ("standup tomorrow 9:30 for 15 min", "2026-10-18T09:30:00", "2026-10-18T09:45:00", "Standup"),
+    ("lunch with Sam today at 1pm", "2026-10-17T13:00:00", "2026-10-17T14:00:00", "Lunch with Sam"),
+    ("call 3-5pm monday", "2026-10-19T15:00:00", "2026-10-19T17:00:00", "Call"),
+    ("meet on March 3rd at noon", "2027-03-03T12:00:00", "2027-03-03T13:00:00", "Meet"),
+    ("review in 2 days at 10am", "2026-10-19T10:00:00", "2026-10-19T11:00:00", "Review"),
+])
+def test_fast_path(parser, text, start, end, summary):
+    event, confidence = parser.parse(text, NOW)
+    assert confidence >= Config.LOCAL_PARSER_MIN_CONFIDENCE
+    assert (event.start_time, event.end_time, event.summary) == (start, end, summary)
+
+def test_location_and_attendees(parser):
+    event, _ = parser.parse("sync with bob@example.com tomorrow 9am @office", NOW)
+    assert event.location == "office"
+    assert event.attendees == ["bob@example.com"]
+
+@pytest.mark.parametrize("text", [
+    "meeting at 3pm on 10/25",
+    "meeting at 3pm next week",
+    "dinner at 7pm in two weeks",
+    "call at 3pm on the 3rd",
+    "exam at 9am on 25.10",
+    "standup 9am weekdays",
+    "lunch at 1pm this weekend",
+    "pay rent at 9am end of month",
+    "yoga every monday at 7am",
+])
+def test_unresolved_dates_go_to_gemini(parser, text):
+    # Date text the parser did not resolve must never be scheduled for today
+    _, confidence = parser.parse(text, NOW)
+    assert confidence < Config.LOCAL_PARSER_MIN_CONFIDENCE
+
+@pytest.mark.parametrize("text", ["gym at 5pm and 6pm", "party tomorrow friday at 6pm", "plan the offsite",
+                                  "call at 5pm for 99999999 hours", "hike at 6am for 9999999999999 minutes"])
+def test_not_parsed(parser, text):
+    assert parser.parse(text, NOW) == (None, 0.0)
+
+# --- Corrections ---
+
+EVENT = CalendarEventSchema(
+    summary="Offsite", start_time="2026-10-20T10:00:00", end_time="2026-10-20T11:30:00",
+    location="HQ", attendees=["a@x.com"], description="Agenda", category="Work",
+)
+
+@pytest.mark.parametrize("text, patch", [
+    ("Change time to 5pm", {"start_time": "2026-10-20T17:00:00", "end_time": "2026-10-20T18:30:00"}),
+    ("move it to friday", {"start_time": "2026-10-23T10:00:00", "end_time": "2026-10-23T11:30:00"}),
+    ("Move to tomorrow at 9am", {"start_time": "2026-10-18T09:00:00", "end_time": "2026-10-18T10:30:00"}),
+    ("reschedule to monday 3-5pm", {"start_time": "2026-10-19T15:00:00", "end_time": "2026-10-19T17:00:00"}),
+    ("make it 2 hours", {"start_time": "2026-10-20T10:00:00", "end_time": "2026-10-20T12:00:00"}),
+    ("change date to Nov 3", {"start_time": "2026-11-03T10:00:00", "end_time": "2026-11-03T11:30:00"}),
+    ("rename to Team offsite", {"summary": "Team offsite"}),
+    ('change title to "Planning"', {"summary": "Planning"}),
+    ("location: Room 4", {"location": "Room 4"}),
+    ("location : Room 4", {"location": "Room 4"}),
+    ("location: ", {"location": None}),
+    ("location:", {"location": None}),
+    ("set description to bring laptops", {"description": "bring laptops"}),
+    ("make it personal", {"category": "Personal"}),
+    ("invite bob@x.com and c@y.org", {"attendees": ["a@x.com", "bob@x.com", "c@y.org"]}),
+    ("remove a@x.com", {"attendees": []}),
+    ("remove the location", {"location": None}),
+    ("no description", {"description": None}),
+    ("clear guests", {"attendees": []}),
+])
+def test_parse_correction(parser, text, patch):
+    assert parser.parse_correction(text, EVENT, NOW) == patch
+
+@pytest.mark.parametrize("text", [
+    "change time to 5",
+    "push it by an hour",
+    "move it to after lunch",
+    "also invite Sam",
+    "every monday at 5pm",
+    "make it 99999999 hours",
+])
+def test_parse_correction_needs_gemini(parser, text):
+    assert parser.parse_correction(text, EVENT, NOW) is None
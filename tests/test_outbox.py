@@ -0,0 +1,187 @@
+import asyncio
+import time
+import types
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+
+from app.bot import outbox as outbox_module
+from app.bot.outbox import AsyncOutbox, EditThrottle, Outbox, TokenBucket
+
+def api_error(code, description="", retry_after=None, error=ApiTelegramException):
+    result_json = {"error_code": code, "description": description}
+    if retry_after is not None:
+        result_json["parameters"] = {"retry_after": retry_after}
+    return error("method", None, result_json)
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.calls = []
+        # method name -> exceptions raised by its next calls, in order
+        self.errors = errors or {}
+
+    def _record(self, name, *args, **kwargs):
+        self.calls.append((name, args, kwargs))
+        if self.errors.get(name):
+            raise self.errors[name].pop(0)
+        return types.SimpleNamespace(message_id=len(self.calls))
+
+    def send_message(self, *args, **kwargs):
+        return self._record("send_message", *args, **kwargs)
+
+    def edit_message_text(self, *args, **kwargs):
+        return self._record("edit_message_text", *args, **kwargs)
+
+    def delete_message(self, *args, **kwargs):
+        return self._record("delete_message", *args, **kwargs)
+
+    def answer_callback_query(self, *args, **kwargs):
+        return self._record("answer_callback_query", *args, **kwargs)
+
+class FakeAsyncBot(FakeBot):
+    async def send_message(self, *args, **kwargs):
+        return self._record("send_message", *args, **kwargs)
+
+    async def edit_message_text(self, *args, **kwargs):
+        return self._record("edit_message_text", *args, **kwargs)
+
+    async def delete_message(self, *args, **kwargs):
+        return self._record("delete_message", *args, **kwargs)
+
+    async def answer_callback_query(self, *args, **kwargs):
+        return self._record("answer_callback_query", *args, **kwargs)
+
+def drain(outbox, timeout=2):
+    deadline = time.monotonic() + timeout
+    while outbox.stats()["queued"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert outbox.stats()["queued"] == 0
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Direct calls sleep on the handler's thread; record instead of waiting
+    slept = []
+    monkeypatch.setattr(outbox_module.time, "sleep", slept.append)
+    return slept
+
+def test_token_bucket_reserve_and_try_take():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    # try_take never goes into debt
+    assert bucket.try_take() == pytest.approx(0.2, abs=0.01)
+    bucket.give_back()
+    bucket.give_back()
+    assert bucket.try_take() == 0.0
+
+def test_edit_throttle_skips_repeats_and_bursts():
+    throttle = EditThrottle(interval=60)
+    assert throttle.ready("a")
+    assert not throttle.ready("a")
+    assert not throttle.ready("b")
+
+def test_direct_call_waits_for_the_chat_bucket(sleeps):
+    bot = FakeBot()
+    outbox = Outbox(bot, global_rate=100, chat_rate=1, chat_burst=1)
+    outbox.send_message(1, "a")
+    outbox.send_message(2, "b")
+    assert sleeps == []
+    outbox.send_message(1, "c")
+    assert sleeps == [pytest.approx(1.0, abs=0.05)]
+    assert [args for _, args, _ in bot.calls] == [(1, "a"), (2, "b"), (1, "c")]
+
+def test_direct_call_retries_after_429(sleeps):
+    bot = FakeBot({"send_message": [api_error(429, "Too Many Requests", retry_after=7)]})
+    outbox = Outbox(bot, global_rate=100, chat_rate=100, chat_burst=10, max_retries=2)
+    assert outbox.send_message(1, "hi").message_id == 2
+    assert sleeps == [7]
+    assert outbox.stats()["retried"] == 1
+
+def test_direct_call_gives_up_after_max_retries(sleeps):
+    bot = FakeBot({"send_message": [api_error(429, retry_after=1) for _ in range(3)]})
+    outbox = Outbox(bot, global_rate=100, chat_rate=100, chat_burst=10, max_retries=2)
+    with pytest.raises(ApiTelegramException):
+        outbox.send_message(1, "hi")
+    assert len(bot.calls) == 3
+
+def test_other_errors_are_not_retried(sleeps):
+    bot = FakeBot({"send_message": [api_error(400, "Bad Request: chat not found")]})
+    outbox = Outbox(bot, max_retries=2)
+    with pytest.raises(ApiTelegramException):
+        outbox.send_message(1, "hi")
+    assert len(bot.calls) == 1
+
+def test_unmodified_edit_is_not_an_error():
+    bot = FakeBot({"edit_message_text": [api_error(400, "Bad Request: message is not modified")]})
+    assert Outbox(bot).edit_message_text("same", 1, 5) is None
+
+def test_queued_edits_coalesce_into_the_latest():
+    bot = FakeBot()
+    outbox = Outbox(bot, global_rate=100, chat_rate=20, chat_burst=1)
+    # Empty the chat's bucket so both edits are queued before the worker may send
+    outbox._chat_bucket(1).try_take()
+    outbox.edit_message_text_later("first", 1, 5)
+    outbox.edit_message_text_later("second", 1, 5)
+    drain(outbox)
+    assert bot.calls == [("edit_message_text", ("second", 1, 5), {})]
+    assert outbox.stats()["coalesced"] == 1
+
+def test_direct_edit_supersedes_a_queued_one():
+    bot = FakeBot()
+    outbox = Outbox(bot, global_rate=100, chat_rate=20, chat_burst=1)
+    outbox._chat_bucket(1).try_take()
+    outbox.edit_message_text_later("preview", 1, 5, parse_mode="Markdown")
+    outbox.edit_message_text("final", 1, 5)
+    drain(outbox)
+    assert bot.calls == [("edit_message_text", ("final", 1, 5), {})]
+
+def test_queued_calls_keep_their_order_per_chat():
+    bot = FakeBot()
+    outbox = Outbox(bot, global_rate=1000, chat_rate=1000, chat_burst=100)
+    outbox.delete_message_later(1, 10)
+    outbox.edit_message_text_later("x", 1, 11)
+    outbox.delete_message_later(1, 12)
+    drain(outbox)
+    assert [(name, args[-1]) for name, args, _ in bot.calls] == [
+        ("delete_message", 10), ("edit_message_text", 11), ("delete_message", 12)]
+
+def test_queued_delete_retries_429_and_drops_400():
+    bot = FakeBot({"delete_message": [api_error(429, retry_after=0.01), api_error(400, "message to delete not found")]})
+    outbox = Outbox(bot, global_rate=1000, chat_rate=1000, chat_burst=100, max_retries=2)
+    outbox.delete_message_later(1, 10)
+    outbox.delete_message_later(1, 11)
+    drain(outbox)
+    # 10 is retried after the 429, 11 fails with 400 and is dropped
+    assert [args for _, args, _ in bot.calls] == [(1, 10), (1, 10), (1, 11)]
+    assert outbox.stats()["retried"] == 1
+
+def test_async_outbox_retries_after_429(monkeypatch):
+    slept = []
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+    monkeypatch.setattr(outbox_module.asyncio, "sleep", fake_sleep)
+    bot = FakeAsyncBot({"send_message": [api_error(429, retry_after=3, error=AsyncApiTelegramException)]})
+    outbox = AsyncOutbox(bot, global_rate=100, chat_rate=100, chat_burst=10)
+    asyncio.run(outbox.send_message(1, "hi"))
+    assert slept == [3]
+    assert len(bot.calls) == 2
+
+def test_async_outbox_coalesces_and_survives_deleted_messages():
+    bot = FakeAsyncBot({"delete_message": [api_error(400, "message to delete not found", error=AsyncApiTelegramException)]})
+    outbox = AsyncOutbox(bot, global_rate=1000, chat_rate=1000, chat_burst=100)
+
+    async def handler():
+        placeholder = await outbox.send_message(1, "Thinking...")
+        outbox.delete_message_later(1, 99)
+        outbox.edit_message_text_later("preview 1", 1, placeholder.message_id)
+        outbox.edit_message_text_later("preview 2", 1, placeholder.message_id)
+        await outbox.edit_message_text("card", 1, placeholder.message_id)
+        while outbox._drains:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(handler())
+    assert [(name, args[0] if name == "edit_message_text" else args[-1]) for name, args, _ in bot.calls] == [
+        ("send_message", "Thinking..."), ("edit_message_text", "card"), ("delete_message", 99)]
+    assert outbox.stats() == {"sent": 2, "retried": 0, "coalesced": 2, "queued": 0}
@@ -0,0 +1,52 @@
+import json
+
+from app.services.partial_json import parse_partial, complete_items
+
+DOC = json.dumps([
+    {"summary": 'Team "sync"', "start_time": "2026-10-18T15:00:00", "location": "Room 4",
+     "attendees": ["a@x.com", "b@x.com"], "n": 12, "ok": True},
+    {"summary": "Gym"},
+])
+
+def test_every_prefix_parses_to_a_prefix_of_the_document():
+    final = json.loads(DOC)
+    for i in range(len(DOC) + 1):
+        partial = parse_partial(DOC[:i])
+        if partial is None:
+            continue
+        assert len(partial) <= len(final)
+        for got, want in zip(partial, final):
+            # Only fully received values appear, and they are never truncated
+            for key, value in got.items():
+                if isinstance(value, list):
+                    assert value == want[key][:len(value)]
+                else:
+                    assert value == want[key]
+    assert parse_partial(DOC) == final
+
+def test_half_received_string_is_dropped():
+    assert parse_partial('[{"summary": "Gym", "start_time": "2026-10-1') == [{"summary": "Gym"}]
+
+def test_key_without_value_is_dropped():
+    assert parse_partial('[{"summary": "Gym", "location"') == [{"summary": "Gym"}]
+
+def test_number_waits_for_its_terminator():
+    assert parse_partial('{"a": "x", "n": 12') == {"a": "x"}
+    assert parse_partial('{"a": "x", "n": 12,') == {"a": "x", "n": 12}
+
+def test_nothing_usable_yet():
+    assert parse_partial("") is None
+    assert parse_partial('  "abc') is None
+
+def test_complete_items():
+    assert complete_items([{"a": 1}, "x", {"b": 2}]) == [{"a": 1}, {"b": 2}]
+    assert complete_items({"a": 1}) == [{"a": 1}]
+    assert complete_items(None) == []
+
+def test_escaped_quotes_and_brackets_inside_strings():
+    assert parse_partial(r'[{"summary": "a\"b", "location": "c{d') == [{"summary": 'a"b'}]
+    assert parse_partial(r'[{"summary": "x\\') == [{}]
+
+def test_nested_containers_close_in_order():
+    assert parse_partial('[{"a": {"b": "c"}, "d": tr') == [{"a": {"b": "c"}}]
+    assert parse_partial('[{"a": [1, 2') == [{"a": [1]}]
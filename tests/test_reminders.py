@@ -0,0 +1,137 @@
+import datetime
+import threading
+
+import mongomock
+import pytest
+from pymongo import DeleteMany, UpdateOne
+
+from app.services import event_mirror as mirror_module
+from app.services import reminder_service
+from app.services.event_mirror import EventMirror
+from app.services.reminder_service import ReminderScheduler, ReminderStore
+
+class FakeDatabase:
+    def __init__(self):
+        self.settings = {"notifications": True, "reminder_minutes": 10}
+
+    def get_user_settings(self, chat_id):
+        return dict(self.settings)
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(reminder_service, "db", fake)
+    monkeypatch.setattr(mirror_module, "db", fake)
+    return fake
+
+@pytest.fixture
+def store(monkeypatch):
+    # mongomock's bulk_write does not take newer pymongo operation objects
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        for op in requests:
+            if isinstance(op, UpdateOne):
+                self.update_one(op._filter, op._doc, upsert=op._upsert)
+            elif isinstance(op, DeleteMany):
+                self.delete_many(op._filter)
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", bulk_write)
+    return ReminderStore(mongomock.MongoClient().db.reminders, shard_count=2)
+
+def in_minutes(minutes):
+    return datetime.datetime.utcnow().replace(microsecond=0) + datetime.timedelta(minutes=minutes)
+
+def event_doc(event_id, start_ts, summary="Standup"):
+    return {"event_id": event_id, "start_ts": start_ts, "event": {"summary": summary}}
+
+def fire_times(store, chat_id=1):
+    return sorted((doc["event_id"], doc["fire_at"]) for doc in store.collection.find({"chat_id": chat_id}))
+
+def test_schedule_fires_lead_minutes_before_start(store):
+    start = in_minutes(60)
+    store.schedule(1, [event_doc("a", start), event_doc("past", in_minutes(-5))], {"reminder_minutes": 15})
+    assert fire_times(store) == [("a", start - datetime.timedelta(minutes=15))]
+    # Re-syncing the same event changes nothing
+    store.schedule(1, [event_doc("a", start)], {"reminder_minutes": 15})
+    assert store.collection.count_documents({}) == 1
+
+def test_moved_event_replaces_its_reminder(store):
+    store.schedule(1, [event_doc("a", in_minutes(60))], {"reminder_minutes": 10})
+    later = in_minutes(120)
+    store.schedule(1, [event_doc("a", later)], {"reminder_minutes": 10})
+    assert fire_times(store) == [("a", later - datetime.timedelta(minutes=10))]
+
+def test_replan_moves_pending_and_keeps_sent(store):
+    first, second = in_minutes(60), in_minutes(90)
+    store.schedule(1, [event_doc("a", first), event_doc("b", second)], {"reminder_minutes": 10})
+    sent_id = store.collection.find_one({"event_id": "a"})["_id"]
+    store.mark(sent_id, "sent")
+    store.replan(1, [event_doc("a", first), event_doc("b", second)], {"reminder_minutes": 30})
+    assert fire_times(store) == [("a", first - datetime.timedelta(minutes=10)),
+                                 ("b", second - datetime.timedelta(minutes=30))]
+    assert store.collection.find_one({"_id": sent_id})["status"] == "sent"
+
+def test_mirror_replans_on_a_new_lead_time(store, fake_db):
+    mirror = EventMirror(mongomock.MongoClient().db.events, mongomock.MongoClient().db.users, store)
+    start = in_minutes(60)
+    mirror.upsert_event(1, {"id": "a", "summary": "Standup",
+                            "start": {"dateTime": start.isoformat() + "Z"}, "end": {"dateTime": start.isoformat() + "Z"}})
+    assert fire_times(store) == [("a", start - datetime.timedelta(minutes=10))]
+    fake_db.settings["reminder_minutes"] = 30
+    mirror.replan_reminders(1)
+    assert fire_times(store) == [("a", start - datetime.timedelta(minutes=30))]
+
+def test_due_respects_grace_lookahead_and_shards(store):
+    store.schedule(1, [event_doc("soon", in_minutes(12)), event_doc("later", in_minutes(60))], {"reminder_minutes": 10})
+    store.schedule(2, [event_doc("other", in_minutes(12))], {"reminder_minutes": 10})
+    store.schedule(3, [event_doc("missed", in_minutes(2))], {"reminder_minutes": 30})
+    until = in_minutes(5)
+    assert {doc["_id"].split(":")[1] for doc in store.due(None, until, grace=60)} == {"soon", "other"}
+    # Chat 3 is on shard 1 too; its reminder was due 28 minutes ago
+    assert {doc["_id"].split(":")[1] for doc in store.due([1], until, grace=60)} == {"soon"}
+    assert [doc["_id"].split(":")[1] for doc in store.due([1], until, grace=3600)] == ["missed", "soon"]
+
+def test_claim_is_exclusive(store):
+    store.schedule(1, [event_doc("a", in_minutes(30))], {"reminder_minutes": 10})
+    reminder_id = store.collection.find_one()["_id"]
+    assert store.claim(reminder_id)["event_id"] == "a"
+    assert store.claim(reminder_id) is None
+
+def test_scheduler_heap_orders_and_deduplicates(store):
+    scheduler = ReminderScheduler(store, lookahead=3600)
+    store.schedule(1, [event_doc("b", in_minutes(40)), event_doc("a", in_minutes(20))], {"reminder_minutes": 10})
+    scheduler._load()
+    scheduler._load()
+    assert [reminder_id.split(":")[1] for _, reminder_id in sorted(scheduler._heap)] == ["a", "b"]
+    assert len(scheduler._heap) == 2
+
+def test_schedule_before_next_load_wakes_the_scheduler(store):
+    scheduler = ReminderScheduler(store, load_interval=600)
+    scheduler._load()
+    store.schedule(1, [event_doc("a", in_minutes(20))], {"reminder_minutes": 10})
+    assert scheduler._wake.is_set()
+    assert scheduler._next_load <= datetime.datetime.utcnow()
+
+def test_fire_sends_once_and_honours_notifications(store, fake_db):
+    sent = []
+    scheduler = ReminderScheduler(store)
+    scheduler.send = lambda chat_id, text: sent.append((chat_id, text))
+    store.schedule(1, [event_doc("a", in_minutes(30)), event_doc("b", in_minutes(40))], {"reminder_minutes": 10})
+    first, second = sorted(doc["_id"] for doc in store.collection.find())
+    scheduler.fire(first)
+    scheduler.fire(first)
+    assert len(sent) == 1 and sent[0][1].startswith("⏰ Reminder: Standup starts in 30 min")
+    assert store.collection.find_one({"_id": first})["status"] == "sent"
+    fake_db.settings["notifications"] = False
+    scheduler.fire(second)
+    assert len(sent) == 1
+    assert store.collection.find_one({"_id": second})["status"] == "skipped"
+
+def test_scheduler_fires_a_reminder_scheduled_while_running(store, fake_db):
+    fired = threading.Event()
+    scheduler = ReminderScheduler(store, load_interval=600, grace=60)
+    scheduler.start(lambda chat_id, text: fired.set())
+    try:
+        start = datetime.datetime.utcnow() + datetime.timedelta(minutes=10, seconds=0.3)
+        store.schedule(1, [event_doc("a", start)], {"reminder_minutes": 10})
+        assert fired.wait(5)
+    finally:
+        scheduler.stop()
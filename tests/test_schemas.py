@@ -0,0 +1,12 @@
+from app.services.schemas import CalendarEventPatch
+
+def test_patch_update_keeps_only_changed_fields():
+    patch = CalendarEventPatch.model_validate_json('{"summary": "Planning", "location": null}')
+    assert patch.to_update() == {"summary": "Planning"}
+
+def test_patch_update_clears_listed_fields():
+    patch = CalendarEventPatch.model_validate_json('{"clear": ["location", "attendees", "summary"]}')
+    assert patch.to_update() == {"location": None, "attendees": []}
+
+def test_empty_patch():
+    assert CalendarEventPatch.model_validate_json("{}").to_update() == {}
@@ -0,0 +1,67 @@
+import mongomock
+import pytest
+
+from app.db.state_store import MemoryStateStore, MongoStateStore
+
+@pytest.fixture(params=["memory", "mongo"])
+def store(request):
+    if request.param == "memory":
+        return MemoryStateStore(max_size=100)
+    store = MongoStateStore(mongomock.MongoClient().db.conversation_state)
+    store.ensure_indexes()
+    return store
+
+def test_set_get_delete(store):
+    store.set("proposals", 1, {"events": [1, 2]}, ttl=60)
+    assert store.get("proposals", 1) == {"events": [1, 2]}
+    assert store.get("proposals", 2) is None
+    assert store.get("auth_flow", 1) is None
+    store.delete("proposals", 1)
+    assert store.get("proposals", 1) is None
+
+def test_values_are_copies(store):
+    value = {"ids": [1]}
+    store.set("selection", 1, value, ttl=60)
+    value["ids"].append(2)
+    got = store.get("selection", 1)
+    got["ids"].append(3)
+    assert store.get("selection", 1) == {"ids": [1]}
+
+def test_set_overwrites_and_refreshes(store):
+    store.set("step", 1, "edit", ttl=-1)
+    store.set("step", 1, "auth_code", ttl=60)
+    assert store.get("step", 1) == "auth_code"
+
+def test_expired_entries_are_not_returned(store):
+    store.set("step", 1, "edit", ttl=-1)
+    assert store.get("step", 1) is None
+    assert store.pop("step", 1) is None
+
+def test_pop_consumes_once(store):
+    store.set("auth_flow", 1, {"state": "x"}, ttl=60)
+    assert store.pop("auth_flow", 1) == {"state": "x"}
+    assert store.pop("auth_flow", 1) is None
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStateStore(max_size=2)
+    store.set("step", 1, "a", ttl=60)
+    store.set("step", 2, "b", ttl=60)
+    store.get("step", 1)
+    store.set("step", 3, "c", ttl=60)
+    assert len(store) == 2
+    assert store.get("step", 2) is None
+    assert store.get("step", 1) == "a"
+
+def test_mongo_store_has_a_ttl_index():
+    collection = mongomock.MongoClient().db.conversation_state
+    MongoStateStore(collection).ensure_indexes()
+    ttl_indexes = [index for index in collection.index_information().values() if "expireAfterSeconds" in index]
+    assert [(index["key"], index["expireAfterSeconds"]) for index in ttl_indexes] == [([("expires_at", 1)], 0)]
+
+def test_mongo_store_keeps_one_document_per_key():
+    collection = mongomock.MongoClient().db.conversation_state
+    store = MongoStateStore(collection)
+    store.set("proposals", 1, {"n": 1}, ttl=60)
+    store.set("proposals", 1, {"n": 2}, ttl=60)
+    store.set("selection", 1, {"n": 3}, ttl=60)
+    assert sorted(doc["_id"] for doc in collection.find()) == ["proposals:1", "selection:1"]
@@ -0,0 +1,24 @@
+from app.bot.views import escape_md, format_event_details, format_proposals
+from app.services.schemas import CalendarEventSchema
+
+def test_escape_md_covers_legacy_markdown_only():
+    assert escape_md("a_b *c* `d` [e](f)") == r"a\_b \*c\* \`d\` \[e](f)"
+    assert escape_md("2026-10-18 12:00.") == "2026-10-18 12:00."
+
+def test_event_details_escape_calendar_text():
+    event = {"summary": "sync_up", "location": "Room *2*", "description": "see [notes]",
+             "start": {"dateTime": "2026-10-18T10:00:00+00:00"}, "end": {"dateTime": "2026-10-18T11:00:00+00:00"},
+             "attendees": [{"email": "first_last@example.com"}]}
+    text = format_event_details(event)
+    assert r"sync\_up" in text
+    assert r"Room \*2\*" in text
+    assert r"see \[notes]" in text
+    assert r"first\_last@example.com" in text
+
+def test_proposals_escape_summary_and_location():
+    events = [CalendarEventSchema(summary=summary, start_time="2026-10-18T10:00:00", end_time="2026-10-18T11:00:00",
+                                  location="Cafe_1", description=None, category="Work")
+              for summary in ("a_b", "c*d")]
+    assert r"Cafe\_1" in format_proposals(events[:1], {})
+    text = format_proposals(events, {})
+    assert r"a\_b" in text and r"c\*d" in text and r"Cafe\_1" in text